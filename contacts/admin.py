@@ -1,6 +1,18 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
+from django.core.exceptions import PermissionDenied
+from django.http import StreamingHttpResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils.translation import gettext_lazy as _
 from .models import Contact, Address, BankAccount
+from .transfer import COLUMNS, import_contacts, read_rows, stream_csv
+
+
+class ContactImportForm(forms.Form):
+    file = forms.FileField(label=_("CSV or XLSX file"))
 
 
 class AddressInline(admin.TabularInline):  # Allows inline editing of addresses within a contact
@@ -21,10 +33,71 @@ class ContactAdmin(UserAdmin):
         ("Contact Details", {"fields": ("company_name", "customer_number", "tax_number", "uid_number", "phone_number")}),
     )
 
-    list_display = ("username", "email", "company_name", "customer_number", "is_staff", "is_active")
+    list_display = ("username", "email", "company_name", "customer_number", "city", "iban", "is_staff", "is_active")
     list_filter = ("is_staff", "is_active", "groups")
     search_fields = ("username", "email", "company_name", "customer_number")
     ordering = ("username",)  # Default ordering by username
+    actions = ["export_csv"]
+
+    def get_queryset(self, request):
+        # One query each for the addresses and bank accounts of the whole page
+        return super().get_queryset(request).prefetch_related("addresses", "bank_accounts")
+
+    @admin.display(description=_("City"))
+    def city(self, obj):
+        """City of the newest address."""
+        addresses = obj.addresses.all()
+        return addresses[0].city if addresses else None
+
+    @admin.display(description=_("IBAN"))
+    def iban(self, obj):
+        """IBAN of the first bank account."""
+        bank_accounts = sorted(obj.bank_accounts.all(), key=lambda bank_account: bank_account.pk)
+        return bank_accounts[0].iban if bank_accounts else None
+
+    @admin.action(description=_("Export selected contacts as CSV"))
+    def export_csv(self, request, queryset):
+        """Stream the contacts in the import format, without loading them all at once."""
+        response = StreamingHttpResponse(stream_csv(queryset), content_type="text/csv; charset=utf-8")
+        response["Content-Disposition"] = 'attachment; filename="contacts.csv"'
+        return response
+
+    def get_urls(self):
+        return [
+            path("import/", self.admin_site.admin_view(self.import_view), name="contacts_contact_import"),
+            *super().get_urls(),
+        ]
+
+    def import_view(self, request):
+        """Upsert contacts, addresses and bank accounts from an uploaded file (see `contacts.transfer`)"""
+        if not (self.has_add_permission(request) and self.has_change_permission(request)):
+            raise PermissionDenied
+        form = ContactImportForm(request.POST or None, request.FILES or None)
+        if form.is_valid():
+            upload = form.cleaned_data["file"]
+            try:
+                result = import_contacts(read_rows(upload.file, upload.name))
+            except (ImportError, UnicodeDecodeError) as exc:
+                form.add_error("file", str(exc))
+            else:
+                for error in result.errors[:20]:
+                    details = "; ".join(f"{column}: {' '.join(text)}" for column, text in error["errors"].items())
+                    self.message_user(request, _("Line %(row)s: %(details)s") % {
+                        "row": error["row"], "details": details
+                    }, messages.WARNING)
+                self.message_user(request, _(
+                    "Imported %(contacts)s contacts, %(addresses)s addresses and %(bank_accounts)s bank accounts; "
+                    "skipped %(errors)s invalid rows."
+                ) % {**vars(result), "errors": len(result.errors)}, messages.SUCCESS)
+                return redirect("admin:contacts_contact_changelist")
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.opts,
+            "title": _("Import contacts"),
+            "form": form,
+            "columns": COLUMNS,
+        }
+        return TemplateResponse(request, "admin/contacts/contact/import.html", context)
 
 
 
@@ -37,12 +110,14 @@ class AddressAdmin(admin.ModelAdmin):
     list_display = ("contact", "address_line_1", "city", "postal_code", "country", "is_residential")
     search_fields = ("contact__username", "address_line_1", "city", "postal_code")
     list_filter = ("country", "is_residential")
+    list_select_related = ("contact",)
     ordering = ("contact", "city")  # Default ordering by contact and city
 
 @admin.register(BankAccount)
 class BankAccountAdmin(admin.ModelAdmin):
-    list_display = ("contact", "account_holder", "iban", "bic", "created_at")
+    list_display = ("contact", "account_holder", "iban", "bic", "mandate_id", "created_at")
     search_fields = ("contact__username", "iban", "account_holder")
     list_filter = ("created_at",)
+    list_select_related = ("contact",)
     ordering = ("contact",)  # Default ordering by contact
 
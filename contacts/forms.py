@@ -1,8 +1,41 @@
 from django import forms
+from django.db import transaction
+from django.db.models import F, FilteredRelation, OuterRef, Q, Subquery
+from django.utils.translation import gettext_lazy as _
+from .iban import lookup_bic, normalize_iban, validate_bic, validate_iban
 from .models import Contact, Address, BankAccount
 
-from django import forms
-from .models import Contact, Address, BankAccount
+# Form field -> model field of the address and bank account edited on the profile page
+ADDRESS_FIELDS = {
+    "address_type": "type",
+    "address_line_1": "address_line_1",
+    "address_line_2": "address_line_2",
+    "postal_code": "postal_code",
+    "city": "city",
+    "country": "country",
+}
+BANK_ACCOUNT_FIELDS = {"account_holder": "account_holder", "iban": "iban", "bic": "bic"}
+
+
+def profile_queryset():
+    """
+    Contacts with the fields of their newest address and first bank account (the ones the
+    profile form edits) joined in as `profile_*` annotations, so the form needs no queries.
+    """
+    newest_address = Address.objects.filter(contact=OuterRef("pk")).order_by("-created_at", "-pk").values("pk")[:1]
+    first_bank_account = BankAccount.objects.filter(contact=OuterRef("pk")).order_by("pk").values("pk")[:1]
+    annotations = {"profile_address_id": F("profile_address__pk")}
+    annotations.update({f"profile_{name}": F(f"profile_address__{field}") for name, field in ADDRESS_FIELDS.items()})
+    annotations["profile_bank_account_id"] = F("profile_bank_account__pk")
+    annotations.update(
+        {f"profile_{name}": F(f"profile_bank_account__{field}") for name, field in BANK_ACCOUNT_FIELDS.items()}
+    )
+    return Contact.objects.annotate(
+        profile_address=FilteredRelation("addresses", condition=Q(addresses__pk=Subquery(newest_address))),
+        profile_bank_account=FilteredRelation(
+            "bank_accounts", condition=Q(bank_accounts__pk=Subquery(first_bank_account))
+        ),
+    ).annotate(**annotations)
 
 class UnifiedProfileForm(forms.ModelForm):
     """Unified form to update Contact, Address, and BankAccount in one form."""
@@ -36,47 +69,81 @@ class UnifiedProfileForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         """Pre-fill the form with existing data from Contact, Address, and BankAccount."""
         user = kwargs.pop("user", None)  # Pass user manually
+        if user is not None and not hasattr(user, "profile_address_id"):
+            user = profile_queryset().get(pk=user.pk)
+            kwargs["instance"] = user
         super().__init__(*args, **kwargs)
 
         if user:
-            # Prefill Address if available
-            address = Address.objects.filter(contact=user).first()
-            if address:
-                self.fields["address_type"].initial = address.type
-                self.fields["address_line_1"].initial = address.address_line_1
-                self.fields["address_line_2"].initial = address.address_line_2
-                self.fields["postal_code"].initial = address.postal_code
-                self.fields["city"].initial = address.city
-                self.fields["country"].initial = address.country
-
-            # Prefill BankAccount if available
-            bank_account = BankAccount.objects.filter(contact=user).first()
-            if bank_account:
-                self.fields["account_holder"].initial = bank_account.account_holder
-                self.fields["iban"].initial = bank_account.iban
-                self.fields["bic"].initial = bank_account.bic
+            for name in (*ADDRESS_FIELDS, *BANK_ACCOUNT_FIELDS):
+                self.fields[name].initial = getattr(user, f"profile_{name}")
+
+    def clean_iban(self):
+        iban = normalize_iban(self.cleaned_data["iban"])
+        if iban:
+            validate_iban(iban)
+        return iban
 
+    def clean_bic(self):
+        bic = self.cleaned_data["bic"].replace(" ", "").upper()
+        if bic:
+            validate_bic(bic)
+        return bic
+
+    def clean(self):
+        """A new or edited address or bank account needs the fields its model requires."""
+        cleaned_data = super().clean()
+        if cleaned_data.get("iban") and not cleaned_data.get("bic") and "bic" not in self.errors:
+            cleaned_data["bic"] = lookup_bic(cleaned_data["iban"]) or ""
+        for fields, model in ((ADDRESS_FIELDS, Address), (BANK_ACCOUNT_FIELDS, BankAccount)):
+            if not any(cleaned_data.get(name) for name in fields):
+                continue
+            for name, field in fields.items():
+                if not model._meta.get_field(field).blank and not cleaned_data.get(name):
+                    self.add_error(name, forms.ValidationError(self.fields[name].error_messages["required"]))
+
+        # Unique constraints on the related rows: one address per type, and an IBAN belongs to one account
+        address_id = getattr(self.instance, "profile_address_id", None)
+        if "address_type" in self.changed_data and self.instance.pk and Address.objects.filter(
+            contact=self.instance, type=cleaned_data.get("address_type", "")
+        ).exclude(pk=address_id).exists():
+            self.add_error("address_type", _("You already have an address of this type."))
+        bank_account_id = getattr(self.instance, "profile_bank_account_id", None)
+        if self._related_changed("iban") and cleaned_data.get("iban") and BankAccount.objects.filter(
+            iban=cleaned_data["iban"]
+        ).exclude(pk=bank_account_id).exists():
+            self.add_error("iban", _("This IBAN is already registered."))
+        return cleaned_data
+
+    @transaction.atomic
     def save(self, commit=True, user=None):
-        """Save Contact, Address, and BankAccount together."""
-        contact = super().save(commit=False)  # Save Contact model fields
-        if commit:
-            contact.save()
-
-        # Save Address
-        address, _ = Address.objects.get_or_create(contact=contact)
-        address.type = self.cleaned_data["address_type"]
-        address.address_line_1 = self.cleaned_data["address_line_1"]
-        address.address_line_2 = self.cleaned_data["address_line_2"]
-        address.postal_code = self.cleaned_data["postal_code"]
-        address.city = self.cleaned_data["city"]
-        address.country = self.cleaned_data["country"]
-        address.save()
-
-        # Save BankAccount
-        bank_account, _ = BankAccount.objects.get_or_create(contact=contact)
-        bank_account.account_holder = self.cleaned_data["account_holder"]
-        bank_account.iban = self.cleaned_data["iban"]
-        bank_account.bic = self.cleaned_data["bic"]
-        bank_account.save()
+        """
+        Save Contact, Address, and BankAccount together, writing only the fields that changed.
+        An address or bank account is created once any of its fields is filled in.
+        """
+        contact = super().save(commit=False)
+        if not commit:
+            return contact
 
+        changed = [name for name in self._meta.fields if name in self.changed_data]
+        if changed or contact._state.adding:
+            contact.save(update_fields=None if contact._state.adding else [*changed, "updated_at"])
+        self._save_related(contact, Address, ADDRESS_FIELDS, getattr(contact, "profile_address_id", None))
+        self._save_related(
+            contact, BankAccount, BANK_ACCOUNT_FIELDS, getattr(contact, "profile_bank_account_id", None)
+        )
         return contact
+
+    def _related_changed(self, name):
+        # Compared after cleaning, which normalizes IBANs and may fill in the BIC
+        return self.cleaned_data.get(name, "") != (self.fields[name].initial or "")
+
+    def _save_related(self, contact, model, fields, pk):
+        changed = {field: self.cleaned_data[name] for name, field in fields.items() if self._related_changed(name)}
+        if not changed:
+            return
+        if pk is None:
+            model.objects.create(contact=contact, **{field: self.cleaned_data[name] for name, field in fields.items()})
+        else:
+            # One UPDATE of the changed columns, without loading the row first
+            model(pk=pk, contact=contact, **changed).save(update_fields=[*changed, "updated_at"])
@@ -0,0 +1,49 @@
+import random
+import re
+import time
+
+from django.core.management.base import BaseCommand
+
+from contacts.iban import LETTER_DIGITS, STRUCTURES, get_directory, iban_error, lookup_bic, normalize_iban
+
+ALPHABETS = {"n": "0123456789", "a": "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "c": "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"}
+
+
+def random_iban(rng, country):
+    """A valid IBAN of `country` with a random BBAN."""
+    bban = "".join(
+        rng.choice(ALPHABETS[kind])
+        for count, kind in re.findall(r"(\d+)([nac])", STRUCTURES[country][0])
+        for _ in range(int(count))
+    )
+    check = 98 - int((bban + country + "00").translate(LETTER_DIGITS)) % 97
+    return f"{country}{check:02d}{bban}"
+
+
+class Command(BaseCommand):
+    help = "Time IBAN validation and BIC lookup on random valid IBANs of the countries in contacts.iban."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=100000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        countries = sorted(STRUCTURES)
+        ibans = [
+            " ".join(iban[i:i + 4] for i in range(0, len(iban), 4))  # As typed, in groups of four
+            for iban in (random_iban(rng, rng.choice(countries)) for _ in range(options["count"]))
+        ]
+        get_directory()
+
+        started = time.perf_counter()
+        invalid = sum(iban_error(normalize_iban(iban)) is not None for iban in ibans)
+        validated = time.perf_counter() - started
+        started = time.perf_counter()
+        found = sum(lookup_bic(normalize_iban(iban)) is not None for iban in ibans)
+        looked_up = time.perf_counter() - started
+
+        self.stdout.write(
+            f"{len(ibans)} IBANs: validated in {validated:.3f}s ({len(ibans) / validated:,.0f}/s, {invalid} invalid), "
+            f"BIC lookups in {looked_up:.3f}s ({len(ibans) / looked_up:,.0f}/s, {found} found "
+            f"in a directory of {len(get_directory())} banks)"
+        )
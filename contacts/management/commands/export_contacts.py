@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from contacts.transfer import CHUNK_SIZE, stream_csv, write_xlsx
+
+
+class Command(BaseCommand):
+    help = "Export all contacts with their addresses and bank accounts in the format import_contacts reads."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="-", help="CSV or XLSX (needs openpyxl) file; - for stdout")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Contacts read per query")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        try:
+            if path.lower().endswith(".xlsx"):
+                write_xlsx(path, chunk_size=options["chunk_size"])
+            elif path == "-":
+                for chunk in stream_csv(chunk_size=options["chunk_size"]):
+                    self.stdout.write(chunk, ending="")
+            else:
+                with open(path, "w", encoding="utf-8", newline="") as file:
+                    file.writelines(stream_csv(chunk_size=options["chunk_size"]))
+        except (OSError, ImportError) as exc:
+            raise CommandError(exc)
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from contacts.transfer import CHUNK_SIZE, COLUMNS, import_contacts, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update contacts with their addresses and bank accounts from a CSV or XLSX file, matched by "
+        f"customer number. Columns: {', '.join(COLUMNS)}, and optionally password (set for new active contacts)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file, or XLSX file (needs openpyxl)")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows upserted per transaction")
+        parser.add_argument("--encoding", default="utf-8-sig", help="Encoding of a CSV file")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["path"], "rb") as file:
+                result = import_contacts(
+                    read_rows(file, options["path"], options["encoding"]), chunk_size=options["chunk_size"]
+                )
+        except (OSError, ImportError, UnicodeDecodeError) as exc:
+            raise CommandError(exc)
+
+        for error in result.errors:
+            for column, messages in error["errors"].items():
+                self.stderr.write(f"Line {error['row']}: {column}: {' '.join(messages)}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.contacts} contacts, {result.addresses} addresses and {result.bank_accounts} bank "
+            f"accounts; skipped {len(result.errors)} invalid rows."
+        ))
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 12:21
+
+from django.db import migrations
+
+
+def make_address_types_distinct(apps, schema_editor):
+    """
+    Prepare the (contact, type) unique constraint: untyped addresses get an empty type, and of
+    several addresses of one contact with the same type only the newest keeps it; the older
+    ones get their id appended.
+    """
+    Address = apps.get_model("contacts", "Address")
+    Address.objects.filter(type__isnull=True).update(type="")
+    seen, renamed = set(), []
+    for address in Address.objects.order_by("contact_id", "type", "-created_at", "-id").only("id", "contact_id", "type"):
+        key = (address.contact_id, address.type)
+        if key in seen:
+            address.type = f"{address.type[:90]} #{address.pk}".strip()
+            renamed.append(address)
+        seen.add(key)
+    Address.objects.bulk_update(renamed, ["type"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contacts', '0002_bankaccount'),
+    ]
+
+    operations = [
+        migrations.RunPython(make_address_types_distinct, migrations.RunPython.noop),
+    ]
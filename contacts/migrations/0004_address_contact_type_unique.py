@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-18 12:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contacts', '0003_address_distinct_types'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='address',
+            name='type',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='Address Type'),
+        ),
+        migrations.AddConstraint(
+            model_name='address',
+            constraint=models.UniqueConstraint(fields=('contact', 'type'), name='address_contact_type_unique'),
+        ),
+    ]
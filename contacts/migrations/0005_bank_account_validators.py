@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-18 12:30
+
+import contacts.iban
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contacts', '0004_address_contact_type_unique'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bankaccount',
+            name='bic',
+            field=models.CharField(blank=True, max_length=11, null=True, validators=[contacts.iban.validate_bic], verbose_name='BIC/SWIFT'),
+        ),
+        migrations.AlterField(
+            model_name='bankaccount',
+            name='iban',
+            field=models.CharField(max_length=34, unique=True, validators=[contacts.iban.validate_iban], verbose_name='IBAN'),
+        ),
+    ]
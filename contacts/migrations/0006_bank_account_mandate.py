@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 12:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contacts', '0005_bank_account_validators'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bankaccount',
+            name='mandate_id',
+            field=models.CharField(blank=True, default='', help_text='Reference of the direct debit mandate signed for this account, if any.', max_length=35, verbose_name='SEPA Mandate Reference'),
+        ),
+        migrations.AddField(
+            model_name='bankaccount',
+            name='mandate_signed_on',
+            field=models.DateField(blank=True, null=True, verbose_name='Mandate Signed On'),
+        ),
+    ]
@@ -2,6 +2,8 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from .iban import normalize_iban, validate_bic, validate_iban
+
 
 class Contact(AbstractUser):
     """
@@ -31,7 +33,7 @@ class Address(models.Model):
     Each contact can have multiple addresses.
     """
     contact = models.ForeignKey(Contact, on_delete=models.CASCADE, related_name="addresses")
-    type = models.CharField(max_length=100, blank=True, null=True, verbose_name=_("Address Type"))
+    type = models.CharField(max_length=100, blank=True, default="", verbose_name=_("Address Type"))
 
     country = models.CharField(max_length=2, verbose_name=_("Country"), help_text="ISO 3166-1 alpha-2 code (e.g., DE, US)")
     address_line_1 = models.CharField(max_length=255, verbose_name=_("Address Line 1"))
@@ -49,6 +51,10 @@ class Address(models.Model):
 
     class Meta:
         ordering = ["-created_at"]  # ✅ Show newest addresses first
+        constraints = [
+            # One address per type and contact; the key that imports upsert on
+            models.UniqueConstraint(fields=["contact", "type"], name="address_contact_type_unique"),
+        ]
 
     def __str__(self):
         """Generate a structured address string."""
@@ -71,8 +77,13 @@ class BankAccount(models.Model):
         Contact, on_delete=models.CASCADE, related_name="bank_accounts", verbose_name=_("Contact")
     )
     account_holder = models.CharField(max_length=255, verbose_name=_("Account Holder Name"))
-    iban = models.CharField(max_length=34, unique=True, verbose_name=_("IBAN"))
-    bic = models.CharField(max_length=11, blank=True, null=True, verbose_name=_("BIC/SWIFT"))
+    iban = models.CharField(max_length=34, unique=True, validators=[validate_iban], verbose_name=_("IBAN"))
+    bic = models.CharField(max_length=11, blank=True, null=True, validators=[validate_bic], verbose_name=_("BIC/SWIFT"))
+    mandate_id = models.CharField(
+        max_length=35, blank=True, default="", verbose_name=_("SEPA Mandate Reference"),
+        help_text=_("Reference of the direct debit mandate signed for this account, if any."),
+    )
+    mandate_signed_on = models.DateField(blank=True, null=True, verbose_name=_("Mandate Signed On"))
 
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Last Updated"))
@@ -81,5 +92,11 @@ class BankAccount(models.Model):
         verbose_name = _("Bank Account")
         verbose_name_plural = _("Bank Accounts")
 
+    def clean(self):
+        """Store IBAN and BIC in their electronic format, without spaces."""
+        self.iban = normalize_iban(self.iban)
+        if self.bic:
+            self.bic = self.bic.replace(" ", "").upper()
+
     def __str__(self):
         return f"{self.account_holder} - {self.iban}"
@@ -1,3 +1,235 @@
+import io
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .forms import profile_queryset
+from .iban import BankDirectory, iban_error, lookup_bic, normalize_iban
+from .models import Address, BankAccount, Contact
+from .transfer import import_contacts, read_csv
+
+
+def create_contact(username, **kwargs):
+    return Contact.objects.create_user(
+        username=username, email=f"{username}@example.com", password="x", customer_number=f"C-{username}", **kwargs
+    )
+
+
+def add_address(contact, city):
+    return Address.objects.create(
+        contact=contact, type=city, country="AT", address_line_1="Hauptstraße 1", postal_code="1010", city=city
+    )
+
+
+class ProfileTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_contact("tenant")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def post(self, **data):
+        fields = {
+            "email": self.user.email, "first_name": "", "last_name": "", "company_name": "", "phone_number": "",
+            "address_type": "", "address_line_1": "", "address_line_2": "", "postal_code": "", "city": "",
+            "country": "", "account_holder": "", "iban": "", "bic": "",
+        }
+        return self.client.post(reverse("profile"), {**fields, **data})
+
+    def test_profile_loads_in_one_query(self):
+        add_address(self.user, "Graz")
+        add_address(self.user, "Wien")
+        BankAccount.objects.create(contact=self.user, account_holder="Tenant", iban="AT611904300234573201")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("profile"))
+        # Session and user for authentication, then the profile
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(response.context["form"]["city"].value(), "Wien")
+        self.assertEqual(response.context["form"]["iban"].value(), "AT611904300234573201")
+
+    def test_save_updates_newest_address(self):
+        old = add_address(self.user, "Graz")
+        new = add_address(self.user, "Wien")
+        response = self.post(
+            address_type=new.type, address_line_1=new.address_line_1, postal_code=new.postal_code, city="Linz",
+            country=new.country,
+        )
+        self.assertRedirects(response, reverse("profile"))
+        self.assertEqual(Address.objects.get(pk=new.pk).city, "Linz")
+        self.assertEqual(Address.objects.get(pk=old.pk).city, "Graz")
+        self.assertFalse(BankAccount.objects.exists())
+
+    def test_save_writes_only_changed_fields(self):
+        address = add_address(self.user, "Wien")
+        with CaptureQueriesContext(connection) as queries:
+            self.post(
+                first_name="Toni", address_type=address.type, address_line_1=address.address_line_1,
+                postal_code=address.postal_code, city=address.city, country=address.country,
+            )
+        updates = [query["sql"] for query in queries if query["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)  # The address is unchanged
+        self.assertIn('"first_name"', updates[0])
+        self.assertNotIn('"email"', updates[0])
+        self.assertEqual(profile_queryset().get(pk=self.user.pk).first_name, "Toni")
+
+    def test_incomplete_bank_account_is_rejected(self):
+        response = self.post(account_holder="Tenant")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("iban", response.context["form"].errors)
+        self.assertFalse(BankAccount.objects.exists())
+
+
+class ContactAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Contact.objects.create_superuser(
+            username="admin", email="admin@example.com", password="x", customer_number="C-ADMIN"
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def create_contacts(self, count):
+        for _ in range(count):
+            contact = create_contact(f"c{Contact.objects.count()}")
+            add_address(contact, "Wien")
+            BankAccount.objects.create(contact=contact, account_holder=contact.username, iban=f"IBAN{contact.pk}")
+
+    def test_changelist_queries_are_constant(self):
+        url = reverse("admin:contacts_contact_changelist")
+        self.create_contacts(1)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        self.create_contacts(10)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url)
+        self.assertEqual(len(large), len(small))
+        self.assertContains(response, "IBAN2")
+
+
+IMPORT_CSV = """\
+customer_number,email,company_name,is_active,address_type,address_line_1,postal_code,city,country,account_holder,iban
+K-1,k1@example.com,Heizwerk,yes,billing,Ring 1,1010,Wien,AT,Heizwerk GmbH,AT61 1904 3002 3457 3201
+K-1,k1@example.com,Heizwerk,yes,site,Werkstraße 2,8010,Graz,AT,,
+K-2,not-an-email,,no,,,,,,,
+K-3,,,no,,,,,,,
+"""
+
+
+class ContactImportTests(TestCase):
+    def import_csv(self, text, **kwargs):
+        return import_contacts(read_csv(io.BytesIO(text.encode())), **kwargs)
+
+    def test_import_and_reimport(self):
+        result = self.import_csv(IMPORT_CSV, chunk_size=2)
+        self.assertEqual([error["row"] for error in result.errors], [4])
+        self.assertIn("email", result.errors[0]["errors"])
+        self.assertEqual((result.contacts, result.addresses, result.bank_accounts), (2, 2, 1))
+        contact = Contact.objects.get(customer_number="K-1")
+        self.assertEqual(contact.username, "K-1")
+        self.assertEqual(sorted(contact.addresses.values_list("type", "city")), [("billing", "Wien"), ("site", "Graz")])
+        self.assertEqual(contact.bank_accounts.get().iban, "AT611904300234573201")
+        self.assertFalse(Contact.objects.get(customer_number="K-3").has_usable_password())
+
+        self.import_csv(IMPORT_CSV.replace("8010,Graz", "8020,Graz"))
+        self.assertEqual(Contact.objects.count(), 2)
+        self.assertEqual(Address.objects.count(), 2)
+        self.assertEqual(Address.objects.get(type="site").postal_code, "8020")
+
+    def test_invalid_iban_is_rejected_and_bic_filled_in(self):
+        result = self.import_csv(
+            "customer_number,account_holder,iban\n"
+            "K-1,A,DE89 3704 0044 0532 0130 01\n"
+            "K-2,B,DE89 3704 0044 0532 0130 00\n"
+        )
+        self.assertEqual([error["row"] for error in result.errors], [2])
+        self.assertEqual(BankAccount.objects.get().bic, "COBADEFFXXX")
+
+    def test_iban_of_another_contact_is_rejected(self):
+        other = create_contact("other")
+        BankAccount.objects.create(contact=other, account_holder="Other", iban="AT611904300234573201", mandate_id="M-1")
+        result = self.import_csv(IMPORT_CSV)
+        errors = {error["row"]: error["errors"] for error in result.errors}
+        self.assertEqual(sorted(errors), [2, 4])
+        self.assertEqual(errors[2], {"iban": ["This IBAN belongs to another contact."]})
+        self.assertEqual(BankAccount.objects.get().contact, other)
+
+        result = self.import_csv(
+            "customer_number,account_holder,iban\nK-7,A,DE89370400440532013000\nK-8,B,DE89370400440532013000\n"
+        )
+        self.assertEqual([error["row"] for error in result.errors], [3])
+        self.assertEqual(BankAccount.objects.get(iban="DE89370400440532013000").contact.customer_number, "K-7")
+
+    def test_username_taken_by_another_contact(self):
+        create_contact("K-9")
+        result = self.import_csv("customer_number,username\nK-10,K-9\n")
+        self.assertEqual(result.errors, [{"row": 2, "errors": {"username": ["This username is already taken."]}}])
+
+    def test_commands_round_trip(self):
+        self.import_csv(IMPORT_CSV)
+        stdout = io.StringIO()
+        call_command("export_contacts", stdout=stdout)
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(len(lines), 1 + 2 + 1)  # Header, K-1 with two addresses, K-3
+        self.assertIn("AT611904300234573201", stdout.getvalue())
+
+        Address.objects.all().delete()
+        with tempfile.NamedTemporaryFile("w", suffix=".csv") as file:
+            file.write(stdout.getvalue())
+            file.flush()
+            call_command("import_contacts", file.name, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(Address.objects.count(), 2)
+
+    def test_admin_import_and_export(self):
+        admin = Contact.objects.create_superuser(
+            username="admin", email="admin@example.com", password="x", customer_number="C-ADMIN"
+        )
+        self.client.force_login(admin)
+        upload = SimpleUploadedFile("contacts.csv", IMPORT_CSV.encode(), content_type="text/csv")
+        response = self.client.post(reverse("admin:contacts_contact_import"), {"file": upload})
+        self.assertRedirects(response, reverse("admin:contacts_contact_changelist"))
+        self.assertEqual(Contact.objects.filter(customer_number__startswith="K-").count(), 2)
+
+        response = self.client.post(reverse("admin:contacts_contact_changelist"), {
+            "action": "export_csv", "_selected_action": list(Contact.objects.values_list("pk", flat=True)),
+        })
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len([line for line in lines if line.startswith("K-1,")]), 2)
+
+
+class IbanTests(TestCase):
+    def test_valid_ibans(self):
+        for iban in (
+            "DE89 3704 0044 0532 0130 00", "at611904300234573201", "GB29NWBK60161331926819",
+            "FR1420041010050500013M02606", "NL91ABNA0417164300", "CH9300762011623852957",
+        ):
+            self.assertIsNone(iban_error(normalize_iban(iban)), iban)
+
+    def test_invalid_ibans(self):
+        self.assertIn("check digits", iban_error("DE89370400440532013001"))
+        self.assertIn("22 characters", iban_error("DE8937040044053201300"))
+        self.assertIn("22 characters", iban_error("DE89370400440532O13000"))
+        self.assertIsNotNone(iban_error("XX00"))
+
+    def test_bank_directory(self):
+        directory = BankDirectory([("DE37040044", "COBADEFFXXX"), ("AT12000", "BKAUATWWXXX")])
+        self.assertEqual(directory.lookup("DE37040044"), "COBADEFFXXX")
+        self.assertIsNone(directory.lookup("DE37040045"))
+        self.assertEqual(lookup_bic("NL91ABNA0417164300"), "ABNANL2AXXX")
 
-# Create your tests here.
+    def test_profile_validates_iban_and_fills_in_bic(self):
+        user = create_contact("tenant")
+        self.client.force_login(user)
+        fields = {"email": user.email, "account_holder": "Tenant"}
+        response = self.client.post(reverse("profile"), {**fields, "iban": "DE89 3704 0044 0532 0130 01"})
+        self.assertIn("iban", response.context["form"].errors)
+        self.client.post(reverse("profile"), {**fields, "iban": "de89 3704 0044 0532 0130 00"})
+        bank_account = BankAccount.objects.get(contact=user)
+        self.assertEqual((bank_account.iban, bank_account.bic), ("DE89370400440532013000", "COBADEFFXXX"))
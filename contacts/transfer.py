@@ -0,0 +1,326 @@
+"""
+Bulk import and export of contacts with their addresses and bank accounts.
+
+A file (CSV, or XLSX with openpyxl installed) has a header row naming some of `COLUMNS` and one
+row per contact, address and/or bank account: a contact with two addresses takes two rows with
+the same `customer_number`. Rows are read lazily and upserted in chunks, one transaction and
+a handful of queries per chunk. Each chunk runs one `bulk_create(update_conflicts=True)` per model,
+keyed on `customer_number`, (contact, `address_type`) and `iban`, so re-importing a file
+updates rows in place. IBANs are checked with `contacts.iban`, which also fills in missing BICs
+from the bank directory.
+
+Contacts that are new get the `username` of their row (by default their customer number) and
+an unusable password; only active contacts with a `password` column get it hashed, since
+hashing is by far the slowest part of an import. Existing contacts keep their username and
+password. Export writes the same columns, reading contacts in chunks with their addresses and
+bank accounts prefetched, so neither direction holds a whole file or table in memory.
+"""
+import csv
+import io
+import secrets
+from dataclasses import dataclass, field
+from itertools import islice, zip_longest
+
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX, make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import Q
+from django.utils.translation import gettext as _
+
+from .iban import BIC, iban_error, lookup_bic, normalize_iban
+from .models import Address, BankAccount, Contact
+
+try:
+    import openpyxl
+except ImportError:  # XLSX support is optional
+    openpyxl = None
+
+CONTACT_FIELDS = [
+    "customer_number", "username", "email", "first_name", "last_name", "company_name", "tax_number", "uid_number",
+    "phone_number", "is_active",
+]
+# Column -> Address field
+ADDRESS_FIELDS = {
+    "address_type": "type",
+    "address_line_1": "address_line_1",
+    "address_line_2": "address_line_2",
+    "address_line_3": "address_line_3",
+    "postal_code": "postal_code",
+    "city": "city",
+    "state": "state",
+    "country": "country",
+    "is_residential": "is_residential",
+}
+BANK_ACCOUNT_FIELDS = ["account_holder", "iban", "bic"]
+COLUMNS = [*CONTACT_FIELDS, *ADDRESS_FIELDS, *BANK_ACCOUNT_FIELDS]
+
+# Written on conflict; the username, password and staff flags of existing contacts are kept
+CONTACT_UPDATE_FIELDS = [name for name in CONTACT_FIELDS if name not in ("customer_number", "username")]
+TRUE_VALUES = {"1", "true", "yes", "y", "t"}
+FALSE_VALUES = {"0", "false", "no", "n", "f"}
+CHUNK_SIZE = 1000
+
+
+@dataclass
+class ImportResult:
+    contacts: int = 0
+    addresses: int = 0
+    bank_accounts: int = 0
+    errors: list = field(default_factory=list)
+
+
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # Spreadsheet cells holding numbers such as customer numbers
+    return str(value).strip()
+
+
+def _parse_bool(value, default):
+    text = _text(value).lower()
+    if not text:
+        return default
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError
+
+
+def _value(model, name, text):
+    """`text` for the field `name`, with blanks as NULL where the field allows it."""
+    return None if not text and model._meta.get_field(name).null else text
+
+
+def read_csv(file, encoding="utf-8-sig"):
+    """Rows of a CSV file opened in binary mode, read as they are consumed."""
+    yield from csv.DictReader(io.TextIOWrapper(file, encoding=encoding, newline=""))
+
+
+def read_xlsx(file):
+    """Rows of the first sheet of an XLSX file; needs openpyxl."""
+    if openpyxl is None:
+        raise ImportError(_("Reading XLSX files requires openpyxl."))
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [_text(name) for name in next(rows, ())]
+        for values in rows:
+            yield dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def read_rows(file, name, encoding="utf-8-sig"):
+    """Rows of an uploaded or opened file, by the extension of its `name`."""
+    if name.lower().endswith(".xlsx"):
+        return read_xlsx(file)
+    return read_csv(file, encoding)
+
+
+def validate_row(row):
+    """
+    Check one row and split it into contact, address and bank account fields. The address and
+    bank account are None if the row has none of their columns filled in.
+    Returns `(contact, address, bank_account, errors)`.
+    """
+    errors = {}
+    contact = {name: _text(row.get(name)) for name in CONTACT_FIELDS}
+    if not contact["customer_number"]:
+        errors["customer_number"] = [_("This field is required.")]
+    contact["username"] = contact["username"] or contact["customer_number"]
+    if contact["email"]:
+        try:
+            validate_email(contact["email"])
+        except ValidationError as exc:
+            errors["email"] = exc.messages
+    try:
+        contact["is_active"] = _parse_bool(row.get("is_active"), True)
+    except ValueError:
+        errors["is_active"] = [_("Must be a valid boolean.")]
+
+    address = {field_name: _text(row.get(name)) for name, field_name in ADDRESS_FIELDS.items()}
+    if not any(value for name, value in address.items() if name != "is_residential"):
+        address = None
+    else:
+        for name, field_name in ADDRESS_FIELDS.items():
+            if name != "is_residential" and not Address._meta.get_field(field_name).blank and not address[field_name]:
+                errors[name] = [_("This field is required.")]
+        try:
+            address["is_residential"] = _parse_bool(address["is_residential"], False)
+        except ValueError:
+            errors["is_residential"] = [_("Must be a valid boolean.")]
+
+    bank_account = {name: _text(row.get(name)) for name in BANK_ACCOUNT_FIELDS}
+    if not any(bank_account.values()):
+        bank_account = None
+    else:
+        bank_account["iban"] = normalize_iban(bank_account["iban"])
+        bank_account["bic"] = bank_account["bic"].replace(" ", "").upper()
+        for name in ("account_holder", "iban"):
+            if not bank_account[name]:
+                errors[name] = [_("This field is required.")]
+        if bank_account["iban"] and (error := iban_error(bank_account["iban"])):
+            errors["iban"] = [str(error)]
+        elif bank_account["bic"] and not BIC.fullmatch(bank_account["bic"]):
+            errors["bic"] = [_("Enter a valid BIC (8 or 11 characters).")]
+        elif bank_account["iban"] and not bank_account["bic"]:
+            bank_account["bic"] = lookup_bic(bank_account["iban"]) or ""
+
+    for model, values, columns in (
+        (Contact, contact, {name: name for name in CONTACT_FIELDS}),
+        (Address, address, ADDRESS_FIELDS),
+        (BankAccount, bank_account, {name: name for name in BANK_ACCOUNT_FIELDS}),
+    ):
+        for name, field_name in columns.items():
+            limit = model._meta.get_field(field_name).max_length
+            if values is not None and limit and len(str(values[field_name])) > limit:
+                errors[name] = [_("Ensure this value has at most %(limit)d characters.") % {"limit": limit}]
+    return contact, address, bank_account, errors
+
+
+def import_contacts(rows, chunk_size=CHUNK_SIZE, password_column="password"):
+    """
+    Upsert the contacts, addresses and bank accounts of `rows` (dicts keyed by `COLUMNS`),
+    `chunk_size` rows at a time. Invalid rows are skipped and reported as
+    `{"row": line, "errors": {column: [messages]}}`, where `line` counts the header as line 1.
+    """
+    result = ImportResult()
+    numbered = enumerate(rows, start=2)
+    while chunk := list(islice(numbered, chunk_size)):
+        _import_chunk(chunk, result, password_column)
+    return result
+
+
+def _import_chunk(chunk, result, password_column):
+    validated = []
+    for line, row in chunk:
+        contact, address, bank_account, errors = validate_row(row)
+        if errors:
+            result.errors.append({"row": line, "errors": errors})
+        else:
+            validated.append((line, row, contact, address, bank_account))
+
+    # Usernames must not be taken by a contact with another customer number
+    numbers = {contact["customer_number"] for _line, _row, contact, _address, _bank_account in validated}
+    usernames = {contact["username"] for _line, _row, contact, _address, _bank_account in validated}
+    owners = {
+        username: number for number, username in Contact.objects.filter(
+            Q(customer_number__in=numbers) | Q(username__in=usernames)
+        ).values_list("customer_number", "username")
+    }
+    existing = set(owners.values()) & numbers
+    # Bank accounts never move to another contact: their mandates were signed by the owner
+    ibans = {bank_account["iban"] for *_rest, bank_account in validated if bank_account is not None}
+    account_owners = dict(BankAccount.objects.filter(iban__in=ibans).values_list("iban", "contact__customer_number"))
+
+    contacts, addresses, bank_accounts = {}, {}, {}
+    for line, row, contact, address, bank_account in validated:
+        number = contact["customer_number"]
+        if number not in existing and owners.setdefault(contact["username"], number) != number:
+            result.errors.append({"row": line, "errors": {"username": [_("This username is already taken.")]}})
+            continue
+        if bank_account is not None and account_owners.setdefault(bank_account["iban"], number) != number:
+            result.errors.append({"row": line, "errors": {"iban": [_("This IBAN belongs to another contact.")]}})
+            continue
+        if number not in contacts:
+            password = _text(row.get(password_column)) if number not in existing and contact["is_active"] else ""
+            instance = Contact(**{name: _value(Contact, name, value) for name, value in contact.items()})
+            # Like make_password(None), without drawing its 40 characters one by one from SystemRandom
+            if password:
+                instance.password = make_password(password)
+            else:
+                instance.password = UNUSABLE_PASSWORD_PREFIX + secrets.token_hex(20)
+            contacts[number] = instance
+        else:
+            for name, value in contact.items():
+                if name in CONTACT_UPDATE_FIELDS:
+                    setattr(contacts[number], name, _value(Contact, name, value))
+        # The last row wins for duplicate keys: one statement may not update a row twice
+        if address is not None:
+            addresses[number, address["type"]] = address
+        if bank_account is not None:
+            bank_accounts[bank_account["iban"]] = (number, bank_account)
+
+    if not contacts:
+        return
+    with transaction.atomic():
+        Contact.objects.bulk_create(
+            contacts.values(), update_conflicts=True, unique_fields=["customer_number"],
+            update_fields=[*CONTACT_UPDATE_FIELDS, "updated_at"],
+        )
+        ids = dict(Contact.objects.filter(customer_number__in=contacts).values_list("customer_number", "id"))
+        Address.objects.bulk_create(
+            [
+                Address(
+                    contact_id=ids[number], **{name: _value(Address, name, value) for name, value in fields.items()}
+                )
+                for (number, _type), fields in addresses.items()
+            ],
+            update_conflicts=True, unique_fields=["contact", "type"],
+            update_fields=[*(name for name in ADDRESS_FIELDS.values() if name != "type"), "updated_at"],
+        )
+        BankAccount.objects.bulk_create(
+            [
+                BankAccount(
+                    contact_id=ids[number], **{name: _value(BankAccount, name, value) for name, value in fields.items()}
+                )
+                for number, fields in bank_accounts.values()
+            ],
+            update_conflicts=True, unique_fields=["iban"],
+            update_fields=["account_holder", "bic", "updated_at"],
+        )
+    result.contacts += len(contacts)
+    result.addresses += len(addresses)
+    result.bank_accounts += len(bank_accounts)
+
+
+def export_rows(queryset=None, chunk_size=CHUNK_SIZE):
+    """
+    Lists of `COLUMNS` values for `queryset` (default: all contacts), one row per address or
+    bank account of a contact (paired up in order) or one row for a contact with neither.
+    """
+    queryset = Contact.objects.all() if queryset is None else queryset
+    queryset = queryset.order_by("pk").prefetch_related("addresses", "bank_accounts")
+    for contact in queryset.iterator(chunk_size=chunk_size):
+        values = [getattr(contact, name) for name in CONTACT_FIELDS]
+        bank_accounts = sorted(contact.bank_accounts.all(), key=lambda bank_account: bank_account.pk)
+        for address, bank_account in list(zip_longest(contact.addresses.all(), bank_accounts)) or [(None, None)]:
+            row = values.copy()
+            row.extend(getattr(address, name, None) for name in ADDRESS_FIELDS.values())
+            row.extend(getattr(bank_account, name, None) for name in BANK_ACCOUNT_FIELDS)
+            yield ["" if value is None else value for value in row]
+
+
+class Echo:
+    """A file-like object whose `write()` returns what it is given, for `csv.writer`."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(queryset=None, chunk_size=CHUNK_SIZE):
+    """The export as CSV text in chunks of `chunk_size` rows, header first."""
+    writer = csv.writer(Echo())
+    lines = [writer.writerow(COLUMNS)]
+    for row in export_rows(queryset, chunk_size):
+        lines.append(writer.writerow(row))
+        if len(lines) >= chunk_size:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+def write_xlsx(file, queryset=None, chunk_size=CHUNK_SIZE):
+    """Write the export to an XLSX file with openpyxl's streaming writer."""
+    if openpyxl is None:
+        raise ImportError(_("Writing XLSX files requires openpyxl."))
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(COLUMNS)
+    for row in export_rows(queryset, chunk_size):
+        sheet.append(row)
+    workbook.save(file)
@@ -1,17 +1,19 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from .forms import UnifiedProfileForm
+from django.core.handlers.asgi import ASGIRequest
+from .forms import UnifiedProfileForm, profile_queryset
 
 @login_required
 def user_dashboard(request):
-    return render(request, "contacts/dashboard.html")
+    # The live readings stream is endless, which only an ASGI server can serve
+    return render(request, "contacts/dashboard.html", {"live_events": isinstance(request, ASGIRequest)})
 
 @login_required
 def profile_settings(request):
     """Allows users to update all profile data (Contact, Address, BankAccount) in one form."""
     
-    user = request.user
+    user = profile_queryset().get(pk=request.user.pk)  # The contact, its address and bank account
 
     if request.method == "POST":
         form = UnifiedProfileForm(request.POST, instance=user, user=user)
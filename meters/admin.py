@@ -1,14 +1,105 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import F, Q
+from django.http import QueryDict
+from django.utils.functional import cached_property
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
-from .models import Unit, ConsumptionType, Meter, ConversionFactor, MeterReading, Expense
+from .thumbnails import thumbnail_url
+from .models import Unit, ConsumptionType, Meter, ConversionFactor, MeterReading, Expense, BillingRun, CostAllocation, OCRJob, MonthlyConsumption, PlausibilityFlag
+
+
+def estimated_count(queryset):
+    """
+    A cheap estimate of the rows in the table of `queryset` from the PostgreSQL planner
+    statistics. None elsewhere, or if there is no usable estimate: other databases have no
+    statistics, and the highest primary key overcounts once rows have been deleted.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        # -1 until the table has been vacuumed or analyzed for the first time
+        return row[0] if row and row[0] >= 0 else None
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counts an unfiltered changelist from `estimated_count()` instead of `COUNT(*)`, which reads
+    the whole table. Filtered changelists, and tables estimated below `exact_below` rows, get an
+    exact count.
+    """
+    exact_below = 10000
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            estimate = estimated_count(self.object_list)
+            if estimate is not None and estimate >= self.exact_below:
+                return estimate
+        return super().count
+
+
+class InputFilter(admin.SimpleListFilter):
+    """A list filter with a text box instead of a link for every related object."""
+    template = "admin/meters/input_filter.html"
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        query_string = changelist.get_query_string(remove=[self.parameter_name])
+        # The other parameters go into hidden inputs; the page is dropped since the filter changes the pages
+        yield {
+            "selected": self.value() is None,
+            "query_string": query_string,
+            "query_parts": [
+                (name, value)
+                for name, values in QueryDict(query_string[1:]).lists() if name != PAGE_VAR
+                for value in values
+            ],
+            "display": _("All"),
+        }
+
+
+class MeterInputFilter(InputFilter):
+    title = _("meter label or serial number")
+    parameter_name = "meter"
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(Q(meter__label=self.value()) | Q(meter__serial_number=self.value()))
+        return queryset
+
+
+class SupplierInputFilter(InputFilter):
+    title = _("supplier username or customer number")
+    parameter_name = "supplier"
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(
+                Q(supplier__username=self.value()) | Q(supplier__customer_number=self.value())
+            )
+        return queryset
 
 
 @admin.register(Unit)
 class UnitAdmin(admin.ModelAdmin):
-    list_display = ("name", "location", "size", "parent_unit", "created_at", "updated_at")
+    list_display = ("name", "location", "size", "parent_unit", "tenant", "created_at", "updated_at")
     search_fields = ("name", "location")
     list_filter = ("created_at", "updated_at")
+    list_select_related = ("parent_unit", "tenant")
+    autocomplete_fields = ("parent_unit", "tenant")
 
 
 @admin.register(ConsumptionType)
@@ -23,26 +114,38 @@ class MeterAdmin(admin.ModelAdmin):
     list_display = ("label", "serial_number", "consumption_type", "unit", "install_date", "deinstall_date", "created_at", "updated_at")
     search_fields = ("label", "serial_number")
     list_filter = ("install_date", "deinstall_date", "created_at", "updated_at")
+    list_select_related = ("consumption_type", "unit")
+    autocomplete_fields = ("unit", "parent_meter")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(ConversionFactor)
 class ConversionFactorAdmin(admin.ModelAdmin):
     list_display = ("from_consumption_type", "to_consumption_type", "factor", "start_date", "end_date", "created_at", "updated_at")
     list_filter = ("start_date", "end_date", "created_at", "updated_at")
+    list_select_related = ("from_consumption_type", "to_consumption_type")
 
 
 @admin.register(MeterReading)
 class MeterReadingAdmin(admin.ModelAdmin):
     list_display = ("meter", "reading_date", "value", "user", "is_estimated", "photo_preview", "created_at", "updated_at")
-    list_filter = ("reading_date", "is_estimated", "created_at", "updated_at")
+    list_filter = ("reading_date", "is_estimated", MeterInputFilter, "created_at", "updated_at")
     search_fields = ("meter__label", "user__username")
+    list_select_related = ("meter__consumption_type", "meter__unit", "user")
+    autocomplete_fields = ("meter", "user")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     readonly_fields = ("photo_preview", "created_at", "updated_at")
 
     def photo_preview(self, obj):
-        """Show a preview of the uploaded meter reading photo."""
+        """Show a thumbnail of the uploaded meter reading photo, linking to the original."""
         if obj.photo:
-            return format_html('<img src="{}" style="width: 100px; height: auto;" />', obj.photo.url)
+            return format_html(
+                '<a href="{}"><img src="{}" style="width: 100px; height: auto;" loading="lazy" /></a>',
+                obj.photo.url, thumbnail_url(obj, 100),
+            )
         return "(No photo)"
 
     photo_preview.short_description = "Photo Preview"
@@ -51,6 +154,96 @@ class MeterReadingAdmin(admin.ModelAdmin):
 class ExpenseAdmin(admin.ModelAdmin):
     list_display = ("invoice_number", "meter", "supplier", "invoice_date", "total_cost", "vat_rate", "consumption")
     search_fields = ("invoice_number", "supplier__username", "meter__label")
-    list_filter = ("invoice_date", "meter", "supplier")
+    list_filter = ("invoice_date", MeterInputFilter, SupplierInputFilter)
+    list_select_related = ("meter__consumption_type", "meter__unit", "supplier")
+    autocomplete_fields = ("meter", "supplier")
+    raw_id_fields = ("start_reading", "end_reading")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     readonly_fields = ("total_cost", "consumption")  # ✅ Ensure calculated fields are read-only
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            consumption_value=F("end_reading__value") - F("start_reading__value")
+        )
+
+    @admin.display(description=_("Consumption"), ordering="consumption_value")
+    def consumption(self, obj):
+        """Computed in the query rather than by loading both readings of every row."""
+        if hasattr(obj, "consumption_value"):
+            return obj.consumption_value
+        return obj.consumption
+
+
+class CostAllocationInline(admin.TabularInline):
+    model = CostAllocation
+    extra = 0
+    can_delete = False
+    fields = ("expense", "unit", "size_share", "consumption_share", "fixed_costs", "variable_costs", "vat", "total_cost")
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("expense__supplier", "unit")
+
+
+@admin.register(BillingRun)
+class BillingRunAdmin(admin.ModelAdmin):
+    list_display = ("period_start", "period_end", "status", "completed_at", "created_at")
+    list_filter = ("status", "period_start")
+    readonly_fields = ("status", "warnings", "completed_at", "created_at", "updated_at")
+    inlines = [CostAllocationInline]
+
+
+@admin.register(CostAllocation)
+class CostAllocationAdmin(admin.ModelAdmin):
+    """Allocations are produced by billing runs and can only be inspected here."""
+    list_display = ("billing_run", "expense", "unit", "fixed_costs", "variable_costs", "vat", "total_cost")
+    list_filter = ("billing_run",)
+    list_select_related = ("billing_run", "expense__supplier", "unit")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OCRJob)
+class OCRJobAdmin(admin.ModelAdmin):
+    list_display = ("photo_name", "reading", "status", "attempts", "suggested_value", "suggested_date", "applied", "updated_at")
+    list_filter = ("status", "applied")
+    list_select_related = ("reading__meter",)
+    raw_id_fields = ("reading",)
+    readonly_fields = ("raw_text", "error", "attempts", "created_at", "updated_at")
+
+
+@admin.register(MonthlyConsumption)
+class MonthlyConsumptionAdmin(admin.ModelAdmin):
+    """Roll-ups are derived from the readings and can only be inspected here."""
+    list_display = ("meter", "month", "consumption", "updated_at")
+    list_filter = ("month",)
+    list_select_related = ("meter__consumption_type", "meter__unit")
+    date_hierarchy = "month"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PlausibilityFlag)
+class PlausibilityFlagAdmin(admin.ModelAdmin):
+    list_display = ("reading", "kind", "score", "resolved", "created_at")
+    list_filter = ("kind", "resolved", "created_at")
+    list_select_related = ("reading__meter",)
+    raw_id_fields = ("reading",)
+    actions = ["mark_resolved"]
+
+    @admin.action(description=_("Mark selected flags as resolved"))
+    def mark_resolved(self, request, queryset):
+        queryset.update(resolved=True)
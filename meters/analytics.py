@@ -0,0 +1,109 @@
+"""
+Time-bucketed consumption of single meters and units, aggregated on the server.
+
+The database pairs every reading with its predecessor (`LAG` over `reading_date` per meter)
+and returns only the intervals that overlap the requested range: the readings are bounded by
+the last one on or before `from` and the first one on or after `to`, both found through the
+(meter, reading_date) index. Python only corrects rollovers, interpolates the cumulative
+curve at the bucket edges and sums meters, so a year of daily buckets costs one query
+whatever the size of the reading history.
+"""
+from collections import defaultdict
+
+from django.db.models import F, OuterRef, Q, Subquery, Value, Window
+from django.db.models.functions import Coalesce, Lag
+
+from .consumption import ReadingSeries, bucket_edges, interval_delta, np
+from .models import Meter, MeterReading
+
+MAX_BUCKETS = 5000
+
+
+def reading_intervals(meter_ids, start, end):
+    """
+    `(meter_id, previous_date, previous_value, reading_date, value)` for every pair of consecutive
+    readings overlapping `start`..`end`, ordered by meter and date. Readings outside a meter's
+    install/deinstall window are ignored, as in `consumption.load_series`.
+    """
+    same_meter = MeterReading.objects.filter(meter_id=OuterRef("meter_id"))
+    last_before = same_meter.filter(reading_date__lte=start).order_by("-reading_date").values("reading_date")[:1]
+    first_after = same_meter.filter(reading_date__gte=end).order_by("reading_date").values("reading_date")[:1]
+    partition = {"partition_by": [F("meter_id")], "order_by": [F("reading_date").asc()]}
+    return (
+        MeterReading.objects.filter(
+            Q(meter__deinstall_date__isnull=True) | Q(reading_date__lte=F("meter__deinstall_date")),
+            meter_id__in=meter_ids,
+            reading_date__gte=Coalesce(Subquery(last_before), Value(start)),
+            reading_date__lte=Coalesce(Subquery(first_after), Value(end)),
+        )
+        .filter(reading_date__gte=F("meter__install_date"))
+        .annotate(
+            previous_date=Window(Lag("reading_date"), **partition),
+            previous_value=Window(Lag("value"), **partition),
+        )
+        .filter(previous_date__isnull=False)
+        .order_by("meter_id", "reading_date")
+        .values_list("meter_id", "previous_date", "previous_value", "reading_date", "value")
+    )
+
+
+def interval_series(meter_ids, start, end):
+    """`{meter_id: ReadingSeries}` rebuilt from the intervals around `start`..`end` (rollovers corrected)."""
+    points = defaultdict(lambda: ([], []))
+    for meter_id, previous_date, previous_value, reading_date, value in reading_intervals(meter_ids, start, end):
+        days, cumulative = points[meter_id]
+        if not days:
+            days.append(previous_date.toordinal())
+            cumulative.append(float(previous_value))
+        days.append(reading_date.toordinal())
+        cumulative.append(cumulative[-1] + interval_delta(previous_value, value))
+
+    series = {}
+    for meter_id in meter_ids:
+        days, cumulative = points.get(meter_id, ([], []))
+        if np is not None:
+            days, cumulative = np.asarray(days, dtype=np.float64), np.asarray(cumulative, dtype=np.float64)
+        series[meter_id] = ReadingSeries((meter_id,), days, cumulative, np is not None)
+    return series
+
+
+def _buckets(series_list, start, end, bucket):
+    totals = defaultdict(float)
+    for series in series_list:
+        for bucket_start, value in series.bucketed(start, end, bucket):
+            totals[bucket_start] += float(value)
+    edges = bucket_edges(start, end, bucket)[:-1]
+    return [{"start": edge, "consumption": totals[edge]} for edge in edges]
+
+
+def meter_consumption(meter, start, end, bucket="month"):
+    """Consumption of one meter between `start` and `end` (exclusive), split into buckets."""
+    series = interval_series([meter.pk], start, end)[meter.pk]
+    buckets = _buckets([series], start, end, bucket)
+    return {
+        "meter": meter.pk, "from": start, "to": end, "bucket": bucket,
+        "consumption": sum(item["consumption"] for item in buckets), "buckets": buckets,
+    }
+
+
+def unit_consumption(unit, start, end, bucket="month"):
+    """
+    Consumption of a unit's meters per consumption type, split into buckets.
+    Sub-meters whose parent meter also belongs to the unit are not added again.
+    """
+    meters = list(Meter.objects.filter(unit=unit).values_list("id", "parent_meter_id", "consumption_type_id"))
+    meter_ids = {meter_id for meter_id, _, _ in meters}
+    by_type = defaultdict(list)
+    for meter_id, parent_id, consumption_type_id in meters:
+        if parent_id not in meter_ids:
+            by_type[consumption_type_id].append(meter_id)
+    series = interval_series([meter_id for ids in by_type.values() for meter_id in ids], start, end)
+
+    consumption_types = []
+    for consumption_type_id, ids in sorted(by_type.items()):
+        buckets = _buckets([series[meter_id] for meter_id in ids], start, end, bucket)
+        consumption_types.append({
+            "consumption_type": consumption_type_id, "meters": sorted(ids),
+            "consumption": sum(item["consumption"] for item in buckets), "buckets": buckets,
+        })
+    return {"unit": unit.pk, "from": start, "to": end, "bucket": bucket, "consumption_types": consumption_types}
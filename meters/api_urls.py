@@ -1,21 +1,45 @@
 from django.urls import path
 from .api_views import (
-    MeterListView, MeterDetailView, MeterReadingListView, MeterReadingDetailView,
-    UnitListView, UnitDetailView, ConsumptionTypeListView, ExpenseListView, ExpenseDetailView
+    MeterListView, MeterDetailView, MeterReadingListView, MeterReadingBulkView, MeterReadingDetailView,
+    UnitListView, UnitDetailView, ConsumptionTypeListView, ExpenseListView, ExpenseDetailView, ConsumptionView,
+    MeterRollupView, UnitRollupView, MonthlyConsumptionListView, YearOverYearView,
+    MeterConsumptionView, UnitConsumptionView,
+)
+from .async_views import (
+    AsyncMeterListView, AsyncMeterDetailView, AsyncMeterReadingListView, AsyncMeterReadingDetailView,
+    LiveEventsView,
 )
 
 urlpatterns = [
     path("meters/", MeterListView.as_view(), name="meter-list"),
     path("meters/<int:pk>/", MeterDetailView.as_view(), name="meter-detail"),
+    path("meters/<int:pk>/rollup/", MeterRollupView.as_view(), name="meter-rollup"),
+    path("meters/<int:pk>/consumption/", MeterConsumptionView.as_view(), name="meter-consumption"),
 
     path("meter-readings/", MeterReadingListView.as_view(), name="meter-reading-list"),
+    path("meter-readings/bulk/", MeterReadingBulkView.as_view(), name="meter-reading-bulk"),
     path("meter-readings/<int:pk>/", MeterReadingDetailView.as_view(), name="meter-reading-detail"),
 
     path("units/", UnitListView.as_view(), name="unit-list"),
     path("units/<int:pk>/", UnitDetailView.as_view(), name="unit-detail"),
+    path("units/<int:pk>/rollup/", UnitRollupView.as_view(), name="unit-rollup"),
+    path("units/<int:pk>/consumption/", UnitConsumptionView.as_view(), name="unit-consumption"),
 
     path("consumption-types/", ConsumptionTypeListView.as_view(), name="consumption-type-list"),
 
     path("expenses/", ExpenseListView.as_view(), name="expense-list"),
     path("expenses/<int:pk>/", ExpenseDetailView.as_view(), name="expense-detail"),
+
+    path("consumption/", ConsumptionView.as_view(), name="consumption"),
+    path("monthly-consumption/", MonthlyConsumptionListView.as_view(), name="monthly-consumption-list"),
+    path("monthly-consumption/year-over-year/", YearOverYearView.as_view(), name="monthly-consumption-yoy"),
+
+    # Async-native variants for ASGI deployments
+    path("async/meters/", AsyncMeterListView.as_view(), name="async-meter-list"),
+    path("async/meters/<int:pk>/", AsyncMeterDetailView.as_view(), name="async-meter-detail"),
+    path("async/meter-readings/", AsyncMeterReadingListView.as_view(), name="async-meter-reading-list"),
+    path("async/meter-readings/<int:pk>/", AsyncMeterReadingDetailView.as_view(), name="async-meter-reading-detail"),
+
+    # Server-Sent Events of new readings and expenses
+    path("live/", LiveEventsView.as_view(), name="live-events"),
 ]
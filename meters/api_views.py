@@ -1,66 +1,230 @@
-from rest_framework import generics, permissions
-from .models import Meter, MeterReading, Unit, ConsumptionType, Expense
-from .serializers import MeterSerializer, MeterReadingSerializer, UnitSerializer, ConsumptionTypeSerializer, ExpenseSerializer
+from rest_framework import generics, permissions, status
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
+from .models import Meter, MeterReading, Unit, ConsumptionType, Expense, MonthlyConsumption
+from .serializers import (
+    MeterSerializer, MeterReadingSerializer, UnitSerializer, ConsumptionTypeSerializer, ExpenseSerializer,
+    ConsumptionQuerySerializer, MonthlyConsumptionSerializer, MonthlyConsumptionQuerySerializer,
+    YearOverYearQuerySerializer, BucketedConsumptionQuerySerializer,
+)
+from .query_planner import plan_queryset
+from .pagination import KeysetPagination
+from .streaming import NDJSONStreamMixin
+from .fast_serialization import FastListMixin
+from .conditional import ConditionalGetMixin
+from .parsers import CSVParser
+from .ingest import ingest_readings
+from .consumption import consumption_report
+from .hierarchy import meter_rollup, unit_rollup
+from .monthly import year_over_year
+from .analytics import meter_consumption, unit_consumption
+
+
+class PlannedQuerySetMixin:
+    """
+    Join or prefetch every relation the serializer renders, so lists cost a fixed number of queries,
+    and load only the columns it reads (`?fields=`/`?expand=` narrow or widen that set).
+    Writes load full rows so that model validation and `save()` see every field.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method not in ("GET", "HEAD"):
+            return queryset
+        return plan_queryset(queryset, self.get_serializer(), extra_fields=getattr(self, "keyset_ordering", ()))
+
 
 # ✅ Meters API
-class MeterListView(generics.ListCreateAPIView):
+class MeterListView(ConditionalGetMixin, FastListMixin, PlannedQuerySetMixin, generics.ListCreateAPIView):
     """List all meters or create a new meter"""
     queryset = Meter.objects.all()
     serializer_class = MeterSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class MeterDetailView(generics.RetrieveUpdateDestroyAPIView):
+class MeterDetailView(ConditionalGetMixin, PlannedQuerySetMixin, generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update, or delete a specific meter"""
     queryset = Meter.objects.all()
     serializer_class = MeterSerializer
     permission_classes = [permissions.IsAuthenticated]
 
 # ✅ Meter Readings API
-class MeterReadingListView(generics.ListCreateAPIView):
-    """List all meter readings or create a new one"""
+class MeterReadingListView(
+    ConditionalGetMixin, NDJSONStreamMixin, FastListMixin, PlannedQuerySetMixin, generics.ListCreateAPIView
+):
+    """List meter readings page by page (or stream them with ?stream=ndjson), or create a new one"""
     queryset = MeterReading.objects.all()
     serializer_class = MeterReadingSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ("reading_date", "id")
 
     def perform_create(self, serializer):
         """Assign the logged-in user when creating a new meter reading"""
         serializer.save(user=self.request.user)
 
-class MeterReadingDetailView(generics.RetrieveUpdateDestroyAPIView):
+class MeterReadingBulkView(generics.GenericAPIView):
+    """
+    Create many meter readings at once from a JSON array or a CSV file.
+
+    Meters are referenced by `serial_number` or `label`. Nothing is saved if a row is invalid,
+    unless `?partial=true` is given, in which case only the valid rows are saved.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [JSONParser, CSVParser]
+
+    def post(self, request, *args, **kwargs):
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response(
+                {"non_field_errors": ["Expected a list of readings."]}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        partial = request.query_params.get("partial", "").lower() in ("1", "true")
+        result = ingest_readings(rows, request.user, partial=partial)
+        failed = result.errors and not result.created
+        return Response(
+            {"created": result.created, "errors": result.errors},
+            status=status.HTTP_400_BAD_REQUEST if failed else status.HTTP_201_CREATED,
+        )
+
+class MeterReadingDetailView(ConditionalGetMixin, PlannedQuerySetMixin, generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update, or delete a specific meter reading"""
     queryset = MeterReading.objects.all()
     serializer_class = MeterReadingSerializer
     permission_classes = [permissions.IsAuthenticated]
 
 # ✅ Units API
-class UnitListView(generics.ListAPIView):
+class UnitListView(ConditionalGetMixin, PlannedQuerySetMixin, generics.ListAPIView):
     """List all units"""
     queryset = Unit.objects.all()
     serializer_class = UnitSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class UnitDetailView(generics.RetrieveAPIView):
+class UnitDetailView(ConditionalGetMixin, PlannedQuerySetMixin, generics.RetrieveAPIView):
     """Retrieve a specific unit"""
     queryset = Unit.objects.all()
     serializer_class = UnitSerializer
     permission_classes = [permissions.IsAuthenticated]
 
 # ✅ Consumption Types API
-class ConsumptionTypeListView(generics.ListAPIView):
+class ConsumptionTypeListView(ConditionalGetMixin, PlannedQuerySetMixin, generics.ListAPIView):
     """List all consumption types"""
     queryset = ConsumptionType.objects.all()
     serializer_class = ConsumptionTypeSerializer
     permission_classes = [permissions.IsAuthenticated]
 
 # ✅ Expenses API
-class ExpenseListView(generics.ListCreateAPIView):
-    """List all expenses or create a new one"""
+class ExpenseListView(
+    ConditionalGetMixin, NDJSONStreamMixin, FastListMixin, PlannedQuerySetMixin, generics.ListCreateAPIView
+):
+    """List expenses page by page (or stream them with ?stream=ndjson), or create a new one"""
     queryset = Expense.objects.all()
     serializer_class = ExpenseSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ("invoice_date", "id")
 
-class ExpenseDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ExpenseDetailView(ConditionalGetMixin, PlannedQuerySetMixin, generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update, or delete a specific expense"""
     queryset = Expense.objects.all()
     serializer_class = ExpenseSerializer
     permission_classes = [permissions.IsAuthenticated]
+
+# ✅ Consumption API
+class ConsumptionView(generics.GenericAPIView):
+    """
+    Consumption per meter between `from` and `to`, optionally split into day/week/month/year buckets.
+    `?meters=1,2,3` limits the report to those meters; replaced meters are chained automatically.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        params = ConsumptionQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+        report = consumption_report(query.get("meters"), query["from"], query["to"], bucket=query.get("bucket"))
+        return Response(report)
+
+
+class MeterRollupView(generics.GenericAPIView):
+    """Consumption of a meter and all of its sub-meters between `from` and `to`, with the common-area share"""
+    queryset = Meter.objects.only("id", "tree_path")
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        params = ConsumptionQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return Response(meter_rollup(self.get_object(), params.validated_data["from"], params.validated_data["to"]))
+
+class UnitRollupView(generics.GenericAPIView):
+    """Consumption per consumption type of a unit and all of its sub-units between `from` and `to`"""
+    queryset = Unit.objects.only("id", "tree_path")
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        params = ConsumptionQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return Response(unit_rollup(self.get_object(), params.validated_data["from"], params.validated_data["to"]))
+
+
+class MeterConsumptionView(generics.GenericAPIView):
+    """Consumption of one meter between `from` and `to`, bucketed by day, week or month on the server"""
+    queryset = Meter.objects.only("id")
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        params = BucketedConsumptionQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+        return Response(meter_consumption(self.get_object(), query["from"], query["to"], bucket=query["bucket"]))
+
+class UnitConsumptionView(generics.GenericAPIView):
+    """Consumption of a unit's meters per consumption type between `from` and `to`, bucketed on the server"""
+    queryset = Unit.objects.only("id")
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        params = BucketedConsumptionQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+        return Response(unit_consumption(self.get_object(), query["from"], query["to"], bucket=query["bucket"]))
+
+
+# ✅ Monthly Consumption API
+class MonthlyConsumptionListView(ConditionalGetMixin, FastListMixin, PlannedQuerySetMixin, generics.ListAPIView):
+    """
+    Precomputed consumption per meter and month, page by page.
+    `?meters=1,2` limits the meters and `from`/`to` the months (`to` is exclusive).
+    """
+    queryset = MonthlyConsumption.objects.all()
+    serializer_class = MonthlyConsumptionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ("month", "meter_id")
+
+    def filter_queryset(self, queryset):
+        params = MonthlyConsumptionQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+        if query.get("meters"):
+            queryset = queryset.filter(meter_id__in=query["meters"])
+        if "from" in query:
+            queryset = queryset.filter(month__gte=query["from"].replace(day=1))
+        if "to" in query:
+            queryset = queryset.filter(month__lt=query["to"])
+        return queryset
+
+class YearOverYearView(generics.GenericAPIView):
+    """Monthly consumption of every meter side by side for the given `?years=2024,2025`"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        params = YearOverYearQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        years = params.validated_data["years"]
+        report = year_over_year(years, meters=params.validated_data.get("meters") or None)
+        return Response([
+            {"meter": meter_id, "month": month, "consumption": {str(year): by_year.get(year) for year in years}}
+            for meter_id, months in sorted(report.items())
+            for month, by_year in sorted(months.items())
+        ])
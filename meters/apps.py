@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class MetersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'meters'
+
+    def ready(self):
+        from . import signals  # noqa: F401 - connect signal receivers
@@ -0,0 +1,195 @@
+"""
+Async-native meters and readings endpoints for ASGI deployments.
+
+The DRF views are synchronous, so under ASGI every request occupies a worker thread until its
+response has been sent, including while a slow client drains a large export. These are plain
+Django async views over the same serializers: rows are read with the async ORM (`aiterator`,
+`aget`, `acreate`), rendered with the compiled row functions of `meters.fast_serialization`
+and exports are streamed from an async generator, so a waiting client costs a suspended
+coroutine instead of a thread.
+
+Responses match the `/api/` endpoints (`?fields=`, `?expand=`, keyset cursors, `?stream=ndjson`),
+without ETags. Authentication is by session only. Under WSGI Django runs these views through
+`async_to_sync` and would collect an async stream in memory before sending it, so exports are
+then streamed from the synchronous `stream_rows()` instead; only an ASGI server gets the
+concurrency benefit. Rows are always rendered from the planned queryset, whose related
+objects are already loaded, since a lazy relation cannot be fetched in the async context.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from . import live
+from .fast_serialization import compile_rows
+from .models import Meter, MeterReading
+from .pagination import KeysetPagination
+from .query_planner import plan_queryset
+from .serializers import MeterReadingSerializer, MeterSerializer, split_param
+from .streaming import NDJSONStreamMixin, astream_rows, stream_rows, streaming_supported
+
+
+def render(data, status=200):
+    """A response with the bytes DRF's JSONRenderer would send."""
+    return HttpResponse(JSONRenderer().render(data), content_type="application/json", status=status)
+
+
+class AsyncAPIView(View):
+    """Session authentication, DRF-style error responses and the serializer/queryset plumbing."""
+    queryset = None
+    serializer_class = None
+    keyset_ordering = ("id",)
+
+    async def dispatch(self, request, *args, **kwargs):
+        if not (await request.auser()).is_authenticated:
+            # 403 like DRF with session authentication, which sends no WWW-Authenticate challenge
+            return self.handle_exception(exceptions.PermissionDenied(exceptions.NotAuthenticated.default_detail))
+        # DRF's request wrapper gives the serializers and the paginator `query_params`
+        self.api_request = Request(request)
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except (exceptions.APIException, Http404) as exc:
+            return self.handle_exception(exc)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, Http404):
+            exc = exceptions.NotFound(*exc.args)
+        detail = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+        return render(detail, status=exc.status_code)
+
+    def get_serializer(self, *args, **kwargs):
+        return self.serializer_class(*args, context={"request": self.api_request}, **kwargs)
+
+    def get_row_renderer(self):
+        """The planned queryset and the function turning one of its rows into a dict."""
+        serializer = self.get_serializer()
+        queryset = plan_queryset(self.queryset.all(), serializer, extra_fields=self.keyset_ordering)
+        compiled = compile_rows(serializer)
+        if compiled is None:
+            return queryset, serializer.to_representation
+        for name in self.keyset_ordering:
+            compiled.index(name)
+        return compiled.queryset(queryset), compiled.to_representation
+
+
+class AsyncListView(AsyncAPIView):
+    pagination_class = None
+
+    async def get(self, request, *args, **kwargs):
+        queryset, to_representation = self.get_row_renderer()
+        if request.GET.get(NDJSONStreamMixin.stream_query_param) == "ndjson":
+            rows = astream_rows if streaming_supported(request) else stream_rows
+            response = StreamingHttpResponse(
+                rows(queryset.order_by(*self.keyset_ordering), to_representation),
+                content_type=NDJSONStreamMixin.stream_content_type,
+            )
+            response["X-Accel-Buffering"] = "no"
+            return response
+
+        if self.pagination_class is None:
+            return render([to_representation(row) async for row in queryset])
+        paginator = self.pagination_class()
+        rows = await paginator.apaginate_queryset(queryset, self.api_request, view=self)
+        return render({"next": paginator.get_next_link(), "results": [to_representation(row) for row in rows]})
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            data = json.loads(request.body or b"null")
+        except ValueError as exc:
+            raise exceptions.ParseError(f"JSON parse error - {exc}")
+        # Expanded relations are read-only, so the input is validated without `?fields=`/`?expand=`
+        serializer = self.serializer_class(data=data, fields=(), expand=(), context={"request": self.api_request})
+        # Field validation may look up related rows and check unique constraints
+        if not await sync_to_async(serializer.is_valid)():
+            return render(serializer.errors, status=400)
+        instance = await self.queryset.model.objects.acreate(
+            **serializer.validated_data, **await self.get_create_kwargs(request)
+        )
+        queryset, to_representation = self.get_row_renderer()
+        return render(to_representation(await queryset.aget(pk=instance.pk)), status=201)
+
+    async def get_create_kwargs(self, request):
+        """Extra model fields set on created objects, like `perform_create()` in the DRF views."""
+        return {}
+
+
+class AsyncDetailView(AsyncAPIView):
+    async def get(self, request, pk, *args, **kwargs):
+        queryset, to_representation = self.get_row_renderer()
+        try:
+            row = await queryset.aget(pk=pk)
+        except self.queryset.model.DoesNotExist:
+            raise Http404(f"No {self.queryset.model._meta.object_name} matches the given query.")
+        return render(to_representation(row))
+
+
+# ✅ Meters API (async)
+class AsyncMeterListView(AsyncListView):
+    """List all meters or create a new meter"""
+    queryset = Meter.objects.all()
+    serializer_class = MeterSerializer
+
+class AsyncMeterDetailView(AsyncDetailView):
+    """Retrieve a specific meter"""
+    queryset = Meter.objects.all()
+    serializer_class = MeterSerializer
+
+# ✅ Meter Readings API (async)
+class AsyncMeterReadingListView(AsyncListView):
+    """List meter readings page by page (or stream them with ?stream=ndjson), or create a new one"""
+    queryset = MeterReading.objects.all()
+    serializer_class = MeterReadingSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering = ("reading_date", "id")
+
+    async def get_create_kwargs(self, request):
+        """Assign the logged-in user when creating a new meter reading"""
+        return {"user": await request.auser()}
+
+class AsyncMeterReadingDetailView(AsyncDetailView):
+    """Retrieve a specific meter reading"""
+    queryset = MeterReading.objects.all()
+    serializer_class = MeterReadingSerializer
+
+
+# ✅ Live Events API
+class LiveEventsView(AsyncAPIView):
+    """
+    Server-Sent Events for new readings and expenses of the user's units (any unit for staff).
+    `?meters=1,2&units=3` limits the stream to those meters and units. Needs an ASGI server: under
+    WSGI it answers 501, and 204 (which stops EventSource from reconnecting) when nothing is left.
+    """
+    keepalive = 15
+    retry = 5000
+
+    async def get(self, request, *args, **kwargs):
+        if not streaming_supported(request):
+            return render({"detail": "Live events need an ASGI server."}, status=501)
+        ids = {}
+        for name in ("meters", "units"):
+            ids[name] = split_param(request.GET.get(name))
+            if not all(value.isdigit() for value in ids[name]):
+                raise exceptions.ValidationError({name: ["Expected comma-separated ids."]})
+        channels = await sync_to_async(live.allowed_channels)(await request.auser(), ids["meters"], ids["units"])
+        if not channels:
+            return HttpResponse(status=204)
+        response = StreamingHttpResponse(self.stream(channels), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    async def stream(self, channels):
+        with live.get_broker().subscribe(channels) as subscription:
+            yield f"retry: {self.retry}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), self.keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield live.format_sse(event)
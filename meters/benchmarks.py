@@ -0,0 +1,64 @@
+"""Shared helpers for the `benchmark_*` management commands."""
+import random
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from .models import Unit, ConsumptionType, Meter, MeterReading
+from .trees import rebuild_paths
+
+
+class Rollback(Exception):
+    """Raised to discard the synthetic data created for a benchmark."""
+
+
+@contextmanager
+def synthetic_dataset(meters=100, readings_per_meter=120, start=date(2015, 1, 1), step_days=30, seed=0):
+    """
+    Create units, meters and monotonically increasing readings inside a transaction
+    that is rolled back afterwards, so benchmarks never leave data behind.
+    Yields the list of created meters.
+    """
+    rng = random.Random(seed)
+    try:
+        with transaction.atomic():
+            user, _ = get_user_model().objects.get_or_create(
+                username="benchmark", defaults={"email": "benchmark@example.invalid", "customer_number": "BENCHMARK"}
+            )
+            consumption_type, _ = ConsumptionType.objects.get_or_create(name="Benchmark", defaults={"unit": "kWh"})
+            units = Unit.objects.bulk_create(
+                Unit(name=f"Bench {i}", location="Benchmark", size=rng.uniform(20, 120)) for i in range(meters)
+            )
+            created = Meter.objects.bulk_create(
+                Meter(
+                    label=f"bench-{i}", serial_number=f"BENCH-{i:06d}", consumption_type=consumption_type,
+                    unit=unit, install_date=start,
+                )
+                for i, unit in enumerate(units)
+            )
+            rebuild_paths(Unit)
+            rebuild_paths(Meter)
+            batch = []
+            for meter in created:
+                value = rng.uniform(0, 1000)
+                for n in range(readings_per_meter):
+                    value += rng.uniform(0, 50)
+                    batch.append(MeterReading(
+                        meter=meter, user=user, value=value, reading_date=start + timedelta(days=n * step_days)
+                    ))
+            MeterReading.objects.bulk_create(batch, batch_size=5000)
+            yield created
+            raise Rollback
+    except Rollback:
+        pass
+
+
+@contextmanager
+def timer(results, name):
+    """Record the wall-clock duration of the block in `results[name]`."""
+    started = time.perf_counter()
+    yield
+    results[name] = time.perf_counter() - started
@@ -0,0 +1,173 @@
+"""
+Billing runs: set-based allocation of expenses across the units they serve.
+
+For each expense invoiced in the period, the billed (main) meter serves the units of its
+leaf sub-meters, or its own unit when it has none. Fixed costs are split by `Unit.size`,
+variable costs by sub-meter consumption over the expense's reading period (converted to the
+main meter's consumption type with `ConversionFactor`), and VAT in proportion to the net
+share. Amounts are split to the cent with the largest-remainder method, so the allocations
+of an expense always add up to it exactly.
+
+All inputs are loaded with a fixed number of queries up front. Each expense's inputs are
+hashed; a re-run of the same period only replaces the allocations of expenses whose
+fingerprint changed, batch by batch, so an interrupted run can simply be started again.
+"""
+import hashlib
+import math
+from collections import defaultdict
+from dataclasses import dataclass, field
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import conversion
+from .consumption import load_series
+from .models import Unit, Meter, Expense, BillingRun, CostAllocation
+from .trees import Tree
+
+CENT = Decimal("0.01")
+
+
+@dataclass
+class BillingResult:
+    run: BillingRun
+    recomputed: list = field(default_factory=list)
+    unchanged: list = field(default_factory=list)
+    removed: list = field(default_factory=list)
+
+
+def split_amount(amount, weights):
+    """Split `amount` into cents proportionally to `weights`; the parts always sum to `amount`."""
+    if not weights:
+        return []
+    total_weight = sum(weights)
+    if total_weight <= 0:
+        weights, total_weight = [1] * len(weights), len(weights)
+    cents = int((Decimal(amount) / CENT).to_integral_value(ROUND_HALF_UP))
+    raw = [cents * weight / total_weight for weight in weights]
+    parts = [math.floor(value) for value in raw]
+    by_remainder = sorted(range(len(raw)), key=lambda i: raw[i] - parts[i], reverse=True)
+    for i in by_remainder[: cents - sum(parts)]:
+        parts[i] += 1
+    return [Decimal(part) * CENT for part in parts]
+
+
+def _fingerprint(*parts):
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+def plan_allocations(run):
+    """
+    Compute the allocation rows of every expense in the run's period without writing anything.
+    Returns `({expense_id: (fingerprint, [CostAllocation, ...])}, warnings)`.
+    """
+    expenses = list(
+        Expense.objects.filter(invoice_date__range=(run.period_start, run.period_end))
+        .select_related("start_reading", "end_reading")
+        .order_by("pk")
+    )
+    meters = {
+        meter.pk: meter
+        for meter in Meter.objects.only("id", "unit_id", "consumption_type_id", "tree_path", "parent_meter_id")
+    }
+    tree = Tree.from_rows((meter.pk, meter.tree_path) for meter in meters.values())
+    sizes = dict(Unit.objects.values_list("id", "size"))
+    factors = conversion.get_index()
+
+    served = {expense.meter_id: tree.leaves(expense.meter_id) for expense in expenses}
+    series = load_series({meter_id for ids in served.values() for meter_id in ids}, chain_replacements=False)
+
+    plans, warnings = {}, []
+    for expense in expenses:
+        start_day, end_day = expense.start_reading.reading_date, expense.end_reading.reading_date
+        main_type = meters[expense.meter_id].consumption_type_id
+
+        consumption, used_factors = defaultdict(float), []
+        for meter_id in served[expense.meter_id]:
+            meter = meters[meter_id]
+            value = series[meter_id].consumption(start_day, end_day) if meter_id in series else 0.0
+            factor = factors.factor(meter.consumption_type_id, main_type, end_day)
+            if factor is None:
+                warnings.append(
+                    f"Expense {expense.invoice_number}: no conversion factor from consumption type "
+                    f"{meter.consumption_type_id} to {main_type} on {end_day}; meter {meter_id} counted as 0."
+                )
+                factor = 0.0
+            used_factors.append((meter_id, factor))
+            consumption[meter.unit_id] += max(value, 0.0) * factor
+
+        unit_ids = sorted(consumption)
+        unit_sizes = [sizes[unit_id] for unit_id in unit_ids]
+        unit_consumption = [consumption[unit_id] for unit_id in unit_ids]
+        total_size, total_consumption = sum(unit_sizes), sum(unit_consumption)
+        if total_consumption <= 0 and len(unit_ids) > 1:
+            warnings.append(
+                f"Expense {expense.invoice_number}: no sub-meter consumption; variable costs split by size."
+            )
+        variable_weights = unit_consumption if total_consumption > 0 else unit_sizes
+
+        fixed = split_amount(expense.fixed_costs, unit_sizes)
+        variable = split_amount(expense.variable_costs, variable_weights)
+        vat_total = expense.total_cost - expense.fixed_costs - expense.variable_costs
+        vat = split_amount(vat_total, [float(f + v) for f, v in zip(fixed, variable)])
+
+        fingerprint = _fingerprint(
+            expense.pk, expense.updated_at.isoformat(), expense.fixed_costs, expense.variable_costs,
+            expense.total_cost, start_day, end_day, expense.start_reading.value, expense.end_reading.value,
+            tuple(zip(unit_ids, unit_sizes, (round(value, 9) for value in unit_consumption))), tuple(used_factors),
+        )
+        rows = [
+            CostAllocation(
+                billing_run=run, expense_id=expense.pk, unit_id=unit_id,
+                size_share=size / total_size if total_size else 0.0,
+                consumption=value,
+                consumption_share=value / total_consumption if total_consumption > 0 else 0.0,
+                fixed_costs=fixed[i], variable_costs=variable[i], vat=vat[i],
+                total_cost=fixed[i] + variable[i] + vat[i],
+                input_fingerprint=fingerprint,
+            )
+            for i, (unit_id, size, value) in enumerate(zip(unit_ids, unit_sizes, unit_consumption))
+        ]
+        plans[expense.pk] = (fingerprint, rows)
+    return plans, warnings
+
+
+def run_billing(period_start, period_end, batch_size=200):
+    """Allocate every expense invoiced between `period_start` and `period_end` (inclusive)."""
+    run, _ = BillingRun.objects.get_or_create(period_start=period_start, period_end=period_end)
+    run.status, run.completed_at = "running", None
+    run.save(update_fields=["status", "completed_at", "updated_at"])
+    result = BillingResult(run=run)
+
+    try:
+        plans, run.warnings = plan_allocations(run)
+        existing = dict(
+            CostAllocation.objects.filter(billing_run=run).values_list("expense_id", "input_fingerprint").distinct()
+        )
+        result.removed = sorted(set(existing) - set(plans))
+        for expense_id, (fingerprint, _) in plans.items():
+            if existing.get(expense_id) == fingerprint:
+                result.unchanged.append(expense_id)
+            else:
+                result.recomputed.append(expense_id)
+
+        if result.removed:
+            CostAllocation.objects.filter(billing_run=run, expense_id__in=result.removed).delete()
+        # Each batch commits on its own: an interrupted run keeps its finished batches,
+        # and the next run skips them because their fingerprints match.
+        for offset in range(0, len(result.recomputed), batch_size):
+            batch = result.recomputed[offset:offset + batch_size]
+            with transaction.atomic():
+                CostAllocation.objects.filter(billing_run=run, expense_id__in=batch).delete()
+                CostAllocation.objects.bulk_create(
+                    [row for expense_id in batch for row in plans[expense_id][1]], batch_size=1000
+                )
+    except Exception:
+        run.status = "failed"
+        run.save(update_fields=["status", "updated_at"])
+        raise
+
+    run.status, run.completed_at = "completed", timezone.now()
+    run.save(update_fields=["status", "completed_at", "warnings", "updated_at"])
+    return result
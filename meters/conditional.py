@@ -0,0 +1,135 @@
+"""
+Conditional GET support for the meters API.
+
+The version of a list is `Max(updated_at)` and `Count` of its rows, read with one aggregate
+query, plus per-model change counters that the signals in `meters.signals` bump on every save
+and delete. The counters also cover related rows shown through `?expand=` and changes that
+leave `updated_at` alone. The ETag hashes that version with the request URL and the negotiated
+media type, so a fresh `If-None-Match` is answered with a 304 before anything is serialized.
+With `METERS_API_CACHE_TIMEOUT` set, rendered JSON responses are also kept in Django's cache
+under their ETag, which changes (and so invalidates them) whenever the data does. The ETag does
+not vary by user, so only JSON is cached: browsable API pages show the user and a CSRF token.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from .query_planner import _model_field
+
+TRACKED_APPS = ("meters", "contacts")
+VERSION_KEY = "meters:api-version:{label}"
+RESPONSE_KEY = "meters:api-response:{etag}"
+
+
+def bump_version(model):
+    """Mark every cached representation that includes rows of `model` as stale."""
+    key = VERSION_KEY.format(label=model._meta.label_lower)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+        cache.incr(key)
+
+
+def model_versions(models):
+    keys = [VERSION_KEY.format(label=model._meta.label_lower) for model in models]
+    versions = cache.get_many(keys)
+    return [versions.get(key, 0) for key in keys]
+
+
+def serializer_models(serializer, model=None):
+    """Every model whose rows `serializer` renders, following nested serializers and related fields."""
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    model = model or serializer.Meta.model
+    models = {model}
+    for field in serializer.fields.values():
+        model_field = _model_field(model, field.source)
+        if model_field is None or not model_field.is_relation:
+            continue
+        if isinstance(field, serializers.BaseSerializer):
+            models |= serializer_models(field, model_field.related_model)
+        elif isinstance(field, serializers.ManyRelatedField):
+            if not isinstance(field.child_relation, serializers.PrimaryKeyRelatedField):
+                models.add(model_field.related_model)
+        elif not isinstance(field, serializers.PrimaryKeyRelatedField):
+            models.add(model_field.related_model)
+    return models
+
+
+class ConditionalGetMixin:
+    """
+    ETags on list and detail GETs, Last-Modified on detail GETs, 304 responses for fresh
+    `If-None-Match`/`If-Modified-Since` requests and the optional server-side response cache.
+
+    Lists get no Last-Modified: deleting a row does not move `Max(updated_at)`, so a date alone
+    could report a shortened list as unchanged. Their ETag includes the row count instead.
+    """
+    etag = None
+    last_modified = None
+
+    def is_detail(self):
+        return (self.lookup_url_kwarg or self.lookup_field) in self.kwargs
+
+    def get_version_queryset(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.is_detail():
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        return queryset.order_by()
+
+    def set_validators(self, request):
+        """Compute `etag` and `last_modified` for the current request (None for a missing object)."""
+        models = sorted(serializer_models(self.get_serializer()), key=lambda model: model._meta.label_lower)
+        stats = self.get_version_queryset().aggregate(last_modified=Max("updated_at"), count=Count("pk"))
+        if self.is_detail() and not stats["count"]:
+            return  # Let the view answer 404
+        version = repr((
+            request.build_absolute_uri(), request.accepted_media_type, stats["count"], stats["last_modified"],
+            [model._meta.label_lower for model in models], model_versions(models),
+        ))
+        self.etag = quote_etag(hashlib.sha256(version.encode()).hexdigest()[:32])
+        if self.is_detail() and models == [self.get_queryset().model] and stats["last_modified"]:
+            self.last_modified = int(stats["last_modified"].timestamp())
+
+    def get(self, request, *args, **kwargs):
+        self.set_validators(request)
+        if self.etag is not None:
+            response = get_conditional_response(request, etag=self.etag, last_modified=self.last_modified)
+            if response is not None:
+                return response
+            cached = cache.get(RESPONSE_KEY.format(etag=self.etag)) if self.cache_timeout else None
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+        return super().get(request, *args, **kwargs)
+
+    @property
+    def cache_timeout(self):
+        return getattr(settings, "METERS_API_CACHE_TIMEOUT", 0)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.etag is None or response.status_code not in (200, 304):
+            return response
+        response["ETag"] = self.etag
+        if self.last_modified is not None:
+            response["Last-Modified"] = http_date(self.last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ["Accept"])
+        if (
+            isinstance(response, Response) and response.status_code == 200 and self.cache_timeout
+            and getattr(request, "accepted_renderer", None) is not None and request.accepted_renderer.format == "json"
+        ):
+            response.render()
+            cache.set(
+                RESPONSE_KEY.format(etag=self.etag), (response.content, response["Content-Type"]), self.cache_timeout
+            )
+        return response
@@ -0,0 +1,126 @@
+"""
+In-process index of conversion factors, shared across workers through Django's cache.
+
+Factors are grouped by `(from, to)` consumption type pair and sorted by start date, so the
+factor valid on a day is one bisect away and whole arrays of days convert with one
+`searchsorted`. The rows live in the cache under a version number that the signals in
+`meters.signals` bump on every change; each process rebuilds its local index only when
+that version moves, and reads the rows from the cache rather than the database when another
+worker already loaded them.
+"""
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date
+
+from django.core.cache import cache
+from django.db import connection
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from .models import ConversionFactor
+
+VERSION_KEY = "meters:conversion-factors:version"
+ROWS_KEY = "meters:conversion-factors:rows:{version}"
+ROWS_TIMEOUT = 24 * 60 * 60
+
+
+def _ordinal(day):
+    return day.toordinal() if isinstance(day, date) else int(day)
+
+
+class ConversionFactorIndex:
+    """Validity windows per type pair; windows of one pair are assumed not to overlap."""
+
+    def __init__(self, rows, version=None):
+        self.version = version
+        grouped = defaultdict(list)
+        for from_id, to_id, start_date, end_date, factor in rows:
+            grouped[from_id, to_id].append((start_date.toordinal(), end_date.toordinal(), factor))
+        self.pairs = {}
+        for pair, windows in grouped.items():
+            windows.sort()
+            starts, ends, factors = (list(column) for column in zip(*windows))
+            if np is not None:
+                starts, ends, factors = np.array(starts), np.array(ends), np.array(factors, dtype=np.float64)
+            self.pairs[pair] = (starts, ends, factors)
+
+    def factor(self, from_id, to_id, day):
+        """The factor valid on `day` (a date or day ordinal), 1.0 for identical types, None if there is none."""
+        if from_id == to_id:
+            return 1.0
+        windows = self.pairs.get((from_id, to_id))
+        if windows is None:
+            return None
+        starts, ends, factors = windows
+        day = _ordinal(day)
+        i = bisect_right(starts, day) - 1
+        if i >= 0 and day <= ends[i]:
+            return float(factors[i])
+        return None
+
+    def convert(self, from_id, to_id, days, values):
+        """
+        Convert many `(day, value)` pairs at once. Days may be dates or ordinals.
+        Values without a valid factor become NaN.
+        """
+        if np is None:
+            factors = [self.factor(from_id, to_id, day) for day in days]
+            return [value * factor if factor is not None else float("nan") for value, factor in zip(values, factors)]
+
+        values = np.asarray(values, dtype=np.float64)
+        if from_id == to_id:
+            return values.copy()
+        windows = self.pairs.get((from_id, to_id))
+        if windows is None:
+            return np.full(values.shape, np.nan)
+        starts, ends, factors = windows
+        days = np.fromiter((_ordinal(day) for day in days), dtype=np.int64, count=len(values))
+        i = np.searchsorted(starts, days, side="right") - 1
+        clipped = np.clip(i, 0, None)
+        valid = (i >= 0) & (days <= ends[clipped])
+        return np.where(valid, values * factors[clipped], np.nan)
+
+
+_local_index = None
+
+
+def _current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def get_index():
+    """Return the process-local index, rebuilding it if another process or a signal changed the factors."""
+    global _local_index
+    version = _current_version()
+    if _local_index is not None and _local_index.version == version:
+        return _local_index
+
+    rows_key = ROWS_KEY.format(version=version)
+    rows = cache.get(rows_key)
+    if rows is None:
+        rows = list(ConversionFactor.objects.values_list(
+            "from_consumption_type_id", "to_consumption_type_id", "start_date", "end_date", "factor"
+        ))
+        if not connection.in_atomic_block:
+            # Rows read inside a transaction may still be rolled back; don't share them.
+            cache.set(rows_key, rows, timeout=ROWS_TIMEOUT)
+    _local_index = ConversionFactorIndex(rows, version=version)
+    return _local_index
+
+
+def invalidate():
+    """Make every process rebuild its index on the next lookup."""
+    global _local_index
+    _local_index = None
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        cache.incr(VERSION_KEY)
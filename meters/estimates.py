@@ -0,0 +1,171 @@
+"""
+Estimated readings for dates on which meters were not read, e.g. billing period boundaries.
+
+A target date between two real readings of a meter is interpolated linearly on the
+rollover-corrected cumulative curve (see `meters.consumption`) and mapped back to a counter
+value, wrapping around if the counter rolled over in that interval. A date after the last real
+reading is extrapolated: the consumption from that reading to the target is taken as the
+average consumption over the same calendar window in up to `SEASONAL_YEARS` earlier years,
+or, without that much history, as the average daily rate over the last year of readings.
+Dates before a meter's first real reading, or outside its install/deinstall window, are not
+estimated.
+
+Only real readings (`is_estimated=False`) are used as a basis, so estimates never build on
+each other. Everything is computed from two queries (meters and readings) and written with
+one `bulk_create`.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import Q
+
+from . import conditional, live, monthly, plausibility
+from .consumption import _cumulative, _interp, is_rollover, rollover_capacity
+from .models import Meter, MeterReading
+
+SEASONAL_YEARS = 3
+FALLBACK_DAYS = 365
+
+
+@dataclass
+class EstimateResult:
+    readings: list = field(default_factory=list)
+    existing: int = 0
+    skipped: int = 0
+
+
+def years_before(day, years):
+    """The same calendar day `years` earlier (29 February becomes 28 February)."""
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        return day.replace(year=day.year - years, day=28)
+
+
+class RealReadings:
+    """A meter's real readings as day ordinals, raw counter values and cumulative values."""
+
+    def __init__(self, days, values):
+        self.days = days
+        self.values = values
+        self.cumulative = _cumulative(values, False)
+
+    def at(self, ordinal):
+        return _interp(ordinal, self.days, self.cumulative)
+
+    def interpolate(self, ordinal, index):
+        """Counter value at `ordinal`, which lies between the readings `index - 1` and `index`."""
+        before, after = self.values[index - 1], self.values[index]
+        value = before + self.at(ordinal) - self.cumulative[index - 1]
+        if after < before and is_rollover(before, after) and value >= rollover_capacity(before):
+            value -= rollover_capacity(before)
+        return value
+
+    def extrapolate(self, target):
+        """Counter value at `target`, after the last reading; None without enough history."""
+        last = date.fromordinal(self.days[-1])
+        deltas = []
+        for years in range(1, SEASONAL_YEARS + 1):
+            start, end = years_before(last, years).toordinal(), years_before(target, years).toordinal()
+            if start >= self.days[0] and end <= self.days[-1]:
+                deltas.append(self.at(end) - self.at(start))
+        if deltas:
+            return self.values[-1] + sum(deltas) / len(deltas)
+
+        start = max(self.days[0], self.days[-1] - FALLBACK_DAYS)
+        if start == self.days[-1]:
+            return None
+        rate = (self.cumulative[-1] - self.at(start)) / (self.days[-1] - start)
+        return self.values[-1] + rate * (target.toordinal() - self.days[-1])
+
+
+def active_meters(dates, meters=None):
+    """Meters installed on at least one of `dates` and not deinstalled before it."""
+    queryset = Meter.objects.filter(install_date__lte=max(dates)).filter(
+        Q(deinstall_date__isnull=True) | Q(deinstall_date__gte=min(dates))
+    )
+    if meters is not None:
+        queryset = queryset.filter(pk__in=meters)
+    return queryset
+
+
+def compute_estimates(dates, user, meters=None):
+    """
+    Build (unsaved) estimated `MeterReading`s of every active meter for each of `dates`.
+    Dates that already have a reading, real or estimated, are left alone.
+    """
+    dates = sorted(set(dates))
+    result = EstimateResult()
+    if not dates:
+        return result
+    meter_qs = active_meters(dates, meters)
+    windows = {
+        meter_id: (install_date, deinstall_date or date.max)
+        for meter_id, install_date, deinstall_date in meter_qs.values_list("id", "install_date", "deinstall_date")
+    }
+    existing = set(
+        MeterReading.objects.filter(meter__in=meter_qs, reading_date__in=dates).values_list("meter_id", "reading_date")
+    )
+    rows = (
+        MeterReading.objects.filter(meter__in=meter_qs, is_estimated=False)
+        .order_by("meter_id", "reading_date", "id")
+        .values_list("meter_id", "reading_date", "value")
+    )
+    history = {}
+    for meter_id, group in groupby(rows.iterator(chunk_size=10000), key=lambda row: row[0]):
+        install_date, deinstall_date = windows[meter_id]
+        days, values = [], []
+        for _, reading_date, value in group:
+            if install_date <= reading_date <= deinstall_date:
+                days.append(reading_date.toordinal())
+                values.append(value)
+        if days:
+            history[meter_id] = RealReadings(days, values)
+
+    for meter_id, (install_date, deinstall_date) in windows.items():
+        readings = history.get(meter_id)
+        for target in dates:
+            if not install_date <= target <= deinstall_date:
+                continue
+            if (meter_id, target) in existing:
+                result.existing += 1
+                continue
+            value = None
+            if readings is not None:
+                ordinal = target.toordinal()
+                index = bisect_left(readings.days, ordinal)
+                if 0 < index < len(readings.days):
+                    value = readings.interpolate(ordinal, index)
+                elif index == len(readings.days):
+                    value = readings.extrapolate(target)
+            if value is None:
+                result.skipped += 1
+                continue
+            result.readings.append(MeterReading(
+                meter_id=meter_id, reading_date=target, value=round(value, 3), is_estimated=True, user_id=user.pk
+            ))
+    return result
+
+
+def generate_estimates(dates, user, meters=None, batch_size=2000):
+    """
+    Create estimated readings of every active meter (or of `meters`) for each of `dates` with
+    `bulk_create`, and update the monthly roll-ups and plausibility flags it bypasses.
+    """
+    result = compute_estimates(dates, user, meters)
+    changes = defaultdict(list)
+    for reading in result.readings:
+        changes[reading.meter_id].append(reading.reading_date)
+    with transaction.atomic():
+        result.readings = MeterReading.objects.bulk_create(result.readings, batch_size=batch_size)
+        # bulk_create sends no post_save signals
+        monthly.refresh(changes)
+        plausibility.check_readings(result.readings)
+        if result.readings:
+            transaction.on_commit(lambda: conditional.bump_version(MeterReading))
+            transaction.on_commit(lambda: live.publish_created(result.readings))
+    return result
@@ -0,0 +1,203 @@
+"""
+Read-only fast path for list endpoints.
+
+`compile_rows()` turns a serializer into a plain function over `values_list()` tuples. The
+serializer's fields are inspected once per request and every row is then built with item
+lookups: values that are already JSON types (ints, floats, strings, booleans) are copied
+as they are, dates and datetimes use their ISO format with the timezone resolved once, and
+decimals, files and the like go through the DRF field's own `to_representation`, so the
+output is exactly what the serializer would have produced.
+Serializers using anything that cannot be read from a column (StringRelatedField, `source="*"`,
+many relations...) are not compiled and the view falls back to the regular path.
+"""
+from dataclasses import dataclass, field
+from operator import itemgetter
+
+from datetime import date
+
+from django.db.models.fields.files import FileField as ModelFileField
+from rest_framework import ISO_8601, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .query_planner import _model_field
+
+# DRF fields whose `to_representation` is a no-op for values coming from their model column
+VERBATIM_FIELDS = (
+    serializers.IntegerField, serializers.CharField, serializers.FloatField, serializers.BooleanField,
+)
+
+
+class Unsupported(Exception):
+    """The serializer reads something the fast path cannot fetch with `values_list()`."""
+
+
+@dataclass
+class CompiledRows:
+    """The `values_list()` lookups to fetch and the function turning one fetched tuple into a dict."""
+    lookups: list = field(default_factory=list)
+    to_representation: object = None
+
+    def index(self, lookup):
+        """Position of `lookup` in the fetched tuples, adding it to the lookups if needed."""
+        if lookup not in self.lookups:
+            self.lookups.append(lookup)
+        return self.lookups.index(lookup)
+
+    def queryset(self, queryset):
+        # Named rows let the keyset paginator read the ordering fields by name
+        return queryset.values_list(*self.lookups, named=True)
+
+
+def _skip_none(get, convert):
+    def getter(values):
+        value = get(values)
+        return None if value is None else convert(value)
+    return getter
+
+
+def _nested(get_pk, to_representation):
+    def getter(values):
+        return None if get_pk(values) is None else to_representation(values)
+    return getter
+
+
+def _iso_date(drf_field):
+    output_format = getattr(drf_field, "format", api_settings.DATE_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601:
+        return drf_field.to_representation
+    return date.isoformat
+
+
+def _iso_datetime(drf_field):
+    """`DateTimeField.to_representation` with the field's timezone looked up once, not per value."""
+    output_format = getattr(drf_field, "format", api_settings.DATETIME_FORMAT)
+    field_timezone = drf_field.timezone if hasattr(drf_field, "timezone") else drf_field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+        return drf_field.to_representation
+
+    def convert(value):
+        if value.tzinfo is None:
+            return drf_field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        return value[:-6] + "Z" if value.endswith("+00:00") else value
+    return convert
+
+
+def _file_url(field, storage, request):
+    use_url = getattr(field, "use_url", api_settings.UPLOADED_FILES_USE_URL)
+
+    def convert(name):
+        if not name:
+            return None
+        if not use_url:
+            return name
+        url = storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+    return convert
+
+
+def _method_field(serializer, field, model, compiled, prefix, sources):
+    """Call a SerializerMethodField on a bare model instance holding only the declared columns."""
+    names = [model._meta.pk.attname, *(model._meta.get_field(source).attname for source in sources)]
+    indexes = [compiled.index(f"{prefix}{source}") for source in [model._meta.pk.name, *sources]]
+    method = getattr(serializer, field.method_name)
+
+    def getter(values):
+        instance = model.__new__(model)
+        instance.__dict__.update(zip(names, (values[i] for i in indexes)))
+        return method(instance)
+    return getter
+
+
+def _compile(serializer, model, compiled, prefix):
+    method_sources = getattr(serializer, "method_field_sources", {})
+    request = serializer.context.get("request")
+    steps = []
+    for name, drf_field in serializer.fields.items():
+        if drf_field.write_only:
+            continue
+        if isinstance(drf_field, serializers.SerializerMethodField):
+            if name not in method_sources:
+                raise Unsupported(name)
+            steps.append((name, _method_field(serializer, drf_field, model, compiled, prefix, method_sources[name])))
+            continue
+
+        model_field = _model_field(model, drf_field.source)
+        if model_field is None or model_field.many_to_many or model_field.one_to_many:
+            raise Unsupported(name)
+        get = itemgetter(compiled.index(f"{prefix}{drf_field.source}"))
+
+        if isinstance(drf_field, serializers.BaseSerializer):
+            nested = _compile(drf_field, model_field.related_model, compiled, f"{prefix}{drf_field.source}__")
+            steps.append((name, _nested(get, nested)))
+        elif isinstance(drf_field, serializers.PrimaryKeyRelatedField):
+            if drf_field.pk_field is not None:
+                raise Unsupported(name)
+            steps.append((name, get))
+        elif isinstance(drf_field, serializers.RelatedField) or model_field.is_relation:
+            raise Unsupported(name)
+        elif isinstance(drf_field, serializers.FileField) and isinstance(model_field, ModelFileField):
+            steps.append((name, _skip_none(get, _file_url(drf_field, model_field.storage, request))))
+        elif type(drf_field) is serializers.DateTimeField:
+            steps.append((name, _skip_none(get, _iso_datetime(drf_field))))
+        elif type(drf_field) is serializers.DateField:
+            steps.append((name, _skip_none(get, _iso_date(drf_field))))
+        elif type(drf_field) in VERBATIM_FIELDS:
+            steps.append((name, get))
+        else:
+            steps.append((name, _skip_none(get, drf_field.to_representation)))
+
+    def to_representation(values):
+        return {name: getter(values) for name, getter in steps}
+    return to_representation
+
+
+def compile_rows(serializer):
+    """Compile `serializer` (a bound instance, so `?fields=`/`?expand=` apply) or return None."""
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    model = getattr(getattr(serializer, "Meta", None), "model", None)
+    if model is None:
+        return None
+    compiled = CompiledRows()
+    try:
+        compiled.to_representation = _compile(serializer, model, compiled, "")
+    except Unsupported:
+        return None
+    return compiled
+
+
+class FastListMixin:
+    """
+    Render JSON list responses from `values_list()` rows with a compiled row function instead of
+    instantiating models and running the serializer per row. Falls back to the regular path when
+    the serializer cannot be compiled or another renderer (e.g. the browsable API) was negotiated.
+    """
+
+    def get_compiled_rows(self):
+        if self.request.accepted_renderer.format != "json":
+            return None
+        compiled = compile_rows(self.get_serializer())
+        if compiled is not None:
+            for name in getattr(self, "keyset_ordering", ()):
+                compiled.index(name)  # The paginator reads the cursor position off the row
+        return compiled
+
+    def get_row_renderer(self, queryset):
+        compiled = self.get_compiled_rows()
+        if compiled is None:
+            return queryset, self.get_serializer().to_representation
+        return compiled.queryset(queryset), compiled.to_representation
+
+    def list(self, request, *args, **kwargs):
+        compiled = self.get_compiled_rows()
+        if compiled is None:
+            return super().list(request, *args, **kwargs)
+        queryset = compiled.queryset(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        rows = page if page is not None else queryset
+        data = [compiled.to_representation(values) for values in rows]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
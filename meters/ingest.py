@@ -0,0 +1,187 @@
+"""Batched validation and insertion of meter readings."""
+import math
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+from django.utils.translation import gettext as _
+
+from . import live, monthly, plausibility
+from .models import Meter, MeterReading
+
+TRUE_VALUES = {"1", "true", "yes", "y", "t"}
+FALSE_VALUES = {"0", "false", "no", "n", "f", ""}
+# Keys per meter lookup; each is sent twice (serial numbers and labels)
+LOOKUP_BATCH_SIZE = 500
+
+
+@dataclass
+class IngestResult:
+    created: int = 0
+    errors: list = field(default_factory=list)
+    readings: list = field(default_factory=list)
+
+
+def _meter_key(row):
+    for key in ("serial_number", "label", "meter"):
+        value = row.get(key)
+        if value not in (None, ""):
+            return str(value).strip()
+    return None
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower() if value is not None else ""
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError
+
+
+def resolve_meters(keys, batch_size=LOOKUP_BATCH_SIZE):
+    """Map serial numbers and labels to meters with one query per `batch_size` keys."""
+    keys, found = list(keys), []
+    for start in range(0, len(keys), batch_size):
+        batch = keys[start:start + batch_size]
+        found.extend(Meter.objects.filter(Q(serial_number__in=batch) | Q(label__in=batch)).only(
+            "id", "serial_number", "label"
+        ))
+    meters = {meter.label: meter for meter in found}
+    # Serial numbers win over a label that happens to match, whichever batch found them
+    meters.update((meter.serial_number, meter) for meter in found)
+    return meters
+
+
+def validate_readings(rows, user):
+    """
+    Validate raw rows (from JSON or CSV) in memory.
+
+    Each row identifies its meter by `serial_number`, `label` or `meter` (either of the two)
+    and carries `reading_date` (ISO date), `value` and optionally `is_estimated`.
+    Returns `(readings, errors)` where errors are `{"row": index, "errors": {field: [messages]}}`.
+    """
+    keys = {key for key in map(_meter_key, rows) if key}
+    meters = resolve_meters(keys)
+
+    readings, errors, seen = [], [], {}
+    for index, row in enumerate(rows):
+        row_errors = {}
+        if not isinstance(row, dict):
+            errors.append({"row": index, "errors": {"non_field_errors": [_("Expected an object.")]}})
+            continue
+
+        key = _meter_key(row)
+        meter = meters.get(key)
+        if key is None:
+            row_errors["meter"] = [_("A serial_number or label is required.")]
+        elif meter is None:
+            row_errors["meter"] = [_("Unknown meter '%(key)s'.") % {"key": key}]
+
+        reading_date = None
+        try:
+            reading_date = parse_date(str(row.get("reading_date") or "").strip())
+        except ValueError:
+            pass
+        if reading_date is None:
+            row_errors["reading_date"] = [_("Enter a valid date in YYYY-MM-DD format.")]
+
+        value = None
+        try:
+            value = float(row.get("value"))
+        except (TypeError, ValueError):
+            pass
+        if value is None or not math.isfinite(value):
+            row_errors["value"] = [_("A valid number is required.")]
+
+        try:
+            is_estimated = _parse_bool(row.get("is_estimated", False))
+        except ValueError:
+            row_errors["is_estimated"] = [_("Must be a valid boolean.")]
+
+        if meter is not None and reading_date is not None:
+            duplicate_of = seen.setdefault((meter.pk, reading_date), index)
+            if duplicate_of != index:
+                row_errors.setdefault("reading_date", []).append(
+                    _("Duplicate of row %(row)s for this meter and date.") % {"row": duplicate_of}
+                )
+
+        if row_errors:
+            errors.append({"row": index, "errors": row_errors})
+            continue
+        readings.append((index, MeterReading(
+            meter_id=meter.pk, reading_date=reading_date, value=value, is_estimated=is_estimated, user_id=user.pk
+        )))
+
+    if readings:
+        errors.extend(_existing_conflicts(readings))
+    return readings, errors
+
+
+def _existing_conflicts(readings):
+    """Report rows that collide with a stored reading, using one range query over the batch."""
+    dates = [reading.reading_date for _, reading in readings]
+    existing = set(
+        MeterReading.objects.filter(
+            meter_id__in={reading.meter_id for _, reading in readings},
+            reading_date__range=(min(dates), max(dates)),
+        ).values_list("meter_id", "reading_date")
+    )
+    return [
+        {"row": index, "errors": {"reading_date": [_("A reading for this meter and date already exists.")]}}
+        for index, reading in readings
+        if (reading.meter_id, reading.reading_date) in existing
+    ]
+
+
+def ingest_readings(rows, user, partial=False, batch_size=2000):
+    """
+    Validate `rows` and insert them with `bulk_create` in a single transaction.
+
+    By default nothing is written if any row is invalid; with `partial=True` the valid rows
+    are inserted and the invalid ones are reported. A reading stored by a concurrent ingest
+    between validation and insert is reported like any other conflict.
+    """
+    readings, errors = validate_readings(rows, user)
+    result = IngestResult(errors=errors)
+    if errors and not partial:
+        errors.sort(key=lambda error: error["row"])
+        return result
+
+    failed = {error["row"] for error in errors}
+    valid = [(index, reading) for index, reading in readings if index not in failed]
+    with transaction.atomic():
+        for start in range(0, len(valid), batch_size):
+            chunk = valid[start:start + batch_size]
+            while chunk:
+                try:
+                    with transaction.atomic():
+                        result.readings.extend(MeterReading.objects.bulk_create([reading for _, reading in chunk]))
+                    break
+                except IntegrityError:
+                    conflicts = _existing_conflicts(chunk)
+                    if not conflicts:
+                        raise
+                    errors.extend(conflicts)
+                    if not partial:
+                        transaction.set_rollback(True)
+                        result.readings = []
+                        errors.sort(key=lambda error: error["row"])
+                        return result
+                    conflicting = {error["row"] for error in conflicts}
+                    chunk = [(index, reading) for index, reading in chunk if index not in conflicting]
+
+        changes = defaultdict(list)
+        for reading in result.readings:
+            changes[reading.meter_id].append(reading.reading_date)
+        # bulk_create sends no post_save signals
+        monthly.refresh(changes)
+        plausibility.check_readings(result.readings)
+        transaction.on_commit(lambda: live.publish_created(result.readings))
+    errors.sort(key=lambda error: error["row"])
+    result.created = len(result.readings)
+    return result
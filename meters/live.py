@@ -0,0 +1,263 @@
+"""
+Live push of new meter readings and expenses.
+
+Every committed reading or expense is published once, to the channels `all`, `meter:<id>`
+and `unit:<id>`. Subscribers are the Server-Sent Events streams of `LiveEventsView`: each
+one holds a small `asyncio.Queue` on the event loop that serves it and waits on it, so an
+idle subscriber costs one suspended coroutine and no database queries. Events are encoded
+to JSON once when published and shared by every subscriber.
+
+The broker is pluggable (`METERS_LIVE_BACKEND`). `LocalBroker` fans out within one process.
+`TCPBroker` lets several worker processes share events through `run_live_broker`, a small
+relay that stands in for Redis pub/sub or PostgreSQL LISTEN/NOTIFY. Staff may follow any channel;
+other users only the channels of the units they are the tenant of (`allowed_channels`). Delivery is best effort:
+a subscriber whose queue is full misses events rather than buffering without limit, and
+events published while the relay is unreachable are dropped. The events of one commit are
+published as one batch (one relay message per `RELAY_BATCH_SIZE` events), so a bulk ingest
+costs a few writes, and at most one connection attempt when the relay is down.
+"""
+import asyncio
+import json
+import logging
+import socket
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+from .models import Expense, Meter, MeterReading, Unit
+
+logger = logging.getLogger(__name__)
+
+ALL = "all"
+QUEUE_SIZE = 100
+RELAY_BUFFER_LIMIT = 1024 * 1024
+RELAY_BATCH_SIZE = 1000
+SUBSCRIBE = b"SUBSCRIBE\n"
+
+
+def channels_for(meter_id, unit_id):
+    return [ALL, f"meter:{meter_id}", f"unit:{unit_id}"]
+
+
+def allowed_channels(user, meter_ids=(), unit_ids=()):
+    """
+    The channels `user` may follow, limited to `meter_ids` and `unit_ids` when any are given. Staff
+    may follow every meter and unit, other users the units they are the tenant of and their meters.
+    """
+    if user.is_staff:
+        if not meter_ids and not unit_ids:
+            return [ALL]
+        return [f"meter:{pk}" for pk in meter_ids] + [f"unit:{pk}" for pk in unit_ids]
+    units = Unit.objects.filter(tenant=user)
+    if not meter_ids and not unit_ids:
+        return [f"unit:{pk}" for pk in units.values_list("pk", flat=True)]
+    meters = Meter.objects.filter(pk__in=meter_ids, unit__in=units).values_list("pk", flat=True)
+    units = units.filter(pk__in=unit_ids).values_list("pk", flat=True)
+    return [f"meter:{pk}" for pk in meters] + [f"unit:{pk}" for pk in units]
+
+
+def format_sse(event):
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {event['data']}\n\n"
+
+
+class Subscription:
+    """The events of some channels, delivered to a queue on the subscriber's event loop."""
+
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = set(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+
+    def put(self, event):
+        """Queue `event`; must run on the subscriber's loop."""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            pass
+
+    async def get(self):
+        return await self.queue.get()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """Fan-out to the subscribers of the current process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = defaultdict(set)
+
+    def subscribe(self, channels):
+        subscription = Subscription(self, channels)
+        with self.lock:
+            for channel in subscription.channels:
+                self.subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for channel in subscription.channels:
+                self.subscribers[channel].discard(subscription)
+                if not self.subscribers[channel]:
+                    del self.subscribers[channel]
+
+    def publish(self, channels, event):
+        self.publish_many([(channels, event)])
+
+    def publish_many(self, messages):
+        """Publish `(channels, event)` pairs."""
+        for channels, event in messages:
+            self.deliver(channels, event)
+
+    def deliver(self, channels, event):
+        """Give `event` to every subscriber of any of `channels`, once."""
+        with self.lock:
+            targets = set().union(*(self.subscribers.get(channel, ()) for channel in channels))
+        # One wake-up per event loop rather than per subscriber; this may run in any thread
+        by_loop = defaultdict(list)
+        for subscription in targets:
+            by_loop[subscription.loop].append(subscription)
+        for loop, subscriptions in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_put_all, subscriptions, event)
+            except RuntimeError:
+                # The loop was closed without its subscribers leaving; nobody is waiting on it
+                logger.debug("Dropped live event for %s subscribers of a closed event loop.", len(subscriptions))
+
+
+def _put_all(subscriptions, event):
+    for subscription in subscriptions:
+        subscription.put(event)
+
+
+class TCPBroker(LocalBroker):
+    """
+    Share events between processes through the relay of `run_live_broker`. Published events
+    are sent to the relay, and every process that has subscribers reads all relayed events on
+    one connection and fans them out locally, so its own events reach it the same way.
+    """
+
+    def __init__(self, address=None):
+        super().__init__()
+        host, port = (address or settings.METERS_LIVE_BROKER).rsplit(":", 1)
+        self.address = (host, int(port))
+        self.connection = None
+        self.connection_lock = threading.Lock()
+        self.listener = None
+
+    def publish_many(self, messages):
+        """Send the events to the relay in a few lines; give up on the batch at the first failure."""
+        with self.connection_lock:
+            for start in range(0, len(messages), RELAY_BATCH_SIZE):
+                batch = messages[start:start + RELAY_BATCH_SIZE]
+                line = json.dumps({"events": batch}).encode() + b"\n"
+                try:
+                    if self.connection is None:
+                        self.connection = socket.create_connection(self.address, timeout=2)
+                    self.connection.sendall(line)
+                except OSError:
+                    logger.warning(
+                        "Live event relay at %s:%s is unreachable, %s events dropped.", *self.address,
+                        len(messages) - start,
+                    )
+                    if self.connection is not None:
+                        self.connection.close()
+                    self.connection = None
+                    return
+
+    def subscribe(self, channels):
+        subscription = super().subscribe(channels)
+        if self.listener is None or self.listener.done():
+            self.listener = subscription.loop.create_task(self.listen())
+        return subscription
+
+    async def listen(self, retry_delay=1):
+        """Fan out the relayed events until cancelled, reconnecting whenever the relay goes away."""
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(*self.address)
+            except OSError:
+                await asyncio.sleep(retry_delay)
+                continue
+            try:
+                writer.write(SUBSCRIBE)
+                while line := await reader.readline():
+                    for channels, event in json.loads(line)["events"]:
+                        self.deliver(channels, event)
+            except OSError:
+                pass
+            finally:
+                writer.close()
+            await asyncio.sleep(retry_delay)
+
+
+async def serve_relay(host, port):
+    """
+    Start the relay: every line a publisher sends is forwarded to every connection that opened
+    with `SUBSCRIBE`. A subscriber that stops reading has lines dropped once its buffer is full.
+    """
+    subscribers = set()
+
+    async def handle(reader, writer):
+        line = await reader.readline()
+        if line == SUBSCRIBE:
+            subscribers.add(writer)
+            try:
+                await reader.read()  # Until the subscriber disconnects
+            finally:
+                subscribers.discard(writer)
+            line = b""
+        while line:
+            for subscriber in list(subscribers):
+                if subscriber.transport.get_write_buffer_size() < RELAY_BUFFER_LIMIT:
+                    subscriber.write(line)
+            line = await reader.readline()
+        writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.METERS_LIVE_BACKEND)()
+
+
+def _event(instance, unit_id):
+    if isinstance(instance, MeterReading):
+        kind, fields = "reading", ("reading_date", "value", "is_estimated")
+    else:
+        kind, fields = "expense", ("invoice_number", "invoice_date", "total_cost")
+    data = {"id": instance.pk, "meter": instance.meter_id, "unit": unit_id}
+    data.update((name, getattr(instance, name)) for name in fields)
+    return {"id": f"{kind}-{instance.pk}", "event": kind, "data": json.dumps(data, cls=DjangoJSONEncoder)}
+
+
+def publish_created(instances):
+    """
+    Publish new readings and/or expenses as one batch, looking up their meters' units with one
+    query. Runs from `on_commit`, so failures are logged rather than raised into the request.
+    """
+    instances = [instance for instance in instances if isinstance(instance, (MeterReading, Expense))]
+    if not instances:
+        return
+    try:
+        units = dict(
+            Meter.objects.filter(pk__in={instance.meter_id for instance in instances}).values_list("id", "unit_id")
+        )
+        messages = []
+        for instance in instances:
+            unit_id = units.get(instance.meter_id)
+            messages.append((channels_for(instance.meter_id, unit_id), _event(instance, unit_id)))
+        get_broker().publish_many(messages)
+    except Exception:
+        logger.exception("Publishing %s live events failed.", len(instances))
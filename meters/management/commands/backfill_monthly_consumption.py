@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from meters.models import Meter
+from meters.monthly import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the monthly consumption roll-up table from the meter readings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--meters", type=int, nargs="*", help="Only these meter ids (default: all meters).")
+        parser.add_argument("--batch-size", type=int, default=200, help="Meters loaded per query.")
+
+    def handle(self, *args, **options):
+        meter_ids = list(Meter.objects.order_by("id").values_list("id", flat=True))
+        if options["meters"]:
+            meter_ids = [meter_id for meter_id in meter_ids if meter_id in set(options["meters"])]
+        rows = 0
+        for offset in range(0, len(meter_ids), options["batch_size"]):
+            rows += rebuild(meter_ids[offset:offset + options["batch_size"]])
+        self.stdout.write(self.style.SUCCESS(f"Stored {rows} monthly values for {len(meter_ids)} meters."))
@@ -0,0 +1,36 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from meters.benchmarks import synthetic_dataset, timer
+from meters.consumption import HAS_NUMPY, load_series
+
+
+class Command(BaseCommand):
+    help = "Time loading reading series and computing monthly consumption for every meter, per backend."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--meters", type=int, default=200)
+        parser.add_argument("--years", type=int, default=10)
+
+    def handle(self, *args, **options):
+        readings = options["years"] * 52
+        start, end = date(2015, 1, 1), date(2015 + options["years"], 1, 1)
+        backends = [False, True] if HAS_NUMPY else [False]
+        with synthetic_dataset(meters=options["meters"], readings_per_meter=readings, step_days=7, start=start) as meters:
+            self.stdout.write(f"{len(meters)} meters x {readings} weekly readings")
+            for use_numpy in backends:
+                results = {}
+                with timer(results, "load"):
+                    series = load_series(meters, use_numpy=use_numpy)
+                with timer(results, "monthly"):
+                    for item in series.values():
+                        item.bucketed(start, end, "month")
+                with timer(results, "daily"):
+                    for item in series.values():
+                        item.bucketed(start, end, "day")
+                name = "numpy" if use_numpy else "python"
+                self.stdout.write(
+                    f"{name:>6}: load {results['load']:.3f}s, monthly {results['monthly']:.3f}s, "
+                    f"daily {results['daily']:.3f}s"
+                )
@@ -0,0 +1,32 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from meters.benchmarks import synthetic_dataset, timer
+from meters.estimates import compute_estimates, generate_estimates
+
+
+class Command(BaseCommand):
+    help = "Time estimating one reading per meter between readings and after the last one."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--meters", type=int, default=10000)
+        parser.add_argument("--readings", type=int, default=48, help="Monthly readings per meter.")
+
+    def handle(self, *args, **options):
+        start = date(2015, 1, 1)
+        with synthetic_dataset(meters=options["meters"], readings_per_meter=options["readings"], start=start) as meters:
+            user = meters[0].readings.first().user
+            last = meters[0].readings.order_by("-reading_date").first().reading_date
+            targets = {"interpolated": date(2016, 6, 15), "extrapolated": date(last.year + 1, 1, 1)}
+            self.stdout.write(f"{len(meters)} meters x {options['readings']} readings")
+            for name, target in targets.items():
+                results = {}
+                with timer(results, "compute"):
+                    compute_estimates([target], user)
+                with timer(results, "generate"):
+                    created = generate_estimates([target], user).readings
+                self.stdout.write(
+                    f"{name:>12}: {len(created)} readings, compute {results['compute']:.3f}s, "
+                    f"generate (with roll-ups and checks) {results['generate']:.3f}s"
+                )
@@ -0,0 +1,37 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from meters.ocr import recognize
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".tif", ".tiff"}
+
+
+class Command(BaseCommand):
+    help = "Measure OCR throughput (images per second) over a directory of sample photos for several pool sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory")
+        parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, os.cpu_count() or 1}))
+
+    def handle(self, *args, **options):
+        paths = sorted(
+            str(path) for path in Path(options["directory"]).iterdir() if path.suffix.lower() in IMAGE_SUFFIXES
+        )
+        if not paths:
+            raise CommandError(f"No images found in {options['directory']}.")
+
+        for workers in options["workers"]:
+            started = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(recognize, paths, chunksize=max(1, len(paths) // (workers * 4))))
+            elapsed = time.perf_counter() - started
+            errors = sum(1 for result in results if result["error"])
+            recognized = sum(1 for result in results if result["value"] is not None)
+            self.stdout.write(
+                f"{workers:>3} workers: {len(paths) / elapsed:8.2f} images/s "
+                f"({len(paths)} images, {recognized} values recognized, {errors} errors)"
+            )
@@ -0,0 +1,57 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from meters.benchmarks import synthetic_dataset, timer
+from meters.models import MeterReading
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the query plan and timing of a per-meter reading_date range query "
+        "with and without the composite (meter, reading_date) index."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--meters", type=int, default=200)
+        parser.add_argument("--readings", type=int, default=500, help="Readings per meter")
+        parser.add_argument("--repeat", type=int, default=200)
+
+    def handle(self, *args, **options):
+        with synthetic_dataset(meters=options["meters"], readings_per_meter=options["readings"], step_days=7) as meters:
+            meter = meters[len(meters) // 2]
+            queryset = MeterReading.objects.filter(
+                meter=meter, reading_date__range=(date(2016, 1, 1), date(2016, 1, 1) + timedelta(days=180))
+            ).values_list("reading_date", "value")
+            sql, params = queryset.query.sql_with_params()
+
+            for label, use_index in (("without index (scan)", False), ("with index (seek)", True)):
+                with transaction.atomic(), connection.cursor() as cursor:
+                    plan, statement = self.prepare(cursor, sql, use_index)
+                    cursor.execute(plan + statement, params)
+                    self.stdout.write(self.style.MIGRATE_HEADING(label))
+                    for row in cursor.fetchall():
+                        self.stdout.write("  " + " ".join(str(column) for column in row))
+                    results = {}
+                    with timer(results, label):
+                        for _ in range(options["repeat"]):
+                            cursor.execute(statement, params)
+                            cursor.fetchall()
+                    per_query = results[label] / options["repeat"] * 1000
+                    self.stdout.write(f"  {per_query:.3f} ms per query\n")
+
+    def prepare(self, cursor, sql, use_index):
+        """Return the EXPLAIN prefix and the statement, with index use disabled for the baseline."""
+        table = connection.ops.quote_name(MeterReading._meta.db_table)
+        if connection.vendor == "sqlite":
+            if not use_index:
+                sql = sql.replace(f"FROM {table}", f"FROM {table} NOT INDEXED", 1)
+            return "EXPLAIN QUERY PLAN ", sql
+        if connection.vendor == "postgresql":
+            if not use_index:
+                cursor.execute("SET LOCAL enable_indexscan = off")
+                cursor.execute("SET LOCAL enable_bitmapscan = off")
+                cursor.execute("SET LOCAL enable_indexonlyscan = off")
+            return "EXPLAIN ", sql
+        return "EXPLAIN ", sql
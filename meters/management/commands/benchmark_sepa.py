@@ -0,0 +1,50 @@
+import time
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from meters.sepa import CREDIT_TRANSFER, DIRECT_DEBIT, Party, Transaction, generate_pain
+
+
+def synthetic_transactions(count, due_dates=4):
+    """A function returning `count` transactions spread evenly over `due_dates` due dates."""
+    def transactions():
+        per_date = -(-count // due_dates)
+        for index in range(count):
+            yield Transaction(
+                end_to_end_id=f"BENCH-{index}", due_date=date(2025, 1, 1) + timedelta(days=index // per_date),
+                amount=Decimal(100 + index % 900) / 4, name=f"Tenant {index}", iban="AT611904300234573201",
+                bic="BKAUATWWXXX", remittance=f"Costs 2024 unit {index}", mandate_id=f"M-{index}",
+                mandate_signed_on=date(2020, 1, 1),
+            )
+    return transactions
+
+
+class Command(BaseCommand):
+    help = (
+        "Time generating SEPA files of synthetic transactions and show that peak memory does not grow with them "
+        "(times include the tracing overhead)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+
+    def handle(self, *args, **options):
+        party = Party("Uhrenhaus", "AT611904300234573201", "BKAUATWWXXX", "AT98ZZZ00000000001")
+        for kind in (DIRECT_DEBIT, CREDIT_TRANSFER):
+            for size in options["sizes"]:
+                size_bytes = 0
+                tracemalloc.start()
+                started = time.perf_counter()
+                # Count the output rather than keep it, as a file or HTTP response would
+                for chunk in generate_pain(kind, synthetic_transactions(size), party):
+                    size_bytes += len(chunk.encode())
+                elapsed = time.perf_counter() - started
+                _current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                self.stdout.write(
+                    f"{kind} {size:>7} transactions: {elapsed:.2f}s, {size_bytes / 1e6:.1f} MB of XML, "
+                    f"peak memory {peak / 1e6:.2f} MB"
+                )
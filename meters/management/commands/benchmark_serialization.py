@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from meters.benchmarks import synthetic_dataset, timer
+from meters.fast_serialization import compile_rows
+from meters.models import MeterReading
+from meters.query_planner import plan_queryset
+from meters.serializers import MeterReadingSerializer, split_param
+
+
+class Command(BaseCommand):
+    help = "Compare rows per second of the ModelSerializer and the compiled list path for meter readings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--meters", type=int, default=100)
+        parser.add_argument("--readings", type=int, default=500, help="Readings per meter.")
+        parser.add_argument("--expand", default="", help="Same syntax as the ?expand= query parameter.")
+        parser.add_argument("--fields", default="", help="Same syntax as the ?fields= query parameter.")
+
+    def handle(self, *args, **options):
+        serializer = MeterReadingSerializer(fields=split_param(options["fields"]), expand=split_param(options["expand"]))
+        compiled = compile_rows(serializer)
+        if compiled is None:
+            raise CommandError("These fields cannot be compiled; the view would use the regular serializer.")
+        renderer = JSONRenderer()
+
+        with synthetic_dataset(meters=options["meters"], readings_per_meter=options["readings"]):
+            queryset = MeterReading.objects.order_by("reading_date", "id")
+            results = {}
+            with timer(results, "serializer"):
+                regular = renderer.render(serializer.__class__(
+                    plan_queryset(queryset, serializer), many=True, fields=serializer.requested_fields,
+                    expand=serializer.expanded_fields,
+                ).data)
+            with timer(results, "compiled"):
+                fast = renderer.render([compiled.to_representation(row) for row in compiled.queryset(queryset)])
+
+            rows = queryset.count()
+            self.stdout.write(f"{rows} readings, {len(fast)} bytes")
+            for name in ("serializer", "compiled"):
+                self.stdout.write(f"{name:>10}: {results[name]:.3f}s, {rows / results[name]:,.0f} rows/s")
+            self.stdout.write(f"speed-up: {results['serializer'] / results['compiled']:.1f}x")
+            if fast != regular:
+                raise CommandError("The compiled output differs from the serializer output.")
@@ -0,0 +1,53 @@
+import os
+import tempfile
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from meters.models import BillingRun
+from meters.sepa import CREDIT_TRANSFER, DIRECT_DEBIT, Party, SepaError, generate_pain, sepa_transactions
+
+KINDS = {"debits": DIRECT_DEBIT, "transfers": CREDIT_TRANSFER}
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the SEPA file of a billing run: pain.008 direct debits of the tenants' allocated costs, "
+        "or pain.001 credit transfers paying the suppliers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("run", type=int, help="ID of the billing run")
+        parser.add_argument("kind", choices=sorted(KINDS))
+        parser.add_argument("output", help="Path of the XML file to write")
+        parser.add_argument("--due-date", help="Collection date of the direct debits (YYYY-MM-DD, default in 14 days)")
+        parser.add_argument("--payment-days", type=int, default=30, help="Days from invoice date to transfer")
+
+    def handle(self, *args, **options):
+        try:
+            run = BillingRun.objects.get(pk=options["run"])
+        except BillingRun.DoesNotExist:
+            raise CommandError(f"Billing run {options['run']} does not exist.")
+        due_date = parse_date(options["due_date"]) if options["due_date"] else timezone.localdate() + timedelta(days=14)
+        if due_date is None:
+            raise CommandError("--due-date must be a date (YYYY-MM-DD).")
+
+        kind, skipped = KINDS[options["kind"]], []
+        transactions = sepa_transactions(kind, run, due_date, options["payment_days"], skipped=skipped)
+        # Write next to the target and rename, so a failed export leaves no partial file behind
+        directory = os.path.dirname(os.path.abspath(options["output"]))
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory, suffix=".xml", delete=False) as file:
+            try:
+                for chunk in generate_pain(kind, transactions, Party.from_settings()):
+                    file.write(chunk)
+            except SepaError as error:
+                file.close()
+                os.unlink(file.name)
+                raise CommandError(error)
+        os.replace(file.name, options["output"])
+
+        for item, reason in skipped:
+            self.stderr.write(self.style.WARNING(f"Skipped {item}: {reason}."))
+        self.stdout.write(self.style.SUCCESS(f"{kind} file of {run} written to {options['output']}."))
@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from meters.estimates import compute_estimates, generate_estimates
+
+
+class Command(BaseCommand):
+    help = "Create estimated readings of every active meter for the given dates (e.g. billing period boundaries)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("dates", nargs="+", help="Target dates (YYYY-MM-DD)")
+        parser.add_argument("--user", required=True, help="Username recorded as the reader of the estimates")
+        parser.add_argument("--meters", type=int, nargs="*", help="Only these meter ids (default: all active meters).")
+        parser.add_argument("--batch-size", type=int, default=2000, help="Readings per INSERT")
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be created.")
+
+    def handle(self, *args, **options):
+        dates = [parse_date(value) for value in options["dates"]]
+        if None in dates:
+            raise CommandError("Dates must be given as YYYY-MM-DD.")
+        try:
+            user = get_user_model().objects.get(username=options["user"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"Unknown user '{options['user']}'.")
+
+        meters = options["meters"] or None
+        if options["dry_run"]:
+            result = compute_estimates(dates, user, meters)
+            for reading in result.readings:
+                self.stdout.write(f"{reading.meter_id},{reading.reading_date.isoformat()},{reading.value}")
+        else:
+            result = generate_estimates(dates, user, meters, batch_size=options["batch_size"])
+        verb = "Would create" if options["dry_run"] else "Created"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {len(result.readings)} estimated readings; {result.existing} dates already had a reading, "
+            f"{result.skipped} had too little history."
+        ))
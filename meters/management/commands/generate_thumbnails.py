@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from meters.models import MeterReading
+from meters.thumbnails import THUMBNAIL_SIZES, ensure_thumbnail
+
+
+class Command(BaseCommand):
+    help = "Hash existing meter reading photos and generate any missing thumbnails."
+
+    def handle(self, *args, **options):
+        generated = failed = 0
+        readings = MeterReading.objects.exclude(photo="").exclude(photo__isnull=True).only("id", "photo", "photo_hash")
+        for reading in readings.iterator(chunk_size=500):
+            try:
+                for size in THUMBNAIL_SIZES:
+                    ensure_thumbnail(reading, size)
+            except (OSError, ValueError) as exc:
+                failed += 1
+                self.stderr.write(self.style.WARNING(f"Reading {reading.pk}: {exc}"))
+                continue
+            generated += 1
+        self.stdout.write(self.style.SUCCESS(f"Thumbnails ready for {generated} photos ({failed} failed)."))
@@ -0,0 +1,77 @@
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+async def fetch(url, headers, read_size=65536, read_delay=0.0):
+    """GET `url` over a fresh connection, reading `read_size` bytes every `read_delay` seconds."""
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    target = parts.path + (f"?{parts.query}" if parts.query else "")
+    lines = [f"GET {target or '/'} HTTP/1.1", f"Host: {parts.netloc}", "Connection: close", *headers]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+    await writer.drain()
+    head = b""
+    try:
+        while chunk := await reader.read(read_size):
+            head = head or chunk
+            if read_delay:
+                await asyncio.sleep(read_delay)
+    finally:
+        writer.close()
+    status = head.split(b" ", 2)[1] if head.startswith(b"HTTP/") else b"?"
+    return status.decode()
+
+
+class Command(BaseCommand):
+    help = (
+        "Hold N slow clients on one URL (e.g. a ?stream=ndjson export or a long-poll endpoint) and measure how "
+        "quickly a running server still answers a second, fast URL. Run it against the same endpoint under a "
+        "WSGI server (/api/...) and under uvicorn (/api/async/...) to compare."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", help="URL the slow clients request")
+        parser.add_argument("--probe-url", help="URL timed while the slow clients are connected (default: url)")
+        parser.add_argument("--clients", type=int, default=50, help="Concurrent slow clients")
+        parser.add_argument("--read-size", type=int, default=4096, help="Bytes a slow client reads at a time")
+        parser.add_argument(
+            "--read-delay", type=float, default=0.05, help="Seconds a slow client waits between reads"
+        )
+        parser.add_argument("--probes", type=int, default=20, help="Sequential requests to the probe URL")
+        parser.add_argument("--header", action="append", default=[], help='e.g. "Cookie: sessionid=..."')
+
+    def handle(self, *args, **options):
+        if urlsplit(options["url"]).scheme != "http":
+            raise CommandError("Only plain http:// URLs are supported.")
+        asyncio.run(self.run(options))
+
+    async def run(self, options):
+        headers = options["header"]
+        slow = [
+            asyncio.create_task(fetch(options["url"], headers, options["read_size"], options["read_delay"]))
+            for _ in range(options["clients"])
+        ]
+        started = time.perf_counter()
+        await asyncio.sleep(0.5)  # Let the slow clients occupy the server
+
+        latencies, failed = [], 0
+        for _ in range(options["probes"]):
+            probe_started = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(fetch(options["probe_url"] or options["url"], headers), timeout=30)
+            except (OSError, asyncio.TimeoutError):
+                status = "error"
+            latencies.append(time.perf_counter() - probe_started)
+            failed += status != "200"
+
+        results = await asyncio.gather(*slow, return_exceptions=True)
+        elapsed = time.perf_counter() - started
+        completed = sum(result == "200" for result in results)
+        self.stdout.write(
+            f"{completed}/{len(slow)} slow clients completed in {elapsed:.1f}s; probes: "
+            f"median {statistics.median(latencies) * 1000:.0f}ms, max {max(latencies) * 1000:.0f}ms, {failed} failed"
+        )
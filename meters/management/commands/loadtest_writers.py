@@ -0,0 +1,90 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+from meters.models import ConsumptionType, Meter, MeterReading, Unit
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure meter reading writes per second with N concurrent clients against the configured database. "
+        "Creates its own unit, meters and readings and deletes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--clients", type=int, nargs="+", default=[1, 2, 4, 8], help="Concurrent writers per round."
+        )
+        parser.add_argument("--writes", type=int, default=200, help="Readings saved by each client per round.")
+
+    def handle(self, *args, **options):
+        settings_dict = connection.settings_dict
+        self.stdout.write(
+            f"{connection.vendor}: {settings_dict['NAME']}, CONN_MAX_AGE={settings_dict['CONN_MAX_AGE']}, "
+            f"options={settings_dict['OPTIONS']}"
+        )
+        user, created_user = get_user_model().objects.get_or_create(
+            username="loadtest", defaults={"email": "loadtest@example.invalid", "customer_number": "LOADTEST"}
+        )
+        consumption_type, _ = ConsumptionType.objects.get_or_create(name="Load test", defaults={"unit": "kWh"})
+        unit = Unit.objects.create(name="Load test", location="Load test", size=1)
+        try:
+            for clients in options["clients"]:
+                meters = [
+                    Meter.objects.create(
+                        label=f"loadtest-{clients}-{i}", serial_number=f"LOADTEST-{clients}-{i}",
+                        consumption_type=consumption_type, unit=unit,
+                    )
+                    for i in range(clients)
+                ]
+                self.report(clients, self.run_round(meters, user, options["writes"]))
+        finally:
+            Meter.objects.filter(unit=unit).delete()
+            unit.delete()
+            if created_user:
+                user.delete()
+
+    def run_round(self, meters, user, writes):
+        barrier = threading.Barrier(len(meters) + 1)
+
+        def write(meter):
+            latencies, errors = [], 0
+            barrier.wait()
+            try:
+                for n in range(writes):
+                    started = time.perf_counter()
+                    try:
+                        MeterReading.objects.create(
+                            meter=meter, reading_date=date(2000, 1, 1) + timedelta(days=n), value=n, user=user
+                        )
+                    except OperationalError:  # e.g. "database is locked" once the timeout has passed
+                        errors += 1
+                    latencies.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+            return latencies, errors
+
+        with ThreadPoolExecutor(max_workers=len(meters)) as pool:
+            futures = [pool.submit(write, meter) for meter in meters]
+            barrier.wait()
+            started = time.perf_counter()
+            results = [future.result() for future in futures]
+            elapsed = time.perf_counter() - started
+        latencies = sorted(latency for client_latencies, _ in results for latency in client_latencies)
+        errors = sum(client_errors for _, client_errors in results)
+        return elapsed, latencies, errors
+
+    def report(self, clients, result):
+        elapsed, latencies, errors = result
+        saved = len(latencies) - errors
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+        self.stdout.write(
+            f"{clients:>3} clients: {saved / elapsed:8,.0f} writes/s, {errors} errors, "
+            f"median {statistics.median(latencies) * 1000:.1f}ms, p95 {p95 * 1000:.1f}ms"
+        )
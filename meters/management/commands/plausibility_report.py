@@ -0,0 +1,33 @@
+import csv
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from meters.benchmarks import timer
+from meters.plausibility import scan, store_findings
+
+
+class Command(BaseCommand):
+    help = "Rescan all meter readings for implausible values and write a CSV report to stdout."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--meters", type=int, nargs="*", help="Only these meter ids (default: all meters).")
+        parser.add_argument("--store", action="store_true", help="Also create flags for the findings.")
+        parser.add_argument("--python", action="store_true", help="Use the pure Python scan instead of NumPy.")
+
+    def handle(self, *args, **options):
+        results = {}
+        with timer(results, "scan"):
+            findings = scan(meters=options["meters"] or None, use_numpy=False if options["python"] else None)
+
+        writer = csv.writer(self.stdout)
+        writer.writerow(["reading", "meter", "reading_date", "value", "kind", "score"])
+        for reading_id, meter_id, reading_date, value, kind, score in findings:
+            score = "" if score is None else f"{score:.2f}"
+            writer.writerow([reading_id, meter_id, reading_date.isoformat(), value, kind, score])
+
+        if options["store"]:
+            store_findings(findings)
+        counts = Counter(kind for _, _, _, _, kind, _ in findings)
+        summary = ", ".join(f"{count} {kind}" for kind, count in sorted(counts.items())) or "nothing"
+        self.stderr.write(self.style.SUCCESS(f"Found {summary} in {results['scan']:.3f}s."))
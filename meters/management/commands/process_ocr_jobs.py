@@ -0,0 +1,38 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from meters.ocr import process_jobs
+
+
+class Command(BaseCommand):
+    help = "Run the OCR worker: claim queued meter reading photos and recognize them on a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count(), help="OCR processes (default: CPU cores)")
+        parser.add_argument("--batch-size", type=int, default=None, help="Jobs claimed at once (default: 4x workers)")
+        parser.add_argument("--poll-interval", type=float, default=5.0, help="Seconds to sleep when the queue is empty")
+        parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+        parser.add_argument(
+            "--apply", action="store_true",
+            help="Replace typed values that do not fit the meter's history by plausible recognized ones",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"] or options["workers"] * 4
+        processed = 0
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            while True:
+                close_old_connections()
+                count = process_jobs(executor, batch_size, apply=options["apply"])
+                processed += count
+                if count:
+                    self.stdout.write(f"Processed {count} photos ({processed} total)")
+                elif options["once"]:
+                    break
+                else:
+                    time.sleep(options["poll_interval"])
+        self.stdout.write(self.style.SUCCESS(f"Done, {processed} photos processed."))
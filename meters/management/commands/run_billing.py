@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from meters.billing import run_billing
+
+
+class Command(BaseCommand):
+    help = "Allocate all expenses invoiced in a period across units. Safe to re-run: unchanged expenses are skipped."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="start", required=True, help="First invoice date (YYYY-MM-DD)")
+        parser.add_argument("--to", dest="end", required=True, help="Last invoice date (YYYY-MM-DD)")
+        parser.add_argument("--batch-size", type=int, default=200, help="Expenses committed per transaction")
+
+    def handle(self, *args, **options):
+        start, end = parse_date(options["start"]), parse_date(options["end"])
+        if not start or not end or end < start:
+            raise CommandError("--from and --to must be dates with --from <= --to.")
+
+        result = run_billing(start, end, batch_size=options["batch_size"])
+        for warning in result.run.warnings:
+            self.stderr.write(self.style.WARNING(warning))
+        self.stdout.write(self.style.SUCCESS(
+            f"{result.run}: {len(result.recomputed)} expenses allocated, {len(result.unchanged)} unchanged, "
+            f"{len(result.removed)} removed."
+        ))
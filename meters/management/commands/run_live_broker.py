@@ -0,0 +1,23 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from meters.live import serve_relay
+
+
+class Command(BaseCommand):
+    help = "Relay live reading/expense events between worker processes (for METERS_LIVE_BACKEND=meters.live.TCPBroker)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--address", default=settings.METERS_LIVE_BROKER, help="host:port to listen on")
+
+    def handle(self, *args, **options):
+        host, port = options["address"].rsplit(":", 1)
+        asyncio.run(self.serve(host, int(port)))
+
+    async def serve(self, host, port):
+        server = await serve_relay(host, port)
+        self.stdout.write(f"Relaying live events on {host}:{port}")
+        async with server:
+            await server.serve_forever()
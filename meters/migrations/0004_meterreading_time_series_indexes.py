@@ -0,0 +1,65 @@
+# Generated by Django 5.2 on 2026-10-18 11:38
+
+from django.db import migrations, models
+
+
+def merge_duplicate_readings(apps, schema_editor):
+    """
+    Prepare the (meter, reading_date) unique constraint: of several readings of one meter on
+    one day, keep an actual reading over an estimate, then the newest. Expenses that refer to
+    the others are pointed at the kept one before the others are deleted.
+    """
+    MeterReading = apps.get_model("meters", "MeterReading")
+    Expense = apps.get_model("meters", "Expense")
+    kept, duplicates = {}, {}
+    readings = MeterReading.objects.order_by("meter_id", "reading_date", "is_estimated", "-id")
+    for meter_id, reading_date, pk in readings.values_list("meter_id", "reading_date", "id").iterator():
+        key = (meter_id, reading_date)
+        if key in kept:
+            duplicates[pk] = kept[key]
+        else:
+            kept[key] = pk
+    if not duplicates:
+        return
+    ids = list(duplicates)
+    for start in range(0, len(ids), 1000):
+        batch = ids[start:start + 1000]
+        for field in ("start_reading", "end_reading"):
+            for expense in Expense.objects.filter(**{f"{field}_id__in": batch}).only("id", f"{field}_id"):
+                setattr(expense, f"{field}_id", duplicates[getattr(expense, f"{field}_id")])
+                expense.save(update_fields=[field])
+        MeterReading.objects.filter(pk__in=batch).delete()
+    if schema_editor.connection.vendor == "postgresql":
+        # Run the deferred foreign key checks now; PostgreSQL refuses to alter a table with pending ones
+        schema_editor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meters', '0003_alter_expense_end_reading_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_readings, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='conversionfactor',
+            index=models.Index(fields=['from_consumption_type', 'to_consumption_type', 'start_date', 'end_date'], name='conversion_pair_validity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['meter', 'invoice_date'], name='expense_meter_invoice_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='meterreading',
+            index=models.Index(fields=['meter', '-reading_date'], name='reading_meter_latest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='meterreading',
+            index=models.Index(fields=['reading_date', 'id'], name='reading_date_id_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='meterreading',
+            constraint=models.UniqueConstraint(fields=('meter', 'reading_date'), name='unique_reading_per_meter_date'),
+        ),
+    ]
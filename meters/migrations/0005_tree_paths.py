@@ -0,0 +1,55 @@
+# Generated by Django 5.2 on 2026-10-18 11:43
+
+from django.db import migrations, models
+
+
+# Copied from meters.trees at the time of this migration, so later changes there cannot break it
+def build_path(parent_path, pk):
+    return f"{parent_path or '/'}{pk}/"
+
+
+def compute_paths(parents):
+    paths = {}
+
+    def path_of(node_id, seen=()):
+        if node_id not in paths:
+            parent_id = parents.get(node_id)
+            if parent_id is None or parent_id not in parents or parent_id in seen:
+                paths[node_id] = build_path("", node_id)
+            else:
+                paths[node_id] = build_path(path_of(parent_id, seen + (node_id,)), node_id)
+        return paths[node_id]
+
+    for node_id in parents:
+        path_of(node_id)
+    return paths
+
+
+def backfill_tree_paths(apps, schema_editor):
+    for model_name, parent_field in (("Unit", "parent_unit_id"), ("Meter", "parent_meter_id")):
+        model = apps.get_model("meters", model_name)
+        parents = dict(model.objects.values_list("id", parent_field))
+        paths = compute_paths(parents)
+        nodes = [model(pk=node_id, tree_path=path) for node_id, path in paths.items()]
+        model.objects.bulk_update(nodes, ["tree_path"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meters', '0004_meterreading_time_series_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meter',
+            name='tree_path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255, verbose_name='Tree Path'),
+        ),
+        migrations.AddField(
+            model_name='unit',
+            name='tree_path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255, verbose_name='Tree Path'),
+        ),
+        migrations.RunPython(backfill_tree_paths, migrations.RunPython.noop),
+    ]
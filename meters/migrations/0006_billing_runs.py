@@ -0,0 +1,51 @@
+# Generated by Django 5.2 on 2026-10-18 11:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meters', '0005_tree_paths'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillingRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateField(verbose_name='Period Start')),
+                ('period_end', models.DateField(verbose_name='Period End')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20, verbose_name='Status')),
+                ('warnings', models.JSONField(blank=True, default=list, verbose_name='Warnings')),
+                ('completed_at', models.DateTimeField(blank=True, null=True, verbose_name='Completed At')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Last Updated')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('period_start', 'period_end'), name='unique_billing_run_period')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CostAllocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size_share', models.FloatField(verbose_name='Share of Size')),
+                ('consumption', models.FloatField(help_text="Sub-meter consumption converted to the billed meter's unit.", verbose_name='Consumption')),
+                ('consumption_share', models.FloatField(verbose_name='Share of Consumption')),
+                ('fixed_costs', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Fixed Costs (€)')),
+                ('variable_costs', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Variable Costs (€)')),
+                ('vat', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='VAT (€)')),
+                ('total_cost', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Total Amount (€)')),
+                ('input_fingerprint', models.CharField(help_text='Hash of every input used for this expense; unchanged inputs are not recomputed.', max_length=64, verbose_name='Input Fingerprint')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('billing_run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='meters.billingrun', verbose_name='Billing Run')),
+                ('expense', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='meters.expense', verbose_name='Expense')),
+                ('unit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_allocations', to='meters.unit', verbose_name='Unit')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('billing_run', 'expense', 'unit'), name='unique_allocation_per_unit')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-18 11:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meters', '0006_billing_runs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OCRJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('photo_name', models.CharField(max_length=255, verbose_name='Photo')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20, verbose_name='Status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Attempts')),
+                ('suggested_value', models.FloatField(blank=True, null=True, verbose_name='Suggested Value')),
+                ('suggested_date', models.DateField(blank=True, null=True, verbose_name='Suggested Reading Date')),
+                ('raw_text', models.TextField(blank=True, default='', verbose_name='Recognized Text')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Error')),
+                ('applied', models.BooleanField(default=False, verbose_name='Applied to Reading')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Last Updated')),
+                ('reading', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocr_jobs', to='meters.meterreading', verbose_name='Meter Reading')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'updated_at'], name='ocr_job_queue_idx')],
+                'constraints': [models.UniqueConstraint(fields=('reading', 'photo_name'), name='unique_ocr_job_per_photo')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 11:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meters', '0007_ocr_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meterreading',
+            name='photo_hash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, help_text='SHA-256 of the photo; names its cached thumbnails.', max_length=64, verbose_name='Photo Content Hash'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-18 11:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meters', '0008_meterreading_photo_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyConsumption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month.', verbose_name='Month')),
+                ('consumption', models.FloatField(verbose_name='Consumption')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Last Updated')),
+                ('meter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_consumption', to='meters.meter', verbose_name='Meter')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['month', 'meter'], name='monthly_month_meter_idx')],
+                'constraints': [models.UniqueConstraint(fields=('meter', 'month'), name='unique_monthly_consumption')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 12:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meters', '0009_monthly_consumption'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlausibilityFlag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('decrease', 'Decreasing value'), ('spike', 'Abnormal jump'), ('after_deinstall', 'After deinstallation')], max_length=20, verbose_name='Kind')),
+                ('score', models.FloatField(blank=True, help_text="Standard deviations above the meter's mean daily consumption, where applicable.", null=True, verbose_name='Score')),
+                ('resolved', models.BooleanField(default=False, verbose_name='Resolved')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Last Updated')),
+                ('reading', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='plausibility_flags', to='meters.meterreading', verbose_name='Meter Reading')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['resolved', 'created_at'], name='plausibility_open_idx')],
+                'constraints': [models.UniqueConstraint(fields=('reading', 'kind'), name='unique_plausibility_flag')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-18 12:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meters', '0010_plausibility_flags'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='unit',
+            name='tenant',
+            field=models.ForeignKey(blank=True, help_text='The contact billed for the costs allocated to this unit.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='units', to=settings.AUTH_USER_MODEL, verbose_name='Tenant'),
+        ),
+    ]
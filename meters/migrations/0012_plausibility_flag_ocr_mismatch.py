@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 12:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meters', '0011_unit_tenant'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='plausibilityflag',
+            name='kind',
+            field=models.CharField(choices=[('decrease', 'Decreasing value'), ('spike', 'Abnormal jump'), ('after_deinstall', 'After deinstallation'), ('ocr_mismatch', 'Differs from the photo')], max_length=20, verbose_name='Kind'),
+        ),
+    ]
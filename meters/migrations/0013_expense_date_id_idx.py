@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-18 13:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meters', '0012_plausibility_flag_ocr_mismatch'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['invoice_date', 'id'], name='expense_date_id_idx'),
+        ),
+    ]
@@ -3,10 +3,14 @@ from django.utils.translation import gettext_lazy as _
 from datetime import date
 from django.core.exceptions import ValidationError
 from django.conf import settings  # Import user model
+from .trees import MaterializedPathMixin
+from .thumbnails import content_hash
 
 
-class Unit(models.Model):
+class Unit(MaterializedPathMixin):
     """Represents a location in the building, such as rooms or units."""
+    tree_parent_field = "parent_unit"
+
     name = models.CharField(max_length=100, verbose_name=_("Unit Name"))
     location = models.CharField(max_length=200, verbose_name=_("Location (e.g., Floor 3, Building A)"))
     description = models.TextField(blank=True, null=True, verbose_name=_("Description"))
@@ -20,6 +24,15 @@ class Unit(models.Model):
         verbose_name=_("Parent Unit"),
         help_text=_("The main unit this unit belongs to, if applicable.")
     )
+    tenant = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="units",
+        verbose_name=_("Tenant"),
+        help_text=_("The contact billed for the costs allocated to this unit."),
+    )
 
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Last Updated"))
@@ -40,8 +53,10 @@ class ConsumptionType(models.Model):
         return f"{self.name} ({self.unit})"
 
 
-class Meter(models.Model):
+class Meter(MaterializedPathMixin):
     """Represents a physical utility meter connected to a specific consumption type and building unit."""
+    tree_parent_field = "parent_meter"
+
     label = models.CharField(max_length=100, unique=True, verbose_name=_("Display Name"))
     serial_number = models.CharField(max_length=100, unique=True, verbose_name=_("Serial Number"))
     consumption_type = models.ForeignKey(
@@ -94,6 +109,15 @@ class ConversionFactor(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Last Updated"))
 
+    class Meta:
+        indexes = [
+            # "Which factor is valid on date D for (A, B)?"
+            models.Index(
+                fields=["from_consumption_type", "to_consumption_type", "start_date", "end_date"],
+                name="conversion_pair_validity_idx",
+            ),
+        ]
+
     def clean(self):
         """Ensure valid date range and prevent self-conversion."""
         if self.from_consumption_type == self.to_consumption_type:
@@ -118,12 +142,44 @@ class MeterReading(models.Model):
     value = models.FloatField(verbose_name=_("Meter Reading Value"))
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, verbose_name=_("Read By"))
     photo = models.ImageField(upload_to="meter_readings/", blank=True, null=True, verbose_name=_("Reading Photo"))
+    photo_hash = models.CharField(
+        max_length=64, blank=True, default="", editable=False, db_index=True, verbose_name=_("Photo Content Hash"),
+        help_text=_("SHA-256 of the photo; names its cached thumbnails."),
+    )
 
     is_estimated = models.BooleanField(default=False, verbose_name=_("Estimated Reading"), help_text=_("Mark as estimated if the reading was not actually taken."))
 
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Last Updated"))
 
+    class Meta:
+        constraints = [
+            # Also serves as the (meter, reading_date) index for per-meter range queries.
+            models.UniqueConstraint(fields=["meter", "reading_date"], name="unique_reading_per_meter_date"),
+        ]
+        indexes = [
+            # Latest reading(s) per meter.
+            models.Index(fields=["meter", "-reading_date"], name="reading_meter_latest_idx"),
+            # Keyset pagination of the reading list on (reading_date, id).
+            models.Index(fields=["reading_date", "id"], name="reading_date_id_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The monthly roll-ups of the old meter and date must be refreshed when they change.
+        instance._loaded_meter_id = instance.__dict__.get("meter_id")
+        instance._loaded_reading_date = instance.__dict__.get("reading_date")
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Record the content hash of a newly uploaded photo."""
+        if not self.photo:
+            self.photo_hash = ""
+        elif not getattr(self.photo, "_committed", True):
+            self.photo_hash = content_hash(self.photo)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         estimate_label = " (Estimated)" if self.is_estimated else ""
         return f"Reading {self.value} for {self.meter.label} on {self.reading_date}{estimate_label}"
@@ -207,6 +263,13 @@ class Expense(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Last Updated"))
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["meter", "invoice_date"], name="expense_meter_invoice_idx"),
+            # Keyset pagination of the expense list on (invoice_date, id).
+            models.Index(fields=["invoice_date", "id"], name="expense_date_id_idx"),
+        ]
+
     @property
     def consumption(self):
         """Calculate the consumption in the billing period based on real readings."""
@@ -241,3 +304,180 @@ class Expense(models.Model):
 
     def __str__(self):
         return f"Invoice {self.invoice_number} - {self.supplier} ({self.invoice_date})"
+
+
+class BillingRun(models.Model):
+    """
+    Allocation of every expense invoiced in a period across the units it serves.
+    Re-running the same period reuses the run and only recomputes expenses whose inputs changed.
+    """
+    STATUS_CHOICES = [
+        ("pending", _("Pending")),
+        ("running", _("Running")),
+        ("completed", _("Completed")),
+        ("failed", _("Failed")),
+    ]
+
+    period_start = models.DateField(verbose_name=_("Period Start"))
+    period_end = models.DateField(verbose_name=_("Period End"))
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending", verbose_name=_("Status"))
+    warnings = models.JSONField(default=list, blank=True, verbose_name=_("Warnings"))
+    completed_at = models.DateTimeField(blank=True, null=True, verbose_name=_("Completed At"))
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Last Updated"))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["period_start", "period_end"], name="unique_billing_run_period"),
+        ]
+
+    def __str__(self):
+        return f"Billing run {self.period_start} – {self.period_end} ({self.get_status_display()})"
+
+
+class CostAllocation(models.Model):
+    """
+    The share of one expense allocated to one unit in a billing run.
+    Rows are immutable: when an input changes, the rows of that expense are replaced, never edited.
+    """
+    billing_run = models.ForeignKey(
+        BillingRun, on_delete=models.CASCADE, related_name="allocations", verbose_name=_("Billing Run")
+    )
+    expense = models.ForeignKey(
+        Expense, on_delete=models.CASCADE, related_name="allocations", verbose_name=_("Expense")
+    )
+    unit = models.ForeignKey(Unit, on_delete=models.CASCADE, related_name="cost_allocations", verbose_name=_("Unit"))
+
+    size_share = models.FloatField(verbose_name=_("Share of Size"))
+    consumption = models.FloatField(
+        verbose_name=_("Consumption"), help_text=_("Sub-meter consumption converted to the billed meter's unit.")
+    )
+    consumption_share = models.FloatField(verbose_name=_("Share of Consumption"))
+    fixed_costs = models.DecimalField(max_digits=12, decimal_places=2, verbose_name=_("Fixed Costs (€)"))
+    variable_costs = models.DecimalField(max_digits=12, decimal_places=2, verbose_name=_("Variable Costs (€)"))
+    vat = models.DecimalField(max_digits=12, decimal_places=2, verbose_name=_("VAT (€)"))
+    total_cost = models.DecimalField(max_digits=12, decimal_places=2, verbose_name=_("Total Amount (€)"))
+    input_fingerprint = models.CharField(
+        max_length=64, verbose_name=_("Input Fingerprint"),
+        help_text=_("Hash of every input used for this expense; unchanged inputs are not recomputed."),
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["billing_run", "expense", "unit"], name="unique_allocation_per_unit"),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Allocation rows are written once and never updated."""
+        if not self._state.adding:
+            raise ValueError(_("Cost allocations are immutable."))
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.total_cost} € of invoice #{self.expense_id} for unit #{self.unit_id}"
+
+
+class OCRJob(models.Model):
+    """
+    Background OCR of a meter reading photo. Jobs are queued when a photo is uploaded and
+    processed by the `process_ocr_jobs` worker, which stores the recognized value and the
+    capture date from EXIF as suggestions (and applies them when asked to).
+    """
+    STATUS_CHOICES = [
+        ("pending", _("Pending")),
+        ("processing", _("Processing")),
+        ("done", _("Done")),
+        ("failed", _("Failed")),
+    ]
+
+    reading = models.ForeignKey(
+        MeterReading, on_delete=models.CASCADE, related_name="ocr_jobs", verbose_name=_("Meter Reading")
+    )
+    photo_name = models.CharField(max_length=255, verbose_name=_("Photo"))
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending", verbose_name=_("Status"))
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name=_("Attempts"))
+
+    suggested_value = models.FloatField(blank=True, null=True, verbose_name=_("Suggested Value"))
+    suggested_date = models.DateField(blank=True, null=True, verbose_name=_("Suggested Reading Date"))
+    raw_text = models.TextField(blank=True, default="", verbose_name=_("Recognized Text"))
+    error = models.TextField(blank=True, default="", verbose_name=_("Error"))
+    applied = models.BooleanField(default=False, verbose_name=_("Applied to Reading"))
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Last Updated"))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["reading", "photo_name"], name="unique_ocr_job_per_photo"),
+        ]
+        indexes = [
+            models.Index(fields=["status", "updated_at"], name="ocr_job_queue_idx"),
+        ]
+
+    def __str__(self):
+        return f"OCR of {self.photo_name} ({self.get_status_display()})"
+
+
+class MonthlyConsumption(models.Model):
+    """
+    Consumption of one meter in one calendar month, interpolated from its readings.
+    Kept up to date from the readings by `meters.monthly`; never edited by hand.
+    """
+    meter = models.ForeignKey(
+        Meter, on_delete=models.CASCADE, related_name="monthly_consumption", verbose_name=_("Meter")
+    )
+    month = models.DateField(verbose_name=_("Month"), help_text=_("First day of the month."))
+    consumption = models.FloatField(verbose_name=_("Consumption"))
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Last Updated"))
+
+    class Meta:
+        constraints = [
+            # Also serves as the (meter, month) index for one meter's history.
+            models.UniqueConstraint(fields=["meter", "month"], name="unique_monthly_consumption"),
+        ]
+        indexes = [
+            # Reports over all meters for a range of months.
+            models.Index(fields=["month", "meter"], name="monthly_month_meter_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.consumption} for meter #{self.meter_id} in {self.month:%Y-%m}"
+
+
+class PlausibilityFlag(models.Model):
+    """A reading that looks wrong against its meter's history, raised by `meters.plausibility`."""
+    KIND_CHOICES = [
+        ("decrease", _("Decreasing value")),
+        ("spike", _("Abnormal jump")),
+        ("after_deinstall", _("After deinstallation")),
+        ("ocr_mismatch", _("Differs from the photo")),
+    ]
+
+    reading = models.ForeignKey(
+        MeterReading, on_delete=models.CASCADE, related_name="plausibility_flags", verbose_name=_("Meter Reading")
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name=_("Kind"))
+    score = models.FloatField(
+        blank=True, null=True, verbose_name=_("Score"),
+        help_text=_("Standard deviations above the meter's mean daily consumption, where applicable."),
+    )
+    resolved = models.BooleanField(default=False, verbose_name=_("Resolved"))
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Created At"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Last Updated"))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["reading", "kind"], name="unique_plausibility_flag"),
+        ]
+        indexes = [
+            models.Index(fields=["resolved", "created_at"], name="plausibility_open_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} on reading #{self.reading_id}"
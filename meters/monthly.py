@@ -0,0 +1,127 @@
+"""
+Maintenance and queries of the `MonthlyConsumption` roll-up table.
+
+Monthly consumption is interpolated between readings, so a reading only influences the months
+from the previous reading of its meter to the next one. `refresh()` takes the changed
+`(meter, date)` pairs, loads those meters' series with one query and rewrites only the
+affected months: one upsert for the months that have data and one delete for the months that
+no longer do. `rebuild()` recomputes whole meters and backs the backfill command.
+"""
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Q
+
+from .consumption import load_series
+from .models import MonthlyConsumption
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def months_between(first, last):
+    """The first days of every month from the one containing `first` to the one containing `last`."""
+    month = month_start(first)
+    while month <= last:
+        yield month
+        month = next_month(month)
+
+
+def affected_range(ordinals, day):
+    """The days whose interpolated values depend on a reading at `day`: from the previous reading to the next."""
+    ordinal = day.toordinal()
+    before, after = bisect_left(ordinals, ordinal), bisect_right(ordinals, ordinal)
+    first = ordinals[before - 1] if before > 0 else ordinal
+    last = ordinals[after] if after < len(ordinals) else ordinal
+    return date.fromordinal(int(first)), date.fromordinal(int(last))
+
+
+def _covers(series, month):
+    return len(series) and month <= series.last_day and next_month(month) > series.first_day
+
+
+def _write(meter_months, series):
+    """Upsert the months that have readings around them and delete the others."""
+    rows, stale = [], defaultdict(list)
+    for meter_id, months in meter_months.items():
+        meter_series = series[meter_id]
+        for month in sorted(months):
+            if _covers(meter_series, month):
+                rows.append(MonthlyConsumption(
+                    meter_id=meter_id, month=month, consumption=meter_series.consumption(month, next_month(month))
+                ))
+            else:
+                stale[meter_id].append(month)
+
+    with transaction.atomic(savepoint=False):
+        if rows:
+            MonthlyConsumption.objects.bulk_create(
+                rows, batch_size=1000, update_conflicts=True,
+                unique_fields=["meter", "month"], update_fields=["consumption", "updated_at"],
+            )
+        if stale:
+            MonthlyConsumption.objects.filter(
+                reduce(or_, (Q(meter_id=meter_id, month__in=months) for meter_id, months in stale.items()))
+            ).delete()
+    return len(rows)
+
+
+def refresh(changes):
+    """
+    Recompute the months affected by readings added, changed or removed at the given dates.
+    `changes` maps meter ids to dates (for an edited reading, both its old and new date).
+    Meters that no longer exist are skipped; their rows went with them.
+    """
+    changes = {meter_id: set(days) for meter_id, days in changes.items() if days}
+    if not changes:
+        return 0
+    series = load_series(list(changes), chain_replacements=False)
+    meter_months = {}
+    for meter_id, days in changes.items():
+        if meter_id not in series:
+            continue
+        ordinals = list(series[meter_id].days)
+        months = meter_months[meter_id] = set()
+        for day in days:
+            months.update(months_between(*affected_range(ordinals, day)))
+    return _write(meter_months, series)
+
+
+def rebuild(meter_ids):
+    """Recompute every month of the given meters, dropping months outside their readings."""
+    series = load_series(meter_ids, chain_replacements=False)
+    meter_months = defaultdict(set)
+    # Stored months that no longer have readings around them are deleted by _write()
+    for meter_id, month in MonthlyConsumption.objects.filter(meter_id__in=list(series)).values_list("meter_id", "month"):
+        meter_months[meter_id].add(month)
+    for meter_id, meter_series in series.items():
+        if len(meter_series):
+            meter_months[meter_id].update(months_between(meter_series.first_day, meter_series.last_day))
+    return _write(meter_months, series)
+
+
+def year_over_year(years, meters=None):
+    """
+    `{meter_id: {month_number: {year: consumption}}}` for the given years, from one query over the
+    (month, meter) index.
+    """
+    years = sorted(years)
+    queryset = MonthlyConsumption.objects.filter(
+        month__gte=date(years[0], 1, 1), month__lt=date(years[-1] + 1, 1, 1)
+    )
+    if meters is not None:
+        queryset = queryset.filter(meter_id__in=meters)
+    report = defaultdict(lambda: defaultdict(dict))
+    for meter_id, month, consumption in queryset.values_list("meter_id", "month", "consumption"):
+        if month.year in years:
+            report[meter_id][month.month][month.year] = consumption
+    return report
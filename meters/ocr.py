@@ -0,0 +1,185 @@
+"""
+OCR of meter reading photos.
+
+`recognize()` is a pure function of an image (path or bytes) so it can run in a process
+pool: it preprocesses the photo with Pillow, reads the digit display with Tesseract and
+the capture date from EXIF. The queue side claims jobs from the `OCRJob` table in batches
+and writes the results back from the parent process.
+
+A job is tried at most `MAX_ATTEMPTS` times, including attempts whose worker died: failed
+attempts wait `RETRY_DELAY` (doubled after every attempt) before the job is claimed again.
+What the user typed wins over the photo. A recognized value that differs from the reading's
+value is only written when asked to and when it fits between the meter's neighbouring
+readings while the typed value does not; every other mismatch, and any mismatching capture
+date, raises an `ocr_mismatch` plausibility flag for review.
+"""
+import io
+import re
+from datetime import datetime, timedelta
+
+import exifread
+import pytesseract
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from PIL import Image, ImageFilter, ImageOps
+
+from .models import MeterReading, OCRJob, PlausibilityFlag
+
+TESSERACT_CONFIG = "--psm 7 -c tessedit_char_whitelist=0123456789.,"
+NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)?")
+EXIF_DATE_TAGS = ("EXIF DateTimeOriginal", "EXIF DateTimeDigitized", "Image DateTime")
+MIN_WIDTH = 1000
+MAX_ATTEMPTS = 3
+STALE_AFTER = timedelta(minutes=10)
+RETRY_DELAY = timedelta(minutes=1)
+# Recognized and typed values closer than this agree (the display's last digit may be cut off)
+VALUE_TOLERANCE = 1.0
+
+
+def preprocess(image):
+    """Upright, grayscale, contrast-stretched and binarized copy of a phone photo of a display."""
+    image = ImageOps.exif_transpose(image).convert("L")
+    if image.width < MIN_WIDTH:
+        scale = MIN_WIDTH / image.width
+        image = image.resize((MIN_WIDTH, round(image.height * scale)), Image.LANCZOS)
+    image = ImageOps.autocontrast(image, cutoff=2).filter(ImageFilter.MedianFilter(3))
+    return image.point(lambda value: 255 if value > 128 else 0)
+
+
+def parse_value(text):
+    """The longest number in the OCR output, with a decimal comma accepted."""
+    matches = NUMBER_PATTERN.findall(text)
+    if not matches:
+        return None
+    return float(max(matches, key=len).replace(",", "."))
+
+
+def capture_date(source):
+    """The date the photo was taken, from EXIF, or None."""
+    tags = exifread.process_file(source, details=False)
+    for tag in EXIF_DATE_TAGS:
+        if tag in tags:
+            try:
+                return datetime.strptime(str(tags[tag]), "%Y:%m:%d %H:%M:%S").date()
+            except ValueError:
+                continue
+    return None
+
+
+def recognize(photo):
+    """
+    OCR one photo given as a filesystem path or raw bytes.
+    Returns a dict with `value`, `date`, `text` and `error`; never raises.
+    """
+    try:
+        if isinstance(photo, bytes):
+            data = photo
+        else:
+            with open(photo, "rb") as handle:
+                data = handle.read()
+        with Image.open(io.BytesIO(data)) as image:
+            text = pytesseract.image_to_string(preprocess(image), config=TESSERACT_CONFIG).strip()
+        return {"value": parse_value(text), "date": capture_date(io.BytesIO(data)), "text": text, "error": ""}
+    except Exception as exc:  # Reported on the job; one bad photo must not stop the worker
+        return {"value": None, "date": None, "text": "", "error": f"{type(exc).__name__}: {exc}"}
+
+
+def enqueue(reading):
+    """Queue OCR for the reading's current photo (no-op if it was already queued)."""
+    if reading.photo:
+        OCRJob.objects.get_or_create(reading=reading, photo_name=reading.photo.name)
+
+
+def retry_delay(attempts):
+    """How long a job waits after its `attempts`-th failed attempt."""
+    return RETRY_DELAY * 2 ** (attempts - 1)
+
+
+def claim_jobs(limit):
+    """
+    Atomically mark up to `limit` due pending (or abandoned) jobs as processing and return them.
+    Abandoned jobs that used up their attempts fail instead. Uses SKIP LOCKED where supported
+    so several workers can share the queue.
+    """
+    now = timezone.now()
+    stale = Q(status="processing", updated_at__lt=now - STALE_AFTER)
+    OCRJob.objects.filter(stale, attempts__gte=MAX_ATTEMPTS).update(
+        status="failed", error="The worker stopped while processing this photo.", updated_at=now
+    )
+    claimable = Q(status="pending", attempts=0) | (stale & Q(attempts__lt=MAX_ATTEMPTS))
+    for attempts in range(1, MAX_ATTEMPTS):
+        claimable |= Q(status="pending", attempts=attempts, updated_at__lt=now - retry_delay(attempts))
+    with transaction.atomic():
+        queryset = OCRJob.objects.filter(claimable).order_by("created_at")
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        ids = list(queryset.values_list("id", flat=True)[:limit])
+        OCRJob.objects.filter(id__in=ids).update(
+            status="processing", attempts=F("attempts") + 1, updated_at=timezone.now()
+        )
+    return list(OCRJob.objects.filter(id__in=ids).select_related("reading"))
+
+
+def photo_source(job):
+    """A path for local storage, otherwise the file's bytes (remote storages have no path)."""
+    storage = job.reading.photo.storage
+    try:
+        return storage.path(job.photo_name)
+    except NotImplementedError:
+        with storage.open(job.photo_name, "rb") as handle:
+            return handle.read()
+
+
+def fits_neighbours(reading, value):
+    """Whether `value` lies between the values of the meter's readings before and after `reading`."""
+    others = MeterReading.objects.filter(meter_id=reading.meter_id).exclude(pk=reading.pk)
+    before = others.filter(reading_date__lt=reading.reading_date).order_by("-reading_date")
+    after = others.filter(reading_date__gt=reading.reading_date).order_by("reading_date")
+    previous = before.values_list("value", flat=True).first()
+    following = after.values_list("value", flat=True).first()
+    return (previous is None or previous <= value) and (following is None or value <= following)
+
+
+def apply_suggestion(job, apply=False):
+    """
+    Compare the recognized value and capture date with the reading. With `apply`, replace a
+    typed value that does not fit the meter's history by a recognized one that does; flag any
+    other mismatch for review. Returns whether the reading was changed.
+    """
+    reading = job.reading
+    value_differs = job.suggested_value is not None and abs(job.suggested_value - reading.value) > VALUE_TOLERANCE
+    date_differs = job.suggested_date is not None and job.suggested_date != reading.reading_date
+    if value_differs and apply and not date_differs and not fits_neighbours(reading, reading.value) \
+            and fits_neighbours(reading, job.suggested_value):
+        reading.value = job.suggested_value
+        reading.save(update_fields=["value", "updated_at"])
+        return True
+    if value_differs or date_differs:
+        PlausibilityFlag.objects.get_or_create(reading=reading, kind="ocr_mismatch")
+    return False
+
+
+def store_result(job, result, apply=False):
+    job.suggested_value, job.suggested_date = result["value"], result["date"]
+    job.raw_text, job.error = result["text"], result["error"]
+    if result["error"]:
+        job.status = "failed" if job.attempts >= MAX_ATTEMPTS else "pending"
+    else:
+        job.status = "done"
+        job.applied = apply_suggestion(job, apply)
+    job.save()
+
+
+def process_jobs(executor, limit, apply=False):
+    """Claim a batch of jobs, OCR them on `executor` and store the results. Returns the batch size."""
+    jobs = claim_jobs(limit)
+    futures = {}
+    for job in jobs:
+        try:
+            futures[job] = executor.submit(recognize, photo_source(job))
+        except Exception as exc:
+            store_result(job, {"value": None, "date": None, "text": "", "error": f"{type(exc).__name__}: {exc}"})
+    for job, future in futures.items():
+        store_result(job, future.result(), apply=apply)
+    return len(jobs)
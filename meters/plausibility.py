@@ -0,0 +1,266 @@
+"""
+Plausibility checks of meter readings.
+
+Every interval between two consecutive readings of a meter has a daily rate: the increase
+divided by the days in between, with a drop from near the counter's capacity to near zero
+counted as a rollover and any other decrease as no consumption (see
+`consumption.interval_delta`). A reading is flagged when
+
+* `decrease`: its value is below the previous one, and either the drop does not look like a
+  rollover or the rollover-corrected rate is not a normal rate for the meter (so a genuine
+  rollover passes, a correction or a lost digit does not);
+* `spike`: its rate is more than `Z_THRESHOLD` standard deviations and `SPIKE_RATIO` times
+  above the mean of all earlier rates of the meter (after `MIN_HISTORY` intervals);
+* `after_deinstall`: it is dated after the meter's deinstallation.
+
+New readings are scored in a streaming pass: each meter's running statistics (last reading,
+count, and the sum and sum of squares of the rates shifted by the meter's first rate) are kept
+as a small tuple in Django's cache without a timeout, so scoring a monthly reading does not
+reload the history; only an evicted entry is rebuilt from the table. `scan()` rescans the whole
+table with the same rules and the same shifted sums in one vectorized NumPy pass, so both
+agree up to floating-point rounding.
+"""
+import math
+from collections import defaultdict
+from dataclasses import astuple, dataclass
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .consumption import interval_delta, is_rollover, np, rollover_capacities, rollover_mask
+from .models import Meter, MeterReading, PlausibilityFlag
+
+STATS_KEY = "meters:plausibility:v2:{meter_id}"
+# Readings arrive about monthly; statistics that expired in between would be replayed every time
+STATS_TIMEOUT = None
+MIN_HISTORY = 4
+Z_THRESHOLD = 4.0
+SPIKE_RATIO = 3.0
+
+
+def interval_rate(previous_value, value, days):
+    """
+    Daily rate between two readings and how the value went down: `(rate, decrease)` with
+    `decrease` None, "rollover" or "correction" (any decrease that does not look like a rollover).
+    """
+    decrease = None
+    if value < previous_value:
+        decrease = "rollover" if is_rollover(previous_value, value) else "correction"
+    return interval_delta(previous_value, value) / days, decrease
+
+
+def shifted_std(count, total, squares):
+    """Sample standard deviation from the count, sum and sum of squares of shifted values."""
+    return math.sqrt(max((squares - total * total / count) / (count - 1), 0.0))
+
+
+def is_abnormal(rate, count, mean, std):
+    if count < MIN_HISTORY or rate <= SPIKE_RATIO * mean:
+        return False, None
+    z = (rate - mean) / std if std > 0 else math.inf
+    return z > Z_THRESHOLD, z
+
+
+@dataclass
+class RollingStats:
+    """Running statistics of one meter's daily rates, up to and including its last reading."""
+    last_day: int = None
+    last_value: float = None
+    count: int = 0
+    shift: float = 0.0
+    total: float = 0.0
+    squares: float = 0.0
+
+    @property
+    def mean(self):
+        return self.shift + self.total / self.count if self.count else 0.0
+
+    @property
+    def std(self):
+        return shifted_std(self.count, self.total, self.squares) if self.count > 1 else 0.0
+
+    def assess(self, day, value, deinstall_day=None):
+        """Flags `[(kind, score)]` for a reading that follows the last one, then add it to the statistics."""
+        flags = []
+        if deinstall_day is not None and day > deinstall_day:
+            flags.append(("after_deinstall", None))
+        if self.last_day is not None:
+            rate, decrease = interval_rate(self.last_value, value, day - self.last_day)
+            abnormal, z = is_abnormal(rate, self.count, self.mean, self.std)
+            if decrease == "correction" or (decrease and (abnormal or self.count < MIN_HISTORY)):
+                flags.append(("decrease", z))
+            elif abnormal and not decrease:
+                flags.append(("spike", z))
+            if not self.count:
+                self.shift = rate
+            self.count += 1
+            self.total += rate - self.shift
+            self.squares += (rate - self.shift) ** 2
+        self.last_day, self.last_value = day, value
+        return flags
+
+
+def _stats_key(meter_id):
+    return STATS_KEY.format(meter_id=meter_id)
+
+
+def forget(meter_id):
+    """Drop a meter's cached statistics, e.g. after one of its older readings changed."""
+    cache.delete(_stats_key(meter_id))
+
+
+def check_readings(readings):
+    """
+    Score newly saved readings and store their flags; returns the created `PlausibilityFlag`s.
+
+    Readings newer than everything a meter's cached statistics have seen are scored from the
+    cache alone. For meters without cached statistics, or with a reading older than the cached
+    last one, the history is replayed from the database (one query for all of them).
+    """
+    by_meter = defaultdict(list)
+    for reading in readings:
+        by_meter[reading.meter_id].append(reading)
+    if not by_meter:
+        return []
+    meters = Meter.objects.filter(pk__in=list(by_meter)).values_list("id", "deinstall_date")
+    deinstall_days = {meter_id: day.toordinal() if day else None for meter_id, day in meters}
+    cached = cache.get_many([_stats_key(meter_id) for meter_id in by_meter])
+
+    stats, replay = {}, []
+    for meter_id, new_readings in by_meter.items():
+        new_readings.sort(key=lambda reading: reading.reading_date)
+        values = cached.get(_stats_key(meter_id))
+        if values is not None and new_readings[0].reading_date.toordinal() > values[0]:
+            stats[meter_id] = RollingStats(*values)
+        else:
+            replay.append(meter_id)
+
+    flags = []
+    for meter_id in stats:
+        for reading in by_meter[meter_id]:
+            found = stats[meter_id].assess(reading.reading_date.toordinal(), reading.value, deinstall_days[meter_id])
+            flags.extend(PlausibilityFlag(reading=reading, kind=kind, score=score) for kind, score in found)
+
+    if replay:
+        new_ids = {reading.pk: reading for meter_id in replay for reading in by_meter[meter_id]}
+        history = (
+            MeterReading.objects.filter(meter_id__in=replay)
+            .order_by("meter_id", "reading_date", "id")
+            .values_list("id", "meter_id", "reading_date", "value")
+        )
+        for reading_id, meter_id, reading_date, value in history.iterator(chunk_size=10000):
+            meter_stats = stats.setdefault(meter_id, RollingStats())
+            found = meter_stats.assess(reading_date.toordinal(), value, deinstall_days[meter_id])
+            if reading_id in new_ids:
+                reading = new_ids[reading_id]
+                flags.extend(PlausibilityFlag(reading=reading, kind=kind, score=score) for kind, score in found)
+
+    # Only committed readings may advance the statistics, or a rollback would leave them ahead of the table
+    values = {_stats_key(meter_id): astuple(meter_stats) for meter_id, meter_stats in stats.items()}
+    transaction.on_commit(lambda: cache.set_many(values, STATS_TIMEOUT))
+    return PlausibilityFlag.objects.bulk_create(flags, ignore_conflicts=True)
+
+
+def recheck_reading(reading):
+    """Re-score an edited reading against its meter's full history."""
+    forget(reading.meter_id)
+    PlausibilityFlag.objects.filter(reading=reading, resolved=False).delete()
+    return check_readings([reading])
+
+
+def _scan_python(rows, deinstall_days):
+    stats, findings = {}, []
+    for reading_id, meter_id, reading_date, value in rows:
+        found = stats.setdefault(meter_id, RollingStats()).assess(
+            reading_date.toordinal(), value, deinstall_days.get(meter_id)
+        )
+        findings.extend((reading_id, meter_id, reading_date, value, kind, score) for kind, score in found)
+    return findings
+
+
+def _scan_numpy(rows, deinstall_days):
+    if not rows:
+        return []
+    ids, meter_ids, dates, values = zip(*rows)
+    meters = np.array(meter_ids, dtype=np.int64)
+    days = np.fromiter((day.toordinal() for day in dates), dtype=np.int64, count=len(rows))
+    value_array = np.array(values, dtype=np.float64)
+
+    # Interval i ends at reading i; the first reading of every meter has none.
+    has_interval = np.zeros(len(rows), dtype=bool)
+    has_interval[1:] = meters[1:] == meters[:-1]
+    previous = np.roll(value_array, 1)
+    delta = value_array - previous
+    decreased = has_interval & (delta < 0)
+    capacity = rollover_capacities(previous)
+    wrapped = decreased & rollover_mask(previous, value_array, capacity)
+    correction = decreased & ~wrapped
+    delta = np.where(wrapped, delta + capacity, np.where(correction, 0.0, delta))
+    rate = delta / np.maximum(days - np.roll(days, 1), 1)
+    rate = np.where(has_interval, rate, 0.0)
+
+    # Statistics of the earlier intervals of the same meter: running sums restarted at every meter,
+    # of the rates shifted by the meter's first rate as in `RollingStats`.
+    meter_start = np.flatnonzero(~has_interval)
+    group = np.cumsum(~has_interval) - 1
+    first = np.minimum(meter_start + 1, len(rows) - 1)
+    shift = np.where(has_interval[first], rate[first], 0.0)[group]
+    shifted = np.where(has_interval, rate - shift, 0.0)
+    counts, sums, squares = (np.cumsum(column) for column in (has_interval.astype(np.float64), shifted, shifted ** 2))
+    base = meter_start[group]
+    prior_count = counts - counts[base] - has_interval
+    prior_sum = sums - sums[base] - shifted
+    prior_squares = squares - squares[base] - shifted ** 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(prior_count > 0, shift + prior_sum / prior_count, 0.0)
+        variance = np.where(
+            prior_count > 1, (prior_squares - prior_sum * prior_sum / prior_count) / (prior_count - 1), 0.0
+        )
+        std = np.sqrt(np.maximum(variance, 0.0))
+        z = np.where(std > 0, (rate - mean) / std, np.inf)
+    abnormal = has_interval & (prior_count >= MIN_HISTORY) & (rate > SPIKE_RATIO * mean) & (z > Z_THRESHOLD)
+    decrease = correction | (wrapped & (abnormal | (prior_count < MIN_HISTORY)))
+    spike = abnormal & ~decreased
+    deinstall = np.array([deinstall_days.get(meter_id) or np.iinfo(np.int64).max for meter_id in meter_ids])
+    after_deinstall = days > deinstall
+
+    findings = []
+    checks = (("after_deinstall", after_deinstall, None), ("decrease", decrease, z), ("spike", spike, z))
+    for kind, mask, scores in checks:
+        for i in np.flatnonzero(mask):
+            score = None
+            if scores is not None and prior_count[i] >= MIN_HISTORY and rate[i] > SPIKE_RATIO * mean[i]:
+                score = float(scores[i])
+            findings.append((ids[i], meter_ids[i], dates[i], values[i], kind, score))
+    findings.sort(key=lambda finding: (finding[1], finding[2], finding[4]))
+    return findings
+
+
+def scan(meters=None, use_numpy=None):
+    """
+    Check every reading (of `meters`, if given) against the history before it.
+    Returns `[(reading_id, meter_id, reading_date, value, kind, score)]`.
+    """
+    use_numpy = np is not None if use_numpy is None else use_numpy
+    meter_qs = Meter.objects.all() if meters is None else Meter.objects.filter(pk__in=meters)
+    deinstall_days = {
+        meter_id: deinstall_date.toordinal()
+        for meter_id, deinstall_date in meter_qs.exclude(deinstall_date=None).values_list("id", "deinstall_date")
+    }
+    rows = MeterReading.objects.order_by("meter_id", "reading_date", "id")
+    if meters is not None:
+        rows = rows.filter(meter_id__in=meters)
+    rows = list(rows.values_list("id", "meter_id", "reading_date", "value").iterator(chunk_size=10000))
+    findings = _scan_numpy(rows, deinstall_days) if use_numpy else _scan_python(rows, deinstall_days)
+    if not use_numpy:
+        findings.sort(key=lambda finding: (finding[1], finding[2], finding[4]))
+    return findings
+
+
+def store_findings(findings, batch_size=2000):
+    """Create flags for `scan()` results; existing flags (resolved or not) are kept."""
+    flags = [
+        PlausibilityFlag(reading_id=reading_id, kind=kind, score=score)
+        for reading_id, _, _, _, kind, score in findings
+    ]
+    return PlausibilityFlag.objects.bulk_create(flags, batch_size=batch_size, ignore_conflicts=True)
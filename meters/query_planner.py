@@ -0,0 +1,110 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+def _model_field(model, source):
+    """Return the model field behind a serializer source, or None for properties/methods."""
+    if model is None or "." in source or source == "*":
+        return None
+    try:
+        return model._meta.get_field(source)
+    except FieldDoesNotExist:
+        return None
+
+
+def collect_related_lookups(serializer, model=None, prefix=""):
+    """
+    Walk a serializer tree and return the (select_related, prefetch_related) lookups it needs.
+
+    Forward foreign keys (nested serializers and related fields that render the related
+    object, e.g. StringRelatedField) become select_related joins. Reverse and many-to-many
+    relations become prefetch lookups, even when they render primary keys only: a
+    ManyRelatedField still calls `.all()` per row. A PrimaryKeyRelatedField on a foreign key
+    reads `<field>_id` and needs nothing.
+    """
+    select, prefetch = [], []
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    model = model or getattr(getattr(serializer, "Meta", None), "model", None)
+
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        model_field = _model_field(model, field.source)
+        if model_field is None or not model_field.is_relation:
+            continue
+        lookup = f"{prefix}{field.source}"
+        many = model_field.many_to_many or model_field.one_to_many
+
+        if isinstance(field, serializers.BaseSerializer):
+            nested_select, nested_prefetch = collect_related_lookups(
+                field, model_field.related_model, prefix=f"{lookup}__"
+            )
+            if many:
+                prefetch.extend([lookup, *nested_select, *nested_prefetch])
+            else:
+                select.extend([lookup, *nested_select])
+                prefetch.extend(nested_prefetch)
+        elif isinstance(field, serializers.ManyRelatedField):
+            prefetch.append(lookup)
+        elif isinstance(field, serializers.RelatedField):
+            if isinstance(field, serializers.PrimaryKeyRelatedField):
+                continue
+            (prefetch if many else select).append(lookup)
+
+    return select, prefetch
+
+
+def collect_only_fields(serializer, model=None, prefix=""):
+    """
+    Return the `.only()` paths covering every model field the serializer reads, or None when
+    a field reads something that cannot be mapped to a column (a property, `source="*"`...).
+
+    Nested serializers contribute `<relation>__<field>` paths. Related fields that render the
+    related object (e.g. StringRelatedField) may read any of its columns, so the related model
+    is left undeferred: naming only the relation loads all of its columns with the join.
+    """
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    model = model or getattr(getattr(serializer, "Meta", None), "model", None)
+    if model is None:
+        return None
+
+    paths = [f"{prefix}{model._meta.pk.name}"]
+    method_sources = getattr(serializer, "method_field_sources", {})
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if name in method_sources:
+            paths.extend(f"{prefix}{source}" for source in method_sources[name])
+            continue
+        model_field = _model_field(model, field.source)
+        if model_field is None:
+            return None
+        if model_field.many_to_many or model_field.one_to_many:
+            continue  # Prefetched with their own query
+        if isinstance(field, serializers.BaseSerializer):
+            nested = collect_only_fields(field, model_field.related_model, prefix=f"{prefix}{field.source}__")
+            if nested is None:
+                return None
+            paths.extend([f"{prefix}{field.source}", *nested])
+        else:
+            paths.append(f"{prefix}{field.source}")
+    return list(dict.fromkeys(paths))
+
+
+def plan_queryset(queryset, serializer, extra_fields=()):
+    """
+    Apply the select_related/prefetch_related lookups required by `serializer` (an instance,
+    so that `?fields=`/`?expand=` are taken into account) and defer every column it does not
+    read. `extra_fields` are kept loaded too, e.g. the fields a paginator orders by.
+    """
+    select, prefetch = collect_related_lookups(serializer)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    only = collect_only_fields(serializer)
+    if only is not None:
+        queryset = queryset.only(*only, *extra_fields)
+    return queryset
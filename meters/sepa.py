@@ -0,0 +1,324 @@
+"""
+SEPA payment files for billing runs: pain.008 direct debits of the costs allocated to each
+tenant, and pain.001 credit transfers paying the suppliers of the run's expenses.
+
+Files are written with an incremental XML writer (`xml.sax.saxutils.XMLGenerator`) and yielded
+in chunks, so a file of 100,000 transactions never exists in memory, as a document tree or
+as text. Transactions are grouped into one payment information block (`PmtInf`) per due date.
+Each block and the group header start with the number and control sum of the transactions
+that follow them, so the transactions are read twice: the first pass only sums them up per
+due date, and the second writes them. Sources are therefore functions returning a fresh
+iterator of `Transaction`s ordered by due date; the database sources stream their rows with
+`QuerySet.iterator()`.
+
+Payers or payees without a bank account are skipped, and so are tenants whose account has
+no mandate. `sepa_transactions()` reports them. The company's own details are checked before
+anything is written, since banks reject a whole file for an invalid IBAN or creditor ID.
+"""
+import io
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal
+from typing import NamedTuple
+from xml.sax.saxutils import XMLGenerator
+
+from django.conf import settings
+from django.db.models import DecimalField, F, FilteredRelation, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from contacts.iban import iban_error, normalize_iban
+from contacts.models import BankAccount, Contact
+
+from .models import Expense
+
+DIRECT_DEBIT = "pain.008.001.08"
+CREDIT_TRANSFER = "pain.001.001.09"
+CENT = Decimal("0.01")
+# The Latin character set every SEPA bank accepts
+DISALLOWED = re.compile(r"[^A-Za-z0-9/\-?:().,'+ ]")
+TRANSLITERATIONS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "Ä": "Ae", "Ö": "Oe", "Ü": "Ue", "ß": "ss"})
+
+
+class SepaError(Exception):
+    pass
+
+
+class Transaction(NamedTuple):
+    end_to_end_id: str
+    due_date: object
+    amount: Decimal
+    name: str
+    iban: str
+    bic: str
+    remittance: str
+    mandate_id: str = ""
+    mandate_signed_on: object = None
+
+
+@dataclass
+class Party:
+    """The company's side of a file: creditor of direct debits, debtor of credit transfers."""
+    name: str
+    iban: str
+    bic: str = ""
+    creditor_id: str = ""
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            name=settings.METERS_SEPA_NAME, iban=normalize_iban(settings.METERS_SEPA_IBAN),
+            bic=settings.METERS_SEPA_BIC, creditor_id=settings.METERS_SEPA_CREDITOR_ID,
+        )
+
+    def validate(self, kind):
+        """Raise `SepaError` for details banks would reject in a file of `kind` (see `METERS_SEPA_*`)."""
+        if not sepa_text(self.name, 70):
+            raise SepaError("The company name is missing.")
+        error = iban_error(self.iban)
+        if error is not None:
+            raise SepaError(f"The company IBAN {self.iban!r} is invalid: {error}")
+        if kind == DIRECT_DEBIT and not self.creditor_id.strip():
+            raise SepaError("Direct debits need a creditor ID.")
+
+
+@dataclass
+class Totals:
+    count: int = 0
+    amount: Decimal = Decimal("0.00")
+    by_due_date: dict = field(default_factory=dict)
+
+    def add(self, transaction):
+        self.count += 1
+        self.amount += transaction.amount
+        count, amount = self.by_due_date.get(transaction.due_date, (0, Decimal("0.00")))
+        self.by_due_date[transaction.due_date] = (count + 1, amount + transaction.amount)
+
+
+def sepa_text(value, max_length):
+    """`value` in the SEPA character set (umlauts transliterated, accents dropped), shortened."""
+    value = unicodedata.normalize("NFKD", str(value).translate(TRANSLITERATIONS))
+    value = DISALLOWED.sub("", value.encode("ascii", "ignore").decode())
+    return " ".join(value.split())[:max_length]
+
+
+def _with_bank_account(queryset, prefix):
+    """Annotate the IBAN, BIC and mandate of the first bank account of the contacts at `prefix`."""
+    first = BankAccount.objects.filter(contact=OuterRef(f"{prefix}pk")).order_by("pk").values("pk")[:1]
+    condition = Q(**{f"{prefix}bank_accounts__pk": Subquery(first)})
+    return queryset.annotate(
+        account=FilteredRelation(f"{prefix}bank_accounts", condition=condition),
+        iban=F("account__iban"),
+        bic=F("account__bic"),
+        mandate_id=F("account__mandate_id"),
+        mandate_signed_on=F("account__mandate_signed_on"),
+    )
+
+
+def debit_rows(run):
+    """Tenants with their total allocated costs in `run` and their first bank account."""
+    queryset = Contact.objects.filter(units__cost_allocations__billing_run=run).annotate(
+        amount=Sum("units__cost_allocations__total_cost", output_field=DecimalField(max_digits=14, decimal_places=2))
+    ).filter(amount__gt=0)
+    return _with_bank_account(queryset, "").order_by("pk")
+
+
+def transfer_rows(run):
+    """The run's expenses with a supplier, with the supplier's first bank account."""
+    queryset = Expense.objects.filter(
+        invoice_date__range=(run.period_start, run.period_end), supplier__isnull=False, total_cost__gt=0
+    ).select_related("supplier")
+    return _with_bank_account(queryset, "supplier__").order_by("invoice_date", "pk")
+
+
+def sepa_transactions(kind, run, due_date=None, payment_days=30, skipped=None):
+    """
+    A function returning the transactions of `run` for a file of `kind`, ordered by due date.
+    Direct debits are all due on `due_date`; supplier invoices `payment_days` after their
+    invoice date. Skipped payers or payees are added to the list `skipped` with the reason.
+    """
+    def transactions():
+        if skipped is not None:
+            skipped.clear()
+        if kind == DIRECT_DEBIT:
+            for contact in debit_rows(run).iterator(chunk_size=2000):
+                if not contact.iban or not contact.mandate_id or not contact.mandate_signed_on:
+                    if skipped is not None:
+                        skipped.append((contact, "no bank account" if not contact.iban else "no mandate"))
+                    continue
+                yield Transaction(
+                    end_to_end_id=f"RUN{run.pk}-C{contact.pk}", due_date=due_date, amount=contact.amount,
+                    name=contact.company_name or contact.get_full_name() or contact.username, iban=contact.iban,
+                    bic=contact.bic or "", remittance=f"Costs {run.period_start} - {run.period_end}",
+                    mandate_id=contact.mandate_id, mandate_signed_on=contact.mandate_signed_on,
+                )
+        else:
+            for expense in transfer_rows(run).iterator(chunk_size=2000):
+                if not expense.iban:
+                    if skipped is not None:
+                        skipped.append((expense, "no bank account"))
+                    continue
+                supplier = expense.supplier
+                yield Transaction(
+                    end_to_end_id=f"RUN{run.pk}-E{expense.pk}", due_date=expense.invoice_date + timedelta(days=payment_days),
+                    amount=expense.total_cost,
+                    name=supplier.company_name or supplier.get_full_name() or supplier.username,
+                    iban=expense.iban, bic=expense.bic or "", remittance=f"Invoice {expense.invoice_number}",
+                )
+    return transactions
+
+
+class PainWriter:
+    """Writes one pain.008 or pain.001 document element by element."""
+
+    def __init__(self, out, kind):
+        self.xml = XMLGenerator(out, encoding="utf-8", short_empty_elements=True)
+        self.kind = kind
+
+    def start(self, name, attrs=None):
+        self.xml.startElement(name, attrs or {})
+
+    def end(self, name):
+        self.xml.endElement(name)
+
+    def element(self, name, text, attrs=None):
+        self.xml.startElement(name, attrs or {})
+        self.xml.characters(str(text))
+        self.xml.endElement(name)
+
+    def path(self, names, text):
+        """`<A><B><C>text</C></B></A>` for `names` A, B, C."""
+        for name in names[:-1]:
+            self.start(name)
+        self.element(names[-1], text)
+        for name in reversed(names[:-1]):
+            self.end(name)
+
+    def agent(self, name, bic):
+        if bic:
+            self.path([name, "FinInstnId", "BICFI"], bic)
+        else:
+            self.path([name, "FinInstnId", "Othr", "Id"], "NOTPROVIDED")
+
+    def amount(self, name, value):
+        self.element(name, value.quantize(CENT), {"Ccy": "EUR"})
+
+    def begin_document(self, message_id, created_at, totals, party):
+        self.xml.startDocument()
+        self.start("Document", {"xmlns": f"urn:iso:std:iso:20022:tech:xsd:{self.kind}"})
+        self.start("CstmrDrctDbtInitn" if self.kind == DIRECT_DEBIT else "CstmrCdtTrfInitn")
+        self.start("GrpHdr")
+        self.element("MsgId", message_id)
+        self.element("CreDtTm", created_at.replace(microsecond=0).isoformat())
+        self.element("NbOfTxs", totals.count)
+        self.element("CtrlSum", totals.amount.quantize(CENT))
+        self.path(["InitgPty", "Nm"], sepa_text(party.name, 70))
+        self.end("GrpHdr")
+
+    def begin_payment(self, payment_id, due_date, count, amount, party):
+        debit = self.kind == DIRECT_DEBIT
+        self.start("PmtInf")
+        self.element("PmtInfId", payment_id)
+        self.element("PmtMtd", "DD" if debit else "TRF")
+        self.element("BtchBookg", "true")
+        self.element("NbOfTxs", count)
+        self.element("CtrlSum", amount.quantize(CENT))
+        self.start("PmtTpInf")
+        self.path(["SvcLvl", "Cd"], "SEPA")
+        if debit:
+            self.path(["LclInstrm", "Cd"], "CORE")
+            self.element("SeqTp", "RCUR")
+        self.end("PmtTpInf")
+        if debit:
+            self.element("ReqdColltnDt", due_date.isoformat())
+        else:
+            self.path(["ReqdExctnDt", "Dt"], due_date.isoformat())
+        role = "Cdtr" if debit else "Dbtr"
+        self.path([role, "Nm"], sepa_text(party.name, 70))
+        self.path([f"{role}Acct", "Id", "IBAN"], party.iban)
+        self.agent(f"{role}Agt", party.bic)
+        self.element("ChrgBr", "SLEV")
+        if debit:
+            self.path(["CdtrSchmeId", "Id", "PrvtId", "Othr", "Id"], party.creditor_id)
+
+    def transaction(self, transaction):
+        if self.kind == DIRECT_DEBIT:
+            self.start("DrctDbtTxInf")
+            self.path(["PmtId", "EndToEndId"], sepa_text(transaction.end_to_end_id, 35))
+            self.amount("InstdAmt", transaction.amount)
+            self.start("DrctDbtTx")
+            self.start("MndtRltdInf")
+            self.element("MndtId", transaction.mandate_id)
+            self.element("DtOfSgntr", transaction.mandate_signed_on.isoformat())
+            self.end("MndtRltdInf")
+            self.end("DrctDbtTx")
+            self.agent("DbtrAgt", transaction.bic)
+            role = "Dbtr"
+        else:
+            self.start("CdtTrfTxInf")
+            self.path(["PmtId", "EndToEndId"], sepa_text(transaction.end_to_end_id, 35))
+            self.start("Amt")
+            self.amount("InstdAmt", transaction.amount)
+            self.end("Amt")
+            if transaction.bic:
+                self.agent("CdtrAgt", transaction.bic)
+            role = "Cdtr"
+        self.path([role, "Nm"], sepa_text(transaction.name, 70))
+        self.path([f"{role}Acct", "Id", "IBAN"], transaction.iban)
+        self.path(["RmtInf", "Ustrd"], sepa_text(transaction.remittance, 140))
+        self.end("DrctDbtTxInf" if self.kind == DIRECT_DEBIT else "CdtTrfTxInf")
+
+    def end_payment(self):
+        self.end("PmtInf")
+
+    def end_document(self):
+        self.end("CstmrDrctDbtInitn" if self.kind == DIRECT_DEBIT else "CstmrCdtTrfInitn")
+        self.end("Document")
+        self.xml.endDocument()
+
+
+def generate_pain(kind, transactions, party, message_id=None, created_at=None, chunk_size=1000):
+    """
+    Yield a pain.008 (`DIRECT_DEBIT`) or pain.001 (`CREDIT_TRANSFER`) document as text chunks of
+    about `chunk_size` transactions. `transactions` is called twice and must return the same
+    transactions, ordered by due date, both times.
+    """
+    party.validate(kind)
+    totals = Totals()
+    for transaction in transactions():
+        if transaction.amount <= 0:
+            raise SepaError(f"Transaction {transaction.end_to_end_id} has no positive amount.")
+        if totals.by_due_date and transaction.due_date not in totals.by_due_date and transaction.due_date < max(
+            totals.by_due_date
+        ):
+            raise SepaError("Transactions must be ordered by due date.")
+        totals.add(transaction)
+    if not totals.count:
+        raise SepaError("There are no transactions to export.")
+
+    created_at = created_at or timezone.localtime()
+    message_id = message_id or f"UH-{kind[5:8]}-{created_at:%Y%m%d%H%M%S}"
+    buffer = io.StringIO()
+    writer = PainWriter(buffer, kind)
+    writer.begin_document(message_id, created_at, totals, party)
+
+    written, current = Totals(), None
+    for transaction in transactions():
+        if transaction.due_date != current:
+            if current is not None:
+                writer.end_payment()
+            current = transaction.due_date
+            count, amount = totals.by_due_date.get(current, (0, Decimal("0.00")))
+            writer.begin_payment(f"{message_id}-{current:%Y%m%d}", current, count, amount, party)
+        writer.transaction(transaction)
+        written.add(transaction)
+        if written.count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if (written.count, written.amount, written.by_due_date) != (totals.count, totals.amount, totals.by_due_date):
+        raise SepaError("The transactions changed while the file was written; export it again.")
+    writer.end_payment()
+    writer.end_document()
+    yield buffer.getvalue()
@@ -1,41 +1,206 @@
 from rest_framework import serializers
-from .models import Meter, MeterReading, Unit, ConsumptionType, Expense
+from .models import Meter, MeterReading, Unit, ConsumptionType, Expense, MonthlyConsumption
+from .consumption import BUCKETS, bucket_edges
+from .analytics import MAX_BUCKETS
+from .thumbnails import THUMBNAIL_SIZES, thumbnail_url
+
+
+def split_param(value):
+    """`"a, b,,c"` -> `("a", "b", "c")`; empty or missing parameters give `()`."""
+    return tuple(part.strip() for part in (value or "").split(",") if part.strip())
+
+
+def nested_paths(paths, name):
+    """The dotted paths below `name`: `nested_paths(("meter.unit", "user"), "meter") == ("unit",)`."""
+    prefix = f"{name}."
+    return tuple(path[len(prefix):] for path in paths if path.startswith(prefix))
+
+
+class FlexFieldsMixin:
+    """
+    Sparse fieldsets and on-demand nesting, driven by `?fields=` and `?expand=`.
+
+    Relations render as primary keys unless they are listed in `?expand=`, in which case the
+    serializer (or field) from `expandable_fields` replaces the key. Both parameters take
+    comma-separated, dotted paths: `?fields=id,value,meter.label&expand=meter`.
+    The top-level serializer reads them from the request; nested ones receive them as arguments.
+    """
+    expandable_fields = {}
+    # Model fields read by method fields, so that the query planner does not defer them
+    method_field_sources = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None and expand is None:
+            request = self.context.get("request")
+            params = getattr(request, "query_params", {})
+            fields, expand = split_param(params.get("fields")), split_param(params.get("expand"))
+        self.requested_fields = tuple(fields or ())
+        self.expanded_fields = tuple(expand or ())
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for name in {path.split(".")[0] for path in self.expanded_fields}:
+            if name not in self.expandable_fields or name not in fields:
+                continue
+            field_class, options = self.expandable_fields[name]
+            if isinstance(field_class, str):
+                field_class = globals()[field_class]
+            if issubclass(field_class, FlexFieldsMixin):
+                options = {
+                    **options,
+                    "fields": nested_paths(self.requested_fields, name),
+                    "expand": nested_paths(self.expanded_fields, name),
+                }
+            fields[name] = field_class(read_only=True, **options)
+
+        if self.requested_fields:
+            requested = {path.split(".")[0] for path in self.requested_fields}
+            fields = {name: field for name, field in fields.items() if name in requested}
+        return fields
+
+def validate_tree_parent(instance, parent):
+    """DRF does not call `Model.clean()`, so check the new parent of a unit or meter here."""
+    if instance is not None and parent is not None and instance.is_below_itself(parent.pk):
+        raise serializers.ValidationError("A node cannot be placed below itself.")
+    return parent
+
+class UnitSerializer(FlexFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {"parent_unit": ("UnitSerializer", {})}
 
-class UnitSerializer(serializers.ModelSerializer):
     class Meta:
         model = Unit
-        fields = "__all__"
+        exclude = ["tree_path"]
+
+    def validate_parent_unit(self, value):
+        return validate_tree_parent(self.instance, value)
 
-class ConsumptionTypeSerializer(serializers.ModelSerializer):
+class ConsumptionTypeSerializer(FlexFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ConsumptionType
         fields = "__all__"
 
-class MeterSerializer(serializers.ModelSerializer):
-    """Serialize Meter objects including related data."""
-    consumption_type = ConsumptionTypeSerializer(read_only=True)
-    unit = UnitSerializer(read_only=True)
+class MeterSerializer(FlexFieldsMixin, serializers.ModelSerializer):
+    """Serialize Meter objects; `?expand=unit,consumption_type` nests the related data."""
+    expandable_fields = {
+        "consumption_type": (ConsumptionTypeSerializer, {}),
+        "unit": (UnitSerializer, {}),
+        "parent_meter": ("MeterSerializer", {}),
+    }
 
     class Meta:
         model = Meter
-        fields = "__all__"
+        exclude = ["tree_path"]
+
+    def validate_parent_meter(self, value):
+        return validate_tree_parent(self.instance, value)
 
-class MeterReadingSerializer(serializers.ModelSerializer):
-    """Serialize meter readings including meter info."""
-    meter = MeterSerializer(read_only=True)
-    user = serializers.StringRelatedField(read_only=True)
+class MeterReadingSerializer(FlexFieldsMixin, serializers.ModelSerializer):
+    """Serialize meter readings; `?expand=meter,user` nests the meter and names the user."""
+    photo_thumbnails = serializers.SerializerMethodField()
+    expandable_fields = {
+        "meter": (MeterSerializer, {}),
+        "user": (serializers.StringRelatedField, {}),
+    }
+    method_field_sources = {"photo_thumbnails": ("photo", "photo_hash")}
 
     class Meta:
         model = MeterReading
-        fields = "__all__"
+        exclude = ["photo_hash"]
+        read_only_fields = ["user"]
+
+    def get_photo_thumbnails(self, obj):
+        """Thumbnail URLs by width, for clients that should not download the original photo."""
+        if not obj.photo:
+            return None
+        request = self.context.get("request")
+        return {str(size): thumbnail_url(obj, size, request) for size in THUMBNAIL_SIZES}
 
-class ExpenseSerializer(serializers.ModelSerializer):
-    """Serialize expenses including meter readings and related info."""
-    meter = MeterSerializer(read_only=True)
-    start_reading = MeterReadingSerializer(read_only=True)
-    end_reading = MeterReadingSerializer(read_only=True)
-    supplier = serializers.StringRelatedField(read_only=True)
+class ExpenseSerializer(FlexFieldsMixin, serializers.ModelSerializer):
+    """Serialize expenses; `?expand=meter,start_reading,end_reading,supplier` nests the related data."""
+    expandable_fields = {
+        "meter": (MeterSerializer, {}),
+        "start_reading": (MeterReadingSerializer, {}),
+        "end_reading": (MeterReadingSerializer, {}),
+        "supplier": (serializers.StringRelatedField, {}),
+    }
 
     class Meta:
         model = Expense
         fields = "__all__"
+
+class MonthlyConsumptionSerializer(FlexFieldsMixin, serializers.ModelSerializer):
+    """Serialize monthly consumption roll-ups; `?expand=meter` nests the meter."""
+    expandable_fields = {"meter": (MeterSerializer, {})}
+
+    class Meta:
+        model = MonthlyConsumption
+        fields = "__all__"
+
+class ConsumptionQuerySerializer(serializers.Serializer):
+    """Validate the query parameters of the consumption endpoint (`meters`, `from`, `to`, `bucket`)."""
+
+    def get_fields(self):
+        # `from` is a Python keyword, so the fields are declared here instead of as attributes.
+        return {
+            "meters": serializers.CharField(required=False),
+            "from": serializers.DateField(),
+            "to": serializers.DateField(),
+            "bucket": serializers.ChoiceField(choices=BUCKETS, required=False),
+        }
+
+    def validate_meters(self, value):
+        try:
+            return [int(meter_id) for meter_id in value.split(",") if meter_id.strip()]
+        except ValueError:
+            raise serializers.ValidationError("Expected a comma-separated list of meter ids.")
+
+    def validate(self, attrs):
+        if attrs["to"] <= attrs["from"]:
+            raise serializers.ValidationError({"to": "Must be after 'from'."})
+        return attrs
+
+class BucketedConsumptionQuerySerializer(ConsumptionQuerySerializer):
+    """`from`, `to` and `bucket` (day, week or month; default month) of a single meter or unit."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        del fields["meters"]
+        fields["bucket"] = serializers.ChoiceField(choices=("day", "week", "month"), default="month")
+        return fields
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if len(bucket_edges(attrs["from"], attrs["to"], attrs["bucket"])) - 1 > MAX_BUCKETS:
+            raise serializers.ValidationError({"bucket": f"Too many buckets; at most {MAX_BUCKETS} are returned."})
+        return attrs
+
+class MonthlyConsumptionQuerySerializer(ConsumptionQuerySerializer):
+    """Optional `meters`, `from` and `to` filters of the monthly consumption list."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields["from"].required = fields["to"].required = False
+        del fields["bucket"]
+        return fields
+
+    def validate(self, attrs):
+        if "from" in attrs and "to" in attrs:
+            return super().validate(attrs)
+        return attrs
+
+class YearOverYearQuerySerializer(serializers.Serializer):
+    """`years` (comma-separated, required) and an optional `meters` filter."""
+    years = serializers.CharField()
+    meters = serializers.CharField(required=False)
+
+    validate_meters = ConsumptionQuerySerializer.validate_meters
+
+    def validate_years(self, value):
+        try:
+            years = sorted({int(year) for year in value.split(",") if year.strip()})
+        except ValueError:
+            raise serializers.ValidationError("Expected a comma-separated list of years.")
+        if not years:
+            raise serializers.ValidationError("At least one year is required.")
+        return years
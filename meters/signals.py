@@ -0,0 +1,103 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import conditional, conversion, live, monthly, ocr, plausibility, trees
+from .models import ConversionFactor, Expense, Meter, MeterReading, Unit
+
+READING_FIELDS = {"meter", "meter_id", "reading_date", "value"}
+
+
+@receiver([post_save, post_delete], sender=ConversionFactor)
+def invalidate_conversion_factors(sender, **kwargs):
+    conversion.invalidate()
+    # Again after commit, in case another process rebuilt the index from the pre-commit rows meanwhile.
+    transaction.on_commit(conversion.invalidate)
+
+
+@receiver(post_delete, sender=Unit)
+@receiver(post_delete, sender=Meter)
+def detach_subtree(sender, instance, **kwargs):
+    trees.detach_subtree(instance)
+
+
+@receiver(post_save, sender=MeterReading)
+def queue_photo_ocr(sender, instance, raw=False, **kwargs):
+    """Queue OCR for newly uploaded photos; the worker does the actual work."""
+    if not raw and instance.photo:
+        ocr.enqueue(instance)
+
+
+@receiver([post_save, post_delete])
+def bump_api_version(sender, **kwargs):
+    """Invalidate API ETags and cached responses that may include the changed row."""
+    if sender._meta.app_label in conditional.TRACKED_APPS:
+        conditional.bump_version(sender)
+        # Again after commit, so a response rendered from the pre-commit rows is not cached under the new version.
+        transaction.on_commit(lambda: conditional.bump_version(sender))
+
+
+@receiver(post_save, sender=MeterReading)
+def refresh_monthly_after_save(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    """Recompute the months around the reading's new (and, if it moved, old) date."""
+    if raw or (update_fields is not None and not READING_FIELDS & set(update_fields)):
+        return
+    changes = {instance.meter_id: [instance.reading_date]}
+    old_meter_id = getattr(instance, "_loaded_meter_id", None)
+    if not created and old_meter_id is not None:
+        changes.setdefault(old_meter_id, []).append(instance._loaded_reading_date)
+    monthly.refresh(changes)
+
+
+@receiver(post_delete, sender=MeterReading)
+def refresh_monthly_after_delete(sender, instance, origin=None, **kwargs):
+    changes = {instance.meter_id: [instance.reading_date]}
+    if isinstance(origin, MeterReading) or getattr(origin, "model", None) is MeterReading:
+        monthly.refresh(changes)
+    else:
+        # Cascaded from a meter, unit or user: the meter itself may be deleted in the same transaction.
+        transaction.on_commit(lambda: monthly.refresh(changes))
+
+
+@receiver(post_save, sender=Meter)
+def rebuild_monthly_after_meter_change(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    """The install/deinstall window decides which readings count."""
+    if created or raw:
+        return
+    if update_fields is None or {"install_date", "deinstall_date"} & set(update_fields):
+        monthly.rebuild([instance.pk])
+
+
+@receiver(post_save, sender=MeterReading)
+def check_plausibility(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    """Score new readings against the meter's running statistics; re-score edited ones."""
+    if raw:
+        return
+    if created:
+        plausibility.check_readings([instance])
+    elif update_fields is None or READING_FIELDS & set(update_fields):
+        old_meter_id = getattr(instance, "_loaded_meter_id", None)
+        if old_meter_id is not None and old_meter_id != instance.meter_id:
+            plausibility.forget(old_meter_id)
+        plausibility.recheck_reading(instance)
+
+
+@receiver(post_delete, sender=MeterReading)
+def forget_plausibility_stats(sender, instance, **kwargs):
+    plausibility.forget(instance.meter_id)
+
+
+@receiver(post_save, sender=MeterReading)
+@receiver(post_save, sender=Expense)
+def publish_live_event(sender, instance, created=False, raw=False, **kwargs):
+    """Push new readings and expenses to live subscribers once they are committed."""
+    if created and not raw:
+        transaction.on_commit(lambda: live.publish_created([instance]))
+
+
+# Connected last: the receivers above compare against the values the reading was loaded with.
+@receiver(post_save, sender=MeterReading)
+def remember_saved_values(sender, instance, update_fields=None, **kwargs):
+    """The saved meter and date are what the next save of this instance moves the reading from."""
+    if update_fields is None or READING_FIELDS & set(update_fields):
+        instance._loaded_meter_id, instance._loaded_reading_date = instance.meter_id, instance.reading_date
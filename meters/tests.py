@@ -1,3 +1,1460 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import math
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+from xml.etree import ElementTree
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from contacts.models import BankAccount
+
+from .admin import EstimatedCountPaginator
+from . import analytics, consumption, conversion, hierarchy, ingest, live, monthly, ocr, plausibility
+from .async_views import LiveEventsView
+from .estimates import generate_estimates
+from .billing import run_billing, split_amount
+from .fast_serialization import FastListMixin, compile_rows
+from .query_planner import collect_related_lookups, plan_queryset
+from .sepa import CREDIT_TRANSFER, DIRECT_DEBIT, Party, SepaError, generate_pain, sepa_transactions
+from .serializers import ExpenseSerializer
+from .models import (
+    Unit, ConsumptionType, Meter, MeterReading, Expense, ConversionFactor, CostAllocation, OCRJob, MonthlyConsumption,
+    PlausibilityFlag,
+)
+from .thumbnails import thumbnail_name
+
+
+def create_meter(label, unit=None, consumption_type=None, **kwargs):
+    """Create a meter with a fresh unit and consumption type unless given."""
+    unit = unit or Unit.objects.create(name=f"Unit {label}", location="Floor 1", size=50)
+    consumption_type = consumption_type or ConsumptionType.objects.get_or_create(name="Water", defaults={"unit": "m³"})[0]
+    return Meter.objects.create(
+        label=label, serial_number=f"SN-{label}", unit=unit, consumption_type=consumption_type, **kwargs
+    )
+
+
+class ApiQueryCountTests(TestCase):
+    """
+    The list endpoints must cost the same number of queries regardless of the number of rows:
+    one aggregate for the ETag and one for the rows.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="reader", email="reader@example.com", password="x", customer_number="C-1"
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_expenses(self, count):
+        for i in range(count):
+            meter = create_meter(f"M{Meter.objects.count()}")
+            start = MeterReading.objects.create(meter=meter, reading_date=date(2024, 1, 1), value=10, user=self.user)
+            end = MeterReading.objects.create(
+                meter=meter, reading_date=date(2024, 1, 1) + timedelta(days=365), value=20 + i, user=self.user
+            )
+            Expense.objects.create(
+                meter=meter, supplier=self.user, invoice_number=f"INV-{meter.pk}", invoice_date=date(2025, 1, 5),
+                start_reading=start, end_reading=end, fixed_costs=Decimal("10.00"), variable_costs=Decimal("5.00"),
+                vat_rate=Decimal("20.00"),
+            )
+
+    def assertConstantQueries(self, url_name, expand):
+        url = f"{reverse(url_name)}?expand={expand}"
+        self.create_expenses(1)
+        with self.assertNumQueries(2):
+            small = self.client.get(url)
+        self.create_expenses(10)
+        with self.assertNumQueries(2):
+            large = self.client.get(url)
+        self.assertEqual(small.status_code, 200)
+        self.assertEqual(large.status_code, 200)
+        return large
+
+    def test_expense_list(self):
+        response = self.assertConstantQueries(
+            "expense-list", "meter.unit,meter.consumption_type,start_reading.meter.unit,end_reading.user,supplier"
+        )
+        self.assertEqual(len(response.json()["results"]), 11)
+
+    def test_meter_reading_list(self):
+        response = self.assertConstantQueries("meter-reading-list", "meter.unit,meter.consumption_type,user")
+        self.assertEqual(len(response.json()["results"]), 22)
+
+    def test_meter_list(self):
+        self.assertConstantQueries("meter-list", "unit,consumption_type")
+
+    def test_expense_detail(self):
+        self.create_expenses(1)
+        expense = Expense.objects.get()
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("expense-detail", args=[expense.pk]) + "?expand=start_reading.meter.unit")
+        self.assertEqual(response.json()["start_reading"]["meter"]["unit"]["name"], expense.meter.unit.name)
+        self.assertEqual(response.json()["meter"], expense.meter_id)
+
+    def test_relations_are_flat_by_default(self):
+        self.create_expenses(1)
+        reading = MeterReading.objects.first()
+        row = self.client.get(reverse("meter-reading-list")).json()["results"][0]
+        self.assertEqual(row["meter"], reading.meter_id)
+        self.assertEqual(row["user"], self.user.pk)
+
+    def test_many_to_many_primary_keys_are_prefetched(self):
+        class ContactSerializer(serializers.ModelSerializer):
+            class Meta:
+                model = get_user_model()
+                fields = ["id", "groups"]
+
+        self.assertEqual(collect_related_lookups(ContactSerializer(many=True)), ([], ["groups"]))
+        Group.objects.create(name="Tenants").user_set.add(self.user)
+        with self.assertNumQueries(2):
+            rows = ContactSerializer(plan_queryset(get_user_model().objects.all(), ContactSerializer()), many=True).data
+        self.assertEqual(len(rows[0]["groups"]), 1)
+
+    def test_sparse_fieldset(self):
+        self.create_expenses(1)
+        url = reverse("meter-reading-list") + "?fields=id,meter,reading_date,value"
+        with CaptureQueriesContext(connection) as queries:
+            rows = self.client.get(url).json()["results"]
+        self.assertEqual(set(rows[0]), {"id", "meter", "reading_date", "value"})
+        self.assertNotIn("photo", queries[-1]["sql"])
+        self.assertNotIn("JOIN", queries[-1]["sql"])
+
+    def test_sparse_fieldset_of_expanded_relation(self):
+        self.create_expenses(1)
+        url = reverse("meter-reading-list") + "?fields=id,meter.label&expand=meter"
+        with self.assertNumQueries(2):
+            rows = self.client.get(url).json()["results"]
+        self.assertEqual(rows[0]["meter"], {"label": Meter.objects.first().label})
+
+    def test_create_with_meter_id(self):
+        meter = create_meter("Flat")
+        response = self.client.post(
+            reverse("meter-reading-list"), {"meter": meter.pk, "reading_date": "2024-03-01", "value": 5}
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(MeterReading.objects.get(meter=meter).user, self.user)
+
+
+class AdminChangelistTests(TestCase):
+    """A changelist page must cost the same number of queries however many rows it shows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser(
+            username="admin", email="admin@example.com", password="x", customer_number="C-ADMIN"
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    create_expenses = ApiQueryCountTests.create_expenses
+
+    def assertConstantQueries(self, url):
+        self.create_expenses(1)
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.create_expenses(10)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(large), len(small))
+        return response
+
+    def test_meter_reading_changelist(self):
+        self.assertConstantQueries(reverse("admin:meters_meterreading_changelist"))
+
+    def test_meter_changelist(self):
+        self.assertConstantQueries(reverse("admin:meters_meter_changelist"))
+
+    def test_expense_changelist(self):
+        response = self.assertConstantQueries(reverse("admin:meters_expense_changelist") + "?o=-7")
+        # Consumption is annotated and sortable: 20 + i - 10 for each batch of expenses
+        self.assertEqual([expense.consumption_value for expense in response.context["cl"].result_list][:2], [19, 18])
+
+    def test_input_filters(self):
+        self.create_expenses(3)
+        meter = Meter.objects.first()
+        url = reverse("admin:meters_expense_changelist")
+        response = self.client.get(url, {"meter": meter.serial_number, "supplier": "C-ADMIN"})
+        self.assertEqual([expense.meter_id for expense in response.context["cl"].result_list], [meter.pk])
+        self.assertContains(response, f'value="{meter.serial_number}"')
+        self.assertContains(response, '<input type="hidden" name="supplier" value="C-ADMIN">', html=True)
+
+    def test_estimated_count(self):
+        self.create_expenses(3)
+        last = MeterReading.objects.order_by("pk").last()
+        MeterReading.objects.filter(pk=last.pk - 1).delete()
+        url = reverse("admin:meters_meterreading_changelist")
+        with mock.patch.object(EstimatedCountPaginator, "exact_below", 0):
+            # No planner statistics on SQLite: the count stays exact after deletes
+            self.assertEqual(self.client.get(url).context["cl"].result_count, MeterReading.objects.count())
+            filtered = self.client.get(url, {"meter": last.meter.label})
+            with mock.patch("meters.admin.estimated_count", return_value=10**6):
+                self.assertEqual(self.client.get(url).context["cl"].result_count, 10**6)
+        self.assertEqual(filtered.context["cl"].result_count, 1)
+
+
+class MeterReadingPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="reader", email="reader@example.com", password="x", customer_number="C-1"
+        )
+        meters = [create_meter("A"), create_meter("B")]
+        for day in range(5):
+            for meter in meters:
+                MeterReading.objects.create(
+                    meter=meter, reading_date=date(2024, 1, 1) + timedelta(days=day), value=day, user=cls.user
+                )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_cursor_walks_every_row_once_in_order(self):
+        url, seen = reverse("meter-reading-list") + "?page_size=3", []
+        while url:
+            with self.assertNumQueries(2):
+                page = self.client.get(url).json()
+            seen.extend((row["reading_date"], row["id"]) for row in page["results"])
+            url = page["next"]
+        self.assertEqual(seen, sorted(seen))
+        self.assertEqual(len(seen), MeterReading.objects.count())
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("meter-reading-list") + "?cursor=garbage")
+        self.assertEqual(response.status_code, 404)
+
+    def test_ndjson_stream(self):
+        response = self.client.get(reverse("meter-reading-list") + "?stream=ndjson")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual(len(rows), 10)
+        self.assertEqual([row["reading_date"] for row in rows], sorted(row["reading_date"] for row in rows))
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="reader", email="reader@example.com", password="x", customer_number="C-1"
+        )
+        cls.meter = create_meter("Kitchen")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_not_modified_until_a_row_changes(self):
+        url = reverse("meter-list")
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+        self.meter.unit.name = "Renamed"
+        self.meter.unit.save()
+        self.assertEqual(self.client.get(url, headers={"If-None-Match": etag}).status_code, 304)
+        expanded = self.client.get(url + "?expand=unit")
+        self.meter.unit.save()
+        response = self.client.get(url + "?expand=unit", headers={"If-None-Match": expanded["ETag"]})
+        self.assertEqual(response.status_code, 200)
+
+        self.meter.delete()
+        self.assertEqual(self.client.get(url, headers={"If-None-Match": etag}).status_code, 200)
+
+    def test_detail_last_modified(self):
+        url = reverse("meter-detail", args=[self.meter.pk])
+        response = self.client.get(url)
+        self.assertIn("Last-Modified", response)
+        response = self.client.get(url, headers={"If-Modified-Since": response["Last-Modified"]})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(reverse("meter-detail", args=[0])).status_code, 404)
+
+    @override_settings(METERS_API_CACHE_TIMEOUT=60)
+    def test_response_cache(self):
+        url = reverse("meter-list")
+        first = self.client.get(url)
+        with self.assertNumQueries(1):
+            cached = self.client.get(url)
+        self.assertEqual(cached.content, first.content)
+        create_meter("Bath")
+        self.assertEqual(len(self.client.get(url).json()), 2)
+
+    @override_settings(METERS_API_CACHE_TIMEOUT=60)
+    def test_response_cache_does_not_share_browsable_pages(self):
+        other = get_user_model().objects.create_user(
+            username="other", email="other@example.com", password="x", customer_number="C-2"
+        )
+        url = reverse("meter-list")
+        html = self.client.get(url, headers={"Accept": "text/html"})
+        self.assertContains(html, "reader")
+        json_response = self.client.get(url)
+        self.client.force_authenticate(other)
+        html = self.client.get(url, headers={"Accept": "text/html"})
+        self.assertContains(html, "other")
+        self.assertNotContains(html, "reader")
+        with self.assertNumQueries(1):  # JSON is the same for everybody and comes from the cache
+            self.assertEqual(self.client.get(url).content, json_response.content)
+
+
+class MeterReadingBulkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="reader", email="reader@example.com", password="x", customer_number="C-1"
+        )
+        cls.meter = create_meter("Kitchen")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse("meter-reading-bulk")
+
+    def test_json_rows_are_created_with_a_fixed_number_of_queries(self):
+        rows = [
+            {"serial_number": "SN-Kitchen", "reading_date": f"2024-01-{day:02d}", "value": day}
+            for day in range(1, 29)
+        ]
+        # meters, conflicts, savepoint, savepoint, insert, release, monthly roll-up (meters, readings, upsert),
+        # plausibility (meters, history), release
+        with self.assertNumQueries(12):
+            response = self.client.post(self.url, rows, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {"created": 28, "errors": []})
+        self.assertEqual(self.meter.readings.filter(user=self.user).count(), 28)
+        self.assertEqual(self.meter.monthly_consumption.get().consumption, 27)
+
+    def test_csv_rows_by_label(self):
+        body = "label,reading_date,value,is_estimated\nKitchen,2024-02-01,12.5,true\n"
+        response = self.client.post(self.url, body, content_type="text/csv")
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(self.meter.readings.get().is_estimated)
+
+    def test_invalid_rows_reject_the_batch_unless_partial(self):
+        MeterReading.objects.create(meter=self.meter, reading_date=date(2024, 3, 1), value=1, user=self.user)
+        rows = [
+            {"label": "Kitchen", "reading_date": "2024-03-02", "value": 2},
+            {"label": "Nowhere", "reading_date": "2024-03-02", "value": 2},
+            {"label": "Kitchen", "reading_date": "2024-03-01", "value": 3},
+            {"label": "Kitchen", "reading_date": "not a date", "value": "x"},
+        ]
+        response = self.client.post(self.url, rows, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error["row"] for error in response.json()["errors"]], [1, 2, 3])
+        self.assertEqual(set(response.json()["errors"][2]["errors"]), {"reading_date", "value"})
+        self.assertEqual(self.meter.readings.count(), 1)
+
+        response = self.client.post(self.url + "?partial=true", rows, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["created"], 1)
+        self.assertEqual(self.meter.readings.count(), 2)
+
+    def test_readings_stored_concurrently_are_reported_as_conflicts(self):
+        rows = [{"label": "Kitchen", "reading_date": f"2024-04-0{day}", "value": day} for day in (1, 2, 3)]
+        validate = ingest.validate_readings
+
+        def validate_then_race(rows, user):
+            validated = validate(rows, user)
+            # Another request stores the same meter and date after this one validated its rows
+            MeterReading.objects.bulk_create([
+                MeterReading(meter=self.meter, reading_date=date(2024, 4, 2), value=9, user=self.user)
+            ])
+            return validated
+
+        for partial, status, created in ((False, 400, 0), (True, 201, 2)):
+            with self.subTest(partial=partial), mock.patch("meters.ingest.validate_readings", validate_then_race):
+                response = self.client.post(self.url + f"?partial={partial}".lower(), rows, format="json")
+                self.assertEqual(response.status_code, status)
+                self.assertEqual(response.json()["created"], created)
+                self.assertEqual([error["row"] for error in response.json()["errors"]], [1])
+                self.assertEqual(self.meter.readings.count(), created + 1)
+            MeterReading.objects.all().delete()
+
+    def test_meters_are_looked_up_in_batches(self):
+        other = create_meter("Bath")
+        with self.assertNumQueries(2):
+            meters = ingest.resolve_meters(["SN-Kitchen", "Bath", "Nowhere"], batch_size=2)
+        self.assertEqual(meters["SN-Kitchen"], self.meter)
+        self.assertEqual(meters["Bath"], other)
+
+
+class MonthlyConsumptionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="reader", email="reader@example.com", password="x", customer_number="C-1"
+        )
+        cls.meter = create_meter("Kitchen", install_date=date(2020, 1, 1))
+
+    def read(self, day, value):
+        return MeterReading.objects.create(meter=self.meter, reading_date=day, value=value, user=self.user)
+
+    def stored(self):
+        return dict(self.meter.monthly_consumption.values_list("month", "consumption"))
+
+    def assertMatchesRebuild(self):
+        incremental = self.stored()
+        monthly.rebuild([self.meter.pk])
+        self.assertEqual(incremental.keys(), self.stored().keys())
+        for month, value in self.stored().items():
+            self.assertAlmostEqual(incremental[month], value, msg=month)
+
+    def test_incremental_updates_match_a_full_rebuild(self):
+        self.read(date(2025, 1, 1), 0)
+        reading = self.read(date(2025, 3, 1), 59)
+        self.assertEqual(self.stored(), {date(2025, 1, 1): 31, date(2025, 2, 1): 28, date(2025, 3, 1): 0})
+
+        self.read(date(2025, 5, 1), 120)
+        self.assertMatchesRebuild()
+        reading.value = 40
+        reading.save()
+        self.assertMatchesRebuild()
+        reading.reading_date = date(2025, 4, 15)
+        reading.save()
+        self.assertMatchesRebuild()
+        MeterReading.objects.filter(reading_date=date(2025, 5, 1)).get().delete()
+        self.assertMatchesRebuild()
+        self.assertNotIn(date(2025, 5, 1), self.stored())
+
+    def test_only_the_months_around_a_reading_are_rewritten(self):
+        for month in range(1, 13):
+            self.read(date(2024, month, 1), month * 10)
+        MonthlyConsumption.objects.update(consumption=-1)
+        self.read(date(2024, 6, 15), 57)
+        changed = {month.month for month, value in self.stored().items() if value != -1}
+        self.assertEqual(changed, {6, 7})  # From the previous reading's month to the next reading's
+
+    def test_year_over_year_in_one_indexed_query(self):
+        self.read(date(2024, 1, 1), 0)
+        self.read(date(2025, 1, 1), 366)
+        self.read(date(2026, 1, 1), 1096)
+        with self.assertNumQueries(1):
+            report = monthly.year_over_year([2024, 2025])
+        self.assertEqual(report[self.meter.pk][2], {2024: 29, 2025: 56})
+        plan = MonthlyConsumption.objects.filter(month__gte=date(2024, 1, 1), month__lt=date(2026, 1, 1)).explain()
+        self.assertIn("monthly_month_meter_idx", plan)
+
+    def test_api(self):
+        self.read(date(2025, 1, 1), 0)
+        self.read(date(2025, 3, 1), 59)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        rows = client.get(reverse("monthly-consumption-list") + "?from=2025-02-01&to=2025-03-01").json()["results"]
+        self.assertEqual([(row["meter"], row["month"], row["consumption"]) for row in rows], [
+            (self.meter.pk, "2025-02-01", 28.0),
+        ])
+        response = client.get(reverse("monthly-consumption-yoy") + "?years=2025")
+        self.assertEqual(response.json()[0], {"meter": self.meter.pk, "month": 1, "consumption": {"2025": 31.0}})
+
+
+class PlausibilityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="reader", email="reader@example.com", password="x", customer_number="C-1"
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def read(self, meter, values, start=date(2024, 1, 1)):
+        """Monthly readings from `start`; returns the last one."""
+        for offset, value in enumerate(values):
+            reading = MeterReading.objects.create(
+                meter=meter, reading_date=start + timedelta(days=30 * offset), value=value, user=self.user
+            )
+        return reading
+
+    def flags(self):
+        return set(PlausibilityFlag.objects.values_list("reading__meter__label", "reading__value", "kind"))
+
+    def test_streaming_flags_and_vectorized_scan_agree(self):
+        normal = [30 * month for month in range(7)]
+        self.read(create_meter("Spike"), normal + [3180, 3210])
+        self.read(create_meter("Decrease"), normal + [170])
+        self.read(create_meter("Correction"), [5000 + value for value in normal] + [5179])
+        self.read(create_meter("Rollover"), [99800 + value for value in normal] + [10])
+        self.read(create_meter("Removed", deinstall_date=date(2024, 2, 1)), [0, 30, 60])
+
+        self.assertEqual(self.flags(), {
+            ("Spike", 3180, "spike"), ("Decrease", 170, "decrease"), ("Correction", 5179, "decrease"),
+            ("Removed", 60, "after_deinstall"),
+        })
+        stored = {
+            (reading_id, kind): score
+            for reading_id, kind, score in PlausibilityFlag.objects.values_list("reading_id", "kind", "score")
+        }
+        for use_numpy in (True, False):
+            with self.subTest(use_numpy=use_numpy):
+                findings = {(row[0], row[4]): row[5] for row in plausibility.scan(use_numpy=use_numpy)}
+                self.assertEqual(findings.keys(), stored.keys())
+                for key, score in stored.items():
+                    if score is None:
+                        self.assertIsNone(findings[key])
+                    else:
+                        self.assertAlmostEqual(findings[key], score, places=6)
+
+    def test_edits_are_rescored(self):
+        reading = self.read(create_meter("Kitchen"), [30 * month for month in range(7)])
+        reading.value = 100
+        reading.save()
+        self.assertEqual(self.flags(), {("Kitchen", 100, "decrease")})
+        reading.value = 180
+        reading.save()
+        self.assertEqual(self.flags(), set())
+
+    def test_moving_a_reading_forgets_the_old_meters_statistics(self):
+        kitchen, bath = create_meter("Kitchen"), create_meter("Bath")
+        with self.captureOnCommitCallbacks(execute=True):
+            misfiled = self.read(kitchen, [30 * month for month in range(7)] + [5000])
+        misfiled.meter = bath
+        misfiled.save()
+        # Scored against the kitchen's readings again, not against the moved 5000
+        self.read(kitchen, [210], start=misfiled.reading_date + timedelta(days=30))
+        self.assertEqual(self.flags(), set())
+
+    def test_new_readings_are_scored_from_cached_statistics(self):
+        meter = create_meter("Kitchen")
+        with self.captureOnCommitCallbacks(execute=True):
+            last = self.read(meter, [30 * month for month in range(7)])
+        spike = MeterReading.objects.bulk_create([MeterReading(
+            meter=meter, reading_date=last.reading_date + timedelta(days=30), value=last.value + 3000, user=self.user
+        )])
+        with self.assertNumQueries(2):  # deinstall dates, flags
+            flags = plausibility.check_readings(spike)
+        self.assertEqual([flag.kind for flag in flags], ["spike"])
+
+    def test_statistics_outlive_the_reading_cadence(self):
+        meter = create_meter("Kitchen")
+        with self.captureOnCommitCallbacks(execute=True):
+            last = self.read(meter, [30 * month for month in range(7)])
+        following = MeterReading.objects.bulk_create([MeterReading(
+            meter=meter, reading_date=last.reading_date + timedelta(days=30), value=last.value + 30, user=self.user
+        )])
+        # The next walk-around, a month later
+        with mock.patch("time.time", return_value=time.time() + 31 * 24 * 60 * 60), self.assertNumQueries(1):
+            self.assertEqual(plausibility.check_readings(following), [])
+
+
+class EstimateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="reader", email="reader@example.com", password="x", customer_number="C-1"
+        )
+
+    def read(self, meter, readings):
+        for day, value in readings:
+            MeterReading.objects.create(meter=meter, reading_date=day, value=value, user=self.user)
+
+    def estimates(self):
+        return {
+            (label, day): value
+            for label, day, value in MeterReading.objects.filter(is_estimated=True).values_list(
+                "meter__label", "reading_date", "value"
+            )
+        }
+
+    def test_interpolates_between_real_readings(self):
+        kitchen, wrapped = create_meter("Kitchen"), create_meter("Wrapped")
+        self.read(kitchen, [(date(2024, 1, 1), 0), (date(2024, 1, 31), 30)])
+        self.read(wrapped, [(date(2024, 1, 1), 99990), (date(2024, 1, 21), 30)])
+        result = generate_estimates([date(2024, 1, 16), date(2024, 1, 6)], self.user)
+        self.assertEqual(self.estimates(), {
+            ("Kitchen", date(2024, 1, 6)): 5, ("Kitchen", date(2024, 1, 16)): 15,
+            ("Wrapped", date(2024, 1, 6)): 0, ("Wrapped", date(2024, 1, 16)): 20,
+        })
+        self.assertEqual(len(result.readings), 4)
+        self.assertEqual(kitchen.monthly_consumption.get().consumption, 30)
+
+        again = generate_estimates([date(2024, 1, 16)], self.user)
+        self.assertEqual((len(again.readings), again.existing), (0, 2))
+
+    def test_extrapolates_from_the_same_season_of_earlier_years(self):
+        heating = create_meter("Heating")
+        self.read(heating, [
+            (date(2023, 1, 1), 0), (date(2023, 4, 1), 900), (date(2023, 10, 1), 900),
+            (date(2024, 1, 1), 1820), (date(2024, 4, 1), 2730),
+        ])
+        MeterReading.objects.create(
+            meter=heating, reading_date=date(2024, 5, 1), value=5000, user=self.user, is_estimated=True
+        )
+        generate_estimates([date(2024, 7, 1), date(2024, 12, 1)], self.user)
+        estimates = self.estimates()
+        self.assertEqual(estimates[("Heating", date(2024, 7, 1))], 2730)  # No consumption last summer
+        self.assertAlmostEqual(estimates[("Heating", date(2024, 12, 1))], 2730 + 610, places=3)
+
+    def test_skips_meters_without_history_or_outside_their_window(self):
+        self.read(create_meter("New", install_date=date(2024, 1, 1)), [(date(2024, 6, 1), 0)])
+        self.read(create_meter("Removed", deinstall_date=date(2024, 1, 31)), [
+            (date(2024, 1, 1), 0), (date(2024, 1, 31), 30),
+        ])
+        result = generate_estimates([date(2024, 2, 15), date(2024, 5, 1)], self.user)
+        self.assertEqual((result.readings, result.skipped), ([], 2))
+
+
+class ConsumptionEngineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="reader", email="reader@example.com", password="x", customer_number="C-1"
+        )
+        cls.flat = create_meter("Flat", install_date=date(2020, 1, 1))
+        values = [100, 130, 180, 260, 290]
+        for i, value in enumerate(values):
+            MeterReading.objects.create(
+                meter=cls.flat, reading_date=date(2020, 1, 1) + timedelta(days=91 * i), value=value, user=cls.user
+            )
+
+        # A 4-digit counter that wraps around, on a meter that is later replaced.
+        cls.old = create_meter("Old", install_date=date(2020, 1, 1), deinstall_date=date(2021, 1, 1))
+        cls.new = create_meter(
+            "New", unit=cls.old.unit, consumption_type=cls.old.consumption_type, install_date=date(2021, 1, 1)
+        )
+        for reading_date, meter, value in [
+            (date(2020, 1, 1), cls.old, 9900), (date(2020, 7, 1), cls.old, 9990), (date(2020, 10, 1), cls.old, 40),
+            (date(2021, 1, 1), cls.old, 100), (date(2021, 1, 1), cls.new, 0), (date(2021, 7, 1), cls.new, 50),
+        ]:
+            MeterReading.objects.create(meter=meter, reading_date=reading_date, value=value, user=cls.user)
+
+    def compare_backends(self, check):
+        python = check(consumption.load_series(use_numpy=False))
+        vectorized = check(consumption.load_series(use_numpy=True))
+        self.assertEqual(len(python), len(vectorized))
+        for a, b in zip(python, vectorized):
+            self.assertAlmostEqual(a, b, places=9)
+        return python
+
+    def test_numpy_matches_pure_python(self):
+        start, end = date(2019, 12, 1), date(2021, 12, 31)
+
+        def check(series):
+            results = []
+            for meter_id in sorted(series):
+                results.append(series[meter_id].consumption(start, end))
+                for bucket in consumption.BUCKETS:
+                    results.extend(value for _, value in series[meter_id].bucketed(start, end, bucket))
+                results.extend(series[meter_id].at([date(2020, 2, 14).toordinal(), date(2021, 3, 3).toordinal()]))
+            return results
+
+        self.compare_backends(check)
+
+    def test_interpolated_consumption(self):
+        series = consumption.load_series([self.flat])[self.flat.pk]
+        self.assertAlmostEqual(series.consumption(date(2020, 1, 1), date(2020, 4, 1)), 30)
+        # Halfway between the readings on day 91 and day 182
+        self.assertAlmostEqual(series.at([date(2020, 1, 1).toordinal() + 136.5])[0], 155)
+        months = series.bucketed(date(2020, 1, 1), date(2021, 1, 1), "month")
+        self.assertEqual(len(months), 12)
+        self.assertAlmostEqual(sum(value for _, value in months), series.consumption(date(2020, 1, 1), date(2021, 1, 1)))
+
+    def test_rollover_and_replacement(self):
+        series = consumption.load_series([self.new])[self.new.pk]
+        self.assertEqual(series.meter_ids, (self.old.pk, self.new.pk))
+        # 9900 -> 9990 -> (wrap) 40 -> 100 on the old meter, then 0 -> 50 on the new one
+        self.assertAlmostEqual(series.consumption(date(2020, 1, 1), date(2021, 7, 1)), 90 + 50 + 60 + 50)
+
+    def test_corrections_are_not_rollovers(self):
+        self.assertEqual(consumption.interval_delta(99870, 130), 260)
+        self.assertEqual(consumption.interval_delta(5000, 4999), 0)
+        for use_numpy in (False, True):
+            with self.subTest(use_numpy=use_numpy):
+                cumulative = consumption._cumulative([5000, 4999, 5010, 9950, 20], use_numpy)
+                self.assertEqual(list(cumulative), [5000, 5000, 5011, 9951, 10021])
+
+    def test_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.assertNumQueries(2):
+            response = client.get(
+                reverse("consumption"), {"meters": str(self.flat.pk), "from": "2020-01-01", "to": "2020-04-01",
+                                         "bucket": "month"}
+            )
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual(report[0]["meter"], self.flat.pk)
+        self.assertAlmostEqual(report[0]["consumption"], 30)
+        self.assertEqual([bucket["start"] for bucket in report[0]["buckets"]], ["2020-01-01", "2020-02-01", "2020-03-01"])
+
+        response = client.get(reverse("consumption"), {"from": "2020-04-01", "to": "2020-01-01"})
+        self.assertEqual(response.status_code, 400)
+
+
+class BucketedConsumptionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="reader", email="reader@example.com", password="x", customer_number="C-1"
+        )
+        cls.unit = Unit.objects.create(name="Flat 1", location="Floor 1", size=60)
+        cls.main = create_meter("Main", unit=cls.unit, install_date=date(2020, 1, 1))
+        cls.sub = create_meter("Sub", unit=cls.unit, parent_meter=cls.main, install_date=date(2020, 1, 1))
+        heat = ConsumptionType.objects.create(name="Heat", unit="kWh")
+        cls.other = create_meter("Heat", unit=cls.unit, install_date=date(2020, 1, 1), consumption_type=heat)
+        days = (date(2024, 11, 20), date(2025, 1, 10), date(2025, 2, 3), date(2025, 5, 1), date(2025, 8, 1))
+        for meter, values in (
+            (cls.main, (0, 40, 95, 9990, 30)), (cls.sub, (0, 5, 9, 20, 22)), (cls.other, (5, 6, 7, 8, 9)),
+        ):
+            for day, value in zip(days, values):
+                MeterReading.objects.create(meter=meter, reading_date=day, value=value, user=cls.user)
+
+    def test_matches_the_consumption_engine(self):
+        expected = consumption.load_series([self.main], chain_replacements=False)[self.main.pk]
+        for bucket, start, end in (
+            ("day", date(2025, 1, 1), date(2025, 3, 1)),
+            ("week", date(2024, 12, 1), date(2025, 9, 1)),
+            ("month", date(2024, 1, 1), date(2026, 1, 1)),
+        ):
+            with self.subTest(bucket=bucket):
+                with self.assertNumQueries(1):
+                    result = analytics.meter_consumption(self.main, start, end, bucket)
+                reference = expected.bucketed(start, end, bucket)
+                self.assertEqual([item["start"] for item in result["buckets"]], [edge for edge, _ in reference])
+                for item, (_, value) in zip(result["buckets"], reference):
+                    self.assertAlmostEqual(item["consumption"], value)
+                self.assertAlmostEqual(result["consumption"], expected.consumption(start, end))
+
+    def test_rollover(self):
+        result = analytics.meter_consumption(self.main, date(2025, 5, 1), date(2025, 8, 1), "month")
+        self.assertAlmostEqual(result["consumption"], 40)  # 9990 -> 30 on a 4-digit counter
+
+    def test_unit_sums_top_level_meters_per_type(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse("unit-consumption", args=[self.unit.pk]) + "?from=2025-01-01&to=2025-07-01&bucket=month"
+        with self.assertNumQueries(3):  # unit, meters, intervals
+            data = client.get(url).json()
+        self.assertEqual([item["meters"] for item in data["consumption_types"]], [[self.main.pk], [self.other.pk]])
+        main = analytics.meter_consumption(self.main, date(2025, 1, 1), date(2025, 7, 1))
+        self.assertAlmostEqual(data["consumption_types"][0]["consumption"], main["consumption"])
+        self.assertEqual(len(data["consumption_types"][0]["buckets"]), 6)
+
+    def test_validation(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse("meter-consumption", args=[self.main.pk])
+        self.assertEqual(client.get(url + "?from=2025-01-01&to=2024-01-01").status_code, 400)
+        self.assertEqual(client.get(url + "?from=2000-01-01&to=2025-01-01&bucket=day").status_code, 400)
+        self.assertEqual(client.get(url + "?from=2025-01-01&to=2025-02-01&bucket=year").status_code, 400)
+        self.assertEqual(client.get(url + "?from=2025-01-01&to=2025-02-01").json()["bucket"], "month")
+
+
+class HierarchyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="reader", email="reader@example.com", password="x", customer_number="C-1"
+        )
+        cls.building = Unit.objects.create(name="Building", location="Main Street", size=500)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def read(self, meter, *values):
+        for month, value in enumerate(values, start=1):
+            MeterReading.objects.create(meter=meter, reading_date=date(2024, month, 1), value=value, user=self.user)
+
+    def test_paths_follow_moves_and_deletes(self):
+        a = Unit.objects.create(name="A", location="1", size=1, parent_unit=self.building)
+        b = Unit.objects.create(name="B", location="1", size=1, parent_unit=a)
+        self.assertEqual(b.tree_path, f"/{self.building.pk}/{a.pk}/{b.pk}/")
+
+        a.parent_unit = None
+        a.save()
+        b.refresh_from_db()
+        self.assertEqual(b.tree_path, f"/{a.pk}/{b.pk}/")
+
+        a.delete()
+        b.refresh_from_db()
+        self.assertEqual(b.tree_path, f"/{b.pk}/")
+
+    def test_parent_cycles_are_rejected_by_the_api(self):
+        main = create_meter("Main", unit=self.building)
+        sub = create_meter("Sub", unit=self.building, parent_meter=main, consumption_type=main.consumption_type)
+        response = self.client.patch(reverse("meter-detail", args=[main.pk]), {"parent_meter": sub.pk}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("parent_meter", response.json())
+        main.refresh_from_db()
+        self.assertIsNone(main.parent_meter_id)
+
+    def test_paths_missing_after_bulk_writes_are_rebuilt(self):
+        a, b = Unit.objects.bulk_create([
+            Unit(name="A", location="1", size=1, parent_unit=self.building), Unit(name="B", location="1", size=1),
+        ])
+        Unit.objects.filter(pk=b.pk).update(parent_unit=a)
+        c = Unit.objects.create(name="C", location="1", size=1, parent_unit=b)
+        self.assertEqual(c.tree_path, f"/{self.building.pk}/{a.pk}/{b.pk}/{c.pk}/")
+
+        create_meter("Elsewhere")
+        main = create_meter("Main", unit=self.building)
+        Meter.objects.filter(pk=main.pk).update(tree_path="")
+        main.refresh_from_db()
+        sub = Meter.objects.bulk_create([Meter(
+            label="Sub", serial_number="SN-Sub", unit=a, consumption_type=main.consumption_type, parent_meter=main
+        )])[0]
+        rows = hierarchy.meter_rollup(main, date(2024, 1, 1), date(2024, 2, 1))
+        self.assertEqual([(row["meter"], row["parent_meter"]) for row in rows], [(main.pk, None), (sub.pk, main.pk)])
+
+    def test_meter_rollup_common_area(self):
+        main = create_meter("Main", unit=self.building)
+        flat_1 = create_meter("Flat 1", parent_meter=main, consumption_type=main.consumption_type)
+        flat_2 = create_meter("Flat 2", parent_meter=main, consumption_type=main.consumption_type)
+        self.read(main, 0, 100)
+        self.read(flat_1, 0, 30)
+        self.read(flat_2, 0, 50)
+
+        response = self.client.get(reverse("meter-rollup", args=[main.pk]), {"from": "2024-01-01", "to": "2024-02-01"})
+        rows = {row["meter"]: row for row in response.json()}
+        self.assertEqual(rows[main.pk]["sub_meter_consumption"], 80)
+        self.assertEqual(rows[main.pk]["common_area"], 20)
+        self.assertEqual(rows[flat_1.pk]["parent_meter"], main.pk)
+
+    def test_unit_rollup_does_not_count_sub_meters_twice(self):
+        flat = Unit.objects.create(name="Flat", location="1", size=50, parent_unit=self.building)
+        main = create_meter("Main", unit=self.building)
+        sub = create_meter("Sub", unit=flat, parent_meter=main, consumption_type=main.consumption_type)
+        self.read(main, 0, 100)
+        self.read(sub, 0, 30)
+
+        response = self.client.get(
+            reverse("unit-rollup", args=[self.building.pk]), {"from": "2024-01-01", "to": "2024-02-01"}
+        )
+        rows = {row["unit"]: row for row in response.json()}
+        self.assertEqual(rows[self.building.pk]["consumption"], 70)
+        self.assertEqual(rows[self.building.pk]["total"], 100)
+        self.assertEqual(rows[flat.pk]["total"], 30)
+
+    def test_rollup_query_count_does_not_depend_on_depth(self):
+        def rollup_queries(root):
+            url = reverse("unit-rollup", args=[root.pk])
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url, {"from": "2024-01-01", "to": "2024-02-01"})
+            return len(queries)
+
+        flat_root = Unit.objects.create(name="Flat root", location="1", size=1)
+        create_meter("Flat root meter", unit=flat_root)
+
+        deep_root = parent = Unit.objects.create(name="Deep root", location="1", size=1)
+        parent_meter = None
+        for depth in range(8):
+            parent = Unit.objects.create(name=f"Level {depth}", location="1", size=1, parent_unit=parent)
+            parent_meter = create_meter(f"Level {depth}", unit=parent, parent_meter=parent_meter)
+            self.read(parent_meter, 0, 10 - depth)
+
+        self.assertEqual(rollup_queries(flat_root), rollup_queries(deep_root))
+
+
+class BillingRunTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="reader", email="reader@example.com", password="x", customer_number="C-1"
+        )
+        building = Unit.objects.create(name="Building", location="Main Street", size=100)
+        cls.flat_1 = Unit.objects.create(name="Flat 1", location="1", size=60, parent_unit=building)
+        cls.flat_2 = Unit.objects.create(name="Flat 2", location="2", size=40, parent_unit=building)
+        gas = ConsumptionType.objects.create(name="Gas", unit="m³")
+        heat = ConsumptionType.objects.create(name="Heat", unit="kWh")
+        cls.main = create_meter("Main", unit=building, consumption_type=heat)
+        cls.sub_1 = create_meter("Sub 1", unit=cls.flat_1, consumption_type=heat, parent_meter=cls.main)
+        cls.sub_2 = create_meter("Sub 2", unit=cls.flat_2, consumption_type=gas, parent_meter=cls.main)
+        ConversionFactor.objects.create(
+            from_consumption_type=gas, to_consumption_type=heat, factor=10, start_date=date(2020, 1, 1),
+            end_date=date(2030, 1, 1),
+        )
+        readings = {}
+        for meter, start, end in [(cls.main, 0, 1000), (cls.sub_1, 0, 300), (cls.sub_2, 0, 30)]:
+            readings[meter] = [
+                MeterReading.objects.create(meter=meter, reading_date=date(2024, 1, 1), value=start, user=cls.user),
+                MeterReading.objects.create(meter=meter, reading_date=date(2025, 1, 1), value=end, user=cls.user),
+            ]
+        cls.expense = Expense.objects.create(
+            meter=cls.main, invoice_number="HEAT-2024", invoice_date=date(2025, 1, 15),
+            start_reading=readings[cls.main][0], end_reading=readings[cls.main][1],
+            fixed_costs=Decimal("100.00"), variable_costs=Decimal("200.01"), vat_rate=Decimal("20.00"),
+        )
+
+    def test_split_amount_is_exact(self):
+        self.assertEqual(split_amount(Decimal("100.00"), [1, 1, 1]), [Decimal("33.34"), Decimal("33.33"), Decimal("33.33")])
+        self.assertEqual(split_amount(Decimal("10.00"), [0, 0]), [Decimal("5.00"), Decimal("5.00")])
+
+    def test_allocation(self):
+        result = run_billing(date(2025, 1, 1), date(2025, 12, 31))
+        self.assertEqual(result.run.status, "completed")
+        allocations = {row.unit_id: row for row in CostAllocation.objects.filter(billing_run=result.run)}
+
+        self.assertEqual(allocations[self.flat_1.pk].fixed_costs, Decimal("60.00"))
+        self.assertEqual(allocations[self.flat_2.pk].fixed_costs, Decimal("40.00"))
+        # 300 kWh against 30 m³ x 10 kWh/m³
+        self.assertAlmostEqual(allocations[self.flat_2.pk].consumption, 300)
+        self.assertEqual(allocations[self.flat_1.pk].variable_costs, Decimal("100.01"))
+        self.assertEqual(allocations[self.flat_2.pk].variable_costs, Decimal("100.00"))
+        self.expense.refresh_from_db()
+        self.assertEqual(sum(row.total_cost for row in allocations.values()), self.expense.total_cost)
+
+    def test_rerun_only_recomputes_changed_expenses(self):
+        first = run_billing(date(2025, 1, 1), date(2025, 12, 31))
+        self.assertEqual(first.recomputed, [self.expense.pk])
+
+        again = run_billing(date(2025, 1, 1), date(2025, 12, 31))
+        self.assertEqual((again.run.pk, again.recomputed, again.unchanged), (first.run.pk, [], [self.expense.pk]))
+
+        MeterReading.objects.filter(meter=self.sub_2, reading_date=date(2025, 1, 1)).update(value=60)
+        changed = run_billing(date(2025, 1, 1), date(2025, 12, 31))
+        self.assertEqual(changed.recomputed, [self.expense.pk])
+        self.assertEqual(CostAllocation.objects.filter(billing_run=changed.run).count(), 2)
+
+    def test_allocations_are_immutable(self):
+        run_billing(date(2025, 1, 1), date(2025, 12, 31))
+        allocation = CostAllocation.objects.first()
+        allocation.fixed_costs = Decimal("0.00")
+        with self.assertRaises(ValueError):
+            allocation.save()
+
+
+class SepaExportTests(TestCase):
+    NS = {"p": f"urn:iso:std:iso:20022:tech:xsd:{DIRECT_DEBIT}"}
+    PARTY = Party("Uhrenhaus Hausverwaltung", "AT611904300234573201", "BKAUATWWXXX", "AT98ZZZ00000000001")
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        reader = User.objects.create_user(username="reader", email="reader@example.com", customer_number="C-1")
+        cls.tenants = [
+            User.objects.create_user(username=f"t{index}", email=f"t{index}@example.com", customer_number=f"T-{index}")
+            for index in range(3)
+        ]
+        cls.supplier = User.objects.create_user(
+            username="gas", email="gas@example.com", customer_number="S-1", company_name="Gaswerk Süd"
+        )
+        signed = date(2020, 1, 1)
+        BankAccount.objects.create(
+            contact=cls.tenants[0], account_holder="T0", iban="DE89370400440532013000", bic="COBADEFFXXX",
+            mandate_id="M-0", mandate_signed_on=signed,
+        )
+        BankAccount.objects.create(
+            contact=cls.tenants[1], account_holder="T1", iban="NL91ABNA0417164300", mandate_id="M-1",
+            mandate_signed_on=signed,
+        )
+        BankAccount.objects.create(contact=cls.tenants[2], account_holder="T2", iban="GB29NWBK60161331926819")
+        BankAccount.objects.create(contact=cls.supplier, account_holder="Gaswerk", iban="CH9300762011623852957")
+
+        building = Unit.objects.create(name="Building", location="Main Street", size=100)
+        main = create_meter("Main", unit=building)
+        start = MeterReading.objects.create(meter=main, reading_date=date(2024, 1, 1), value=0, user=reader)
+        end = MeterReading.objects.create(meter=main, reading_date=date(2025, 1, 1), value=100, user=reader)
+        for index, tenant in enumerate(cls.tenants):
+            flat = Unit.objects.create(
+                name=f"Flat {index}", location=str(index), size=25, parent_unit=building, tenant=tenant
+            )
+            create_meter(f"Sub {index}", unit=flat, consumption_type=main.consumption_type, parent_meter=main)
+        for number, invoice_date in [("GAS-1", date(2025, 1, 15)), ("GAS-2", date(2025, 1, 20))]:
+            Expense.objects.create(
+                meter=main, supplier=cls.supplier, invoice_number=number, invoice_date=invoice_date,
+                start_reading=start, end_reading=end, fixed_costs=Decimal("300.00"), variable_costs=Decimal("0.00"),
+                vat_rate=Decimal("0.00"),
+            )
+        cls.billing_run = run_billing(date(2025, 1, 1), date(2025, 12, 31)).run
+
+    def export(self, kind, **kwargs):
+        transactions = sepa_transactions(kind, self.billing_run, **kwargs)
+        text = "".join(generate_pain(kind, transactions, self.PARTY, message_id="MSG-1", chunk_size=1))
+        return ElementTree.fromstring(text)
+
+    def test_direct_debits_skip_tenants_without_mandate(self):
+        skipped = []
+        root = self.export(DIRECT_DEBIT, due_date=date(2026, 2, 1), skipped=skipped)
+        self.assertEqual(root.findtext("p:CstmrDrctDbtInitn/p:GrpHdr/p:NbOfTxs", namespaces=self.NS), "2")
+        # 600 € split evenly over three flats
+        self.assertEqual(root.findtext("p:CstmrDrctDbtInitn/p:GrpHdr/p:CtrlSum", namespaces=self.NS), "400.00")
+        payment = root.find("p:CstmrDrctDbtInitn/p:PmtInf", self.NS)
+        self.assertEqual(payment.findtext("p:ReqdColltnDt", namespaces=self.NS), "2026-02-01")
+        self.assertEqual(
+            [element.text for element in payment.iterfind(".//p:MndtId", self.NS)], ["M-0", "M-1"]
+        )
+        # A missing BIC is allowed within SEPA
+        self.assertEqual(
+            [element.text for element in payment.iterfind("p:DrctDbtTxInf/p:DbtrAgt//p:Id", self.NS)], ["NOTPROVIDED"]
+        )
+        self.assertEqual([(item, reason) for item, reason in skipped], [(self.tenants[2], "no mandate")])
+
+    def test_credit_transfers_are_grouped_by_due_date(self):
+        root = self.export(CREDIT_TRANSFER, payment_days=14)
+        ns = {"p": f"urn:iso:std:iso:20022:tech:xsd:{CREDIT_TRANSFER}"}
+        payments = root.findall("p:CstmrCdtTrfInitn/p:PmtInf", ns)
+        self.assertEqual(
+            [(payment.findtext("p:ReqdExctnDt/p:Dt", namespaces=ns), payment.findtext("p:CtrlSum", namespaces=ns))
+             for payment in payments],
+            [("2025-01-29", "300.00"), ("2025-02-03", "300.00")],
+        )
+        self.assertEqual(payments[0].findtext("p:CdtTrfTxInf/p:Cdtr/p:Nm", namespaces=ns), "Gaswerk Sued")
+        expenses = Expense.objects.order_by("invoice_date").values_list("pk", flat=True)
+        self.assertEqual(
+            [element.text for element in root.iterfind(".//p:EndToEndId", ns)],
+            [f"RUN{self.billing_run.pk}-E{pk}" for pk in expenses],
+        )
+        self.assertEqual(root.findtext("p:CstmrCdtTrfInitn/p:GrpHdr/p:CtrlSum", namespaces=ns), "600.00")
+
+    def test_incomplete_company_details_are_rejected(self):
+        transactions = sepa_transactions(DIRECT_DEBIT, self.billing_run, due_date=date(2026, 2, 1))
+        for party in (Party("Uhrenhaus", ""), Party("Uhrenhaus", "AT611904300234573202", creditor_id="AT98ZZZ1"),
+                      Party("Uhrenhaus", self.PARTY.iban)):
+            with self.subTest(party=party), self.assertRaises(SepaError):
+                next(generate_pain(DIRECT_DEBIT, transactions, party))
+        transfers = sepa_transactions(CREDIT_TRANSFER, self.billing_run)
+        self.assertTrue(next(generate_pain(CREDIT_TRANSFER, transfers, Party("Uhrenhaus", self.PARTY.iban))))
+
+    def test_export_command(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            METERS_SEPA_IBAN=self.PARTY.iban, METERS_SEPA_CREDITOR_ID=self.PARTY.creditor_id
+        ):
+            path = f"{directory}/debits.xml"
+            stderr = io.StringIO()
+            call_command(
+                "export_sepa", self.billing_run.pk, "debits", path, "--due-date=2026-02-01",
+                stdout=io.StringIO(), stderr=stderr,
+            )
+            self.assertEqual(ElementTree.parse(path).getroot().findtext(".//p:NbOfTxs", namespaces=self.NS), "2")
+        self.assertIn("no mandate", stderr.getvalue())
+
+
+class ConversionFactorIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.gas = ConsumptionType.objects.create(name="Gas", unit="m³")
+        cls.heat = ConsumptionType.objects.create(name="Heat", unit="kWh")
+        for year, factor in [(2023, 10.0), (2024, 11.0)]:
+            ConversionFactor.objects.create(
+                from_consumption_type=cls.gas, to_consumption_type=cls.heat, factor=factor,
+                start_date=date(year, 1, 1), end_date=date(year, 12, 31),
+            )
+
+    def setUp(self):
+        # Rolled-back test transactions don't send signals, so start every test from a clean index.
+        conversion.invalidate()
+
+    def test_lookup(self):
+        index = conversion.get_index()
+        self.assertEqual(index.factor(self.gas.pk, self.heat.pk, date(2023, 6, 1)), 10.0)
+        self.assertEqual(index.factor(self.gas.pk, self.heat.pk, date(2024, 12, 31)), 11.0)
+        self.assertIsNone(index.factor(self.gas.pk, self.heat.pk, date(2025, 1, 1)))
+        self.assertIsNone(index.factor(self.heat.pk, self.gas.pk, date(2024, 1, 1)))
+        self.assertEqual(index.factor(self.gas.pk, self.gas.pk, date(2024, 1, 1)), 1.0)
+
+    def test_vectorized_matches_scalar(self):
+        index = conversion.get_index()
+        days = [date(2022, 12, 31), date(2023, 1, 1), date(2023, 12, 31), date(2024, 7, 1), date(2025, 1, 1)]
+        converted = list(index.convert(self.gas.pk, self.heat.pk, days, [1.0] * len(days)))
+        expected = [index.factor(self.gas.pk, self.heat.pk, day) for day in days]
+        self.assertEqual(converted[1:4], expected[1:4])
+        self.assertTrue(math.isnan(converted[0]) and math.isnan(converted[4]))
+
+    def test_index_is_reused_until_a_factor_changes(self):
+        index = conversion.get_index()
+        with self.assertNumQueries(0):
+            self.assertIs(conversion.get_index(), index)
+
+        ConversionFactor.objects.filter(factor=11.0).get().delete()
+        with self.assertNumQueries(1):
+            self.assertIsNone(conversion.get_index().factor(self.gas.pk, self.heat.pk, date(2024, 7, 1)))
+
+
+def photo_upload(name="reading.jpg", taken="2024:05:17 09:30:00", size=(120, 60)):
+    """A small JPEG with an EXIF capture date."""
+    exif = Image.Exif()
+    exif[0x0132] = taken  # DateTime
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "white").save(buffer, "JPEG", exif=exif)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+
+class OCRPipelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="reader", email="reader@example.com", password="x", customer_number="C-1"
+        )
+        cls.meter = create_meter("Kitchen")
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_parse_value(self):
+        self.assertEqual(ocr.parse_value("0 12345,6\n"), 12345.6)
+        self.assertIsNone(ocr.parse_value("--"))
+
+    def process(self, text, apply=True):
+        with mock.patch("meters.ocr.pytesseract.image_to_string", return_value=text), \
+                ThreadPoolExecutor(max_workers=1) as executor:
+            return ocr.process_jobs(executor, limit=10, apply=apply)
+
+    def ocr_flags(self):
+        return list(PlausibilityFlag.objects.filter(kind="ocr_mismatch").values_list("reading__value", flat=True))
+
+    def test_upload_queues_job_and_worker_corrects_implausible_value(self):
+        MeterReading.objects.create(meter=self.meter, reading_date=date(2024, 4, 1), value=4700, user=self.user)
+        reading = MeterReading.objects.create(
+            meter=self.meter, reading_date=date(2024, 5, 17), value=47, user=self.user, photo=photo_upload()
+        )
+        job = OCRJob.objects.get(reading=reading)
+        self.assertEqual(job.status, "pending")
+
+        self.assertEqual(self.process("04711.5"), 1)
+        job.refresh_from_db()
+        reading.refresh_from_db()
+        self.assertEqual((job.status, job.suggested_value, job.suggested_date), ("done", 4711.5, date(2024, 5, 17)))
+        self.assertTrue(job.applied)
+        self.assertEqual(reading.value, 4711.5)
+        self.assertEqual(self.ocr_flags(), [])
+
+    def test_typed_values_are_kept_and_mismatches_flagged(self):
+        MeterReading.objects.create(meter=self.meter, reading_date=date(2024, 4, 1), value=4700, user=self.user)
+        reading = MeterReading.objects.create(
+            meter=self.meter, reading_date=date(2024, 5, 17), value=4800, user=self.user, photo=photo_upload()
+        )
+        self.process("04711.5")
+        reading.refresh_from_db()
+        self.assertEqual(reading.value, 4800)
+        self.assertFalse(OCRJob.objects.get(reading=reading).applied)
+        self.assertEqual(self.ocr_flags(), [4800])
+
+    def test_failed_recognition_is_retried_with_backoff(self):
+        reading = MeterReading.objects.create(
+            meter=self.meter, reading_date=date(2024, 5, 1), value=0, user=self.user, photo=photo_upload()
+        )
+        with mock.patch("meters.ocr.pytesseract.image_to_string", side_effect=OSError("tesseract missing")), \
+                ThreadPoolExecutor(max_workers=1) as executor:
+            ocr.process_jobs(executor, limit=10)
+            job = OCRJob.objects.get(reading=reading)
+            self.assertEqual((job.status, job.attempts), ("pending", 1))
+            self.assertIn("tesseract missing", job.error)
+            self.assertEqual(ocr.process_jobs(executor, limit=10), 0)  # Not due yet
+            OCRJob.objects.update(updated_at=timezone.now() - ocr.retry_delay(1))
+            self.assertEqual(ocr.process_jobs(executor, limit=10), 1)
+        self.assertEqual(OCRJob.objects.get().attempts, 2)
+
+    def test_abandoned_jobs_fail_after_max_attempts(self):
+        reading = MeterReading.objects.create(
+            meter=self.meter, reading_date=date(2024, 5, 1), value=0, user=self.user, photo=photo_upload()
+        )
+        stale = timezone.now() - ocr.STALE_AFTER * 2
+        OCRJob.objects.update(status="processing", attempts=ocr.MAX_ATTEMPTS, updated_at=stale)
+        self.assertEqual(ocr.claim_jobs(10), [])
+        self.assertEqual(OCRJob.objects.get(reading=reading).status, "failed")
+
+
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="reader", email="reader@example.com", password="x", customer_number="C-1"
+        )
+        cls.meter = create_meter("Kitchen")
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.force_login(self.user)
+
+    def test_thumbnail_is_generated_once_and_cacheable(self):
+        reading = MeterReading.objects.create(
+            meter=self.meter, reading_date=date(2024, 5, 1), value=0, user=self.user,
+            photo=photo_upload(size=(1600, 1200)),
+        )
+        self.assertEqual(len(reading.photo_hash), 64)
+        url = reverse("reading-thumbnail", args=[reading.photo_hash, 100])
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("immutable", response["Cache-Control"])
+        with Image.open(io.BytesIO(b"".join(response.streaming_content))) as image:
+            self.assertEqual(image.width, 100)
+        self.assertTrue(reading.photo.storage.exists(thumbnail_name(reading.photo_hash, 100)))
+
+        response = self.client.get(url, headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(reverse("reading-thumbnail", args=[reading.photo_hash, 123])).status_code, 404)
+
+    def test_api_links_thumbnails(self):
+        reading = MeterReading.objects.create(
+            meter=self.meter, reading_date=date(2024, 5, 1), value=0, user=self.user, photo=photo_upload()
+        )
+        client = APIClient()
+        client.force_authenticate(self.user)
+        data = client.get(reverse("meter-reading-detail", args=[reading.pk])).json()
+        self.assertTrue(data["photo_thumbnails"]["400"].endswith(f"/thumbnails/{reading.photo_hash}/400/"))
+
+
+class FastSerializationTests(TestCase):
+    """The compiled list path must produce exactly the bytes of the regular serializers."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="reader", email="reader@example.com", password="x", customer_number="C-1"
+        )
+        parent = create_meter("Main", location_description="Basement – Nord")
+        cls.meter = create_meter("Sub", parent_meter=parent)
+        start = MeterReading.objects.create(meter=cls.meter, reading_date=date(2024, 1, 1), value=1.5, user=cls.user)
+        end = MeterReading.objects.create(
+            meter=cls.meter, reading_date=date(2024, 12, 31), value=12.25, user=cls.user, is_estimated=True
+        )
+        Expense.objects.create(
+            meter=cls.meter, supplier=cls.user, invoice_number="INV-1", invoice_date=date(2025, 1, 5),
+            start_reading=start, end_reading=end, fixed_costs=Decimal("10.00"), variable_costs=Decimal("5.10"),
+            vat_rate=Decimal("20.00"),
+        )
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertSameBytes(self, url):
+        fast = self.client.get(url)
+        with mock.patch.object(FastListMixin, "get_compiled_rows", return_value=None):
+            regular = self.client.get(url)
+        self.assertEqual(fast.status_code, 200)
+        content = b"".join(fast.streaming_content) if fast.streaming else fast.content
+        expected = b"".join(regular.streaming_content) if regular.streaming else regular.content
+        self.assertEqual(content, expected)
+
+    def test_output_is_byte_identical(self):
+        MeterReading.objects.create(
+            meter=self.meter, reading_date=date(2024, 6, 1), value=7, user=self.user, photo=photo_upload()
+        )
+        for url in (
+            reverse("meter-list"),
+            reverse("meter-list") + "?expand=unit,consumption_type,parent_meter",
+            reverse("meter-reading-list"),
+            reverse("meter-reading-list") + "?expand=meter.unit&fields=id,value,photo,photo_thumbnails,meter",
+            reverse("meter-reading-list") + "?page_size=1&stream=ndjson",
+            reverse("expense-list") + "?expand=meter.parent_meter,start_reading,end_reading.meter",
+            reverse("expense-list") + "?page_size=1&fields=total_cost",
+        ):
+            with self.subTest(url=url):
+                self.assertSameBytes(url)
+
+    def test_unsupported_fields_fall_back(self):
+        response = self.client.get(reverse("expense-list") + "?expand=supplier")
+        self.assertEqual(response.json()["results"][0]["supplier"], str(self.user))
+        self.assertIsNone(compile_rows(ExpenseSerializer(fields=(), expand=("supplier",))))
+        self.assertIsNotNone(compile_rows(ExpenseSerializer(fields=(), expand=("meter",))))
+
+
+class AsyncViewTests(TestCase):
+    """The async endpoints must answer exactly like their DRF counterparts."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="reader", email="reader@example.com", password="x", customer_number="C-1"
+        )
+        cls.meter = create_meter("Kitchen")
+        for day in range(3):
+            MeterReading.objects.create(
+                meter=cls.meter, reading_date=date(2024, 1, 1) + timedelta(days=day), value=day, user=cls.user
+            )
+
+    def setUp(self):
+        self.drf_client = APIClient()
+        self.drf_client.force_authenticate(self.user)
+
+    async def assertSameContent(self, name, query="", args=()):
+        expected = await sync_to_async(self.drf_client.get)(reverse(name, args=args) + query)
+        response = await self.async_client.get(reverse(f"async-{name}", args=args) + query)
+        self.assertEqual(response.status_code, expected.status_code)
+        body, expected_body = response.json(), expected.json()
+        if isinstance(body, dict) and body.get("next"):
+            self.assertEqual(body.pop("next").split("?")[1], expected_body.pop("next").split("?")[1])
+        self.assertEqual(body, expected_body)
+
+    async def test_responses_match_the_drf_views(self):
+        await self.async_client.aforce_login(self.user)
+        reading = await MeterReading.objects.afirst()
+        for name, query, args in (
+            ("meter-list", "?expand=unit", ()),
+            ("meter-detail", "?fields=id,label", (self.meter.pk,)),
+            ("meter-detail", "", (0,)),
+            ("meter-reading-list", "?page_size=2&expand=meter&fields=id,value,meter.label", ()),
+            ("meter-reading-list", "?expand=user", ()),
+            ("meter-reading-list", "?cursor=garbage", ()),
+            ("meter-reading-detail", "", (reading.pk,)),
+        ):
+            with self.subTest(name=name, query=query):
+                await self.assertSameContent(name, query, args)
+
+    async def test_stream_and_create(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse("async-meter-reading-list") + "?stream=ndjson")
+        lines = b"".join([chunk async for chunk in response.streaming_content]).decode().splitlines()
+        self.assertEqual([json.loads(line)["value"] for line in lines], [0, 1, 2])
+
+        response = await self.async_client.post(
+            reverse("async-meter-reading-list"), {"meter": self.meter.pk, "reading_date": "2024-02-01", "value": 31},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        created = await MeterReading.objects.select_related("user").aget(pk=response.json()["id"])
+        self.assertEqual(created.user, self.user)
+        self.assertTrue(await MonthlyConsumption.objects.filter(meter=self.meter, month=date(2024, 1, 1)).aexists())
+
+        duplicate = await self.async_client.post(
+            reverse("async-meter-reading-list"), {"meter": self.meter.pk, "reading_date": "2024-02-01", "value": 31},
+            content_type="application/json",
+        )
+        self.assertEqual(duplicate.status_code, 400)
+
+        expanded = await self.async_client.post(
+            reverse("async-meter-reading-list") + "?expand=meter,user",
+            {"meter": self.meter.pk, "reading_date": "2024-03-01", "value": 40}, content_type="application/json",
+        )
+        self.assertEqual(expanded.status_code, 201, expanded.content)
+        self.assertEqual((expanded.json()["meter"]["label"], expanded.json()["user"]), ("Kitchen", str(self.user)))
+
+    def test_exports_under_wsgi_stream_synchronously(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("async-meter-reading-list") + "?stream=ndjson")
+        self.assertFalse(response.is_async)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)["value"] for line in lines], [0, 1, 2])
+
+    async def test_requires_a_session(self):
+        response = await self.async_client.get(reverse("async-meter-list"))
+        self.assertEqual(response.status_code, 403)
+
+
+class LiveEventTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="reader", email="reader@example.com", password="x", customer_number="C-1"
+        )
+        cls.kitchen, cls.bath = create_meter("Kitchen"), create_meter("Bath")
+        Unit.objects.filter(pk=cls.kitchen.unit_id).update(tenant=cls.user)
+        cls.reading = MeterReading.objects.create(
+            meter=cls.kitchen, reading_date=date(2024, 1, 1), value=1, user=cls.user
+        )
+        cls.other = MeterReading.objects.create(meter=cls.bath, reading_date=date(2024, 1, 1), value=2, user=cls.user)
+
+    async def test_stream_sends_the_events_of_the_requested_meters(self):
+        await self.async_client.aforce_login(self.user)
+        with mock.patch.object(LiveEventsView, "keepalive", 0.05):
+            response = await self.async_client.get(reverse("live-events") + f"?meters={self.kitchen.pk}")
+            self.assertEqual(response["Content-Type"], "text/event-stream")
+            stream = response.streaming_content
+            self.assertEqual(await anext(stream), b"retry: 5000\n\n")
+
+            await sync_to_async(live.publish_created)([self.other, self.reading])
+            event = (await asyncio.wait_for(anext(stream), 1)).decode()
+            self.assertTrue(event.startswith(f"id: reading-{self.reading.pk}\nevent: reading\ndata: "))
+            self.assertEqual(json.loads(event.split("data: ")[1])["meter"], self.kitchen.pk)
+            self.assertEqual(await anext(stream), b": keepalive\n\n")  # Nothing for the other meter
+
+            # A client disconnecting cancels the task that streams to it
+            pending = asyncio.ensure_future(anext(stream))
+            await asyncio.sleep(0.01)
+            pending.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await pending
+        self.assertFalse(live.get_broker().subscribers)
+
+    async def test_stream_is_limited_to_the_units_of_the_tenant(self):
+        await self.async_client.aforce_login(self.user)
+        self.assertContains(await self.async_client.get(reverse("dashboard")), "EventSource")
+        response = await self.async_client.get(reverse("live-events") + f"?meters={self.bath.pk}")
+        self.assertEqual(response.status_code, 204)
+
+        self.assertEqual(
+            await sync_to_async(live.allowed_channels)(self.user), [f"unit:{self.kitchen.unit_id}"]
+        )
+        self.user.is_staff = True
+        self.assertEqual(await sync_to_async(live.allowed_channels)(self.user), [live.ALL])
+        self.assertEqual(
+            await sync_to_async(live.allowed_channels)(self.user, [str(self.bath.pk)]), [f"meter:{self.bath.pk}"]
+        )
+
+    def test_stream_needs_an_asgi_server(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse("live-events")).status_code, 501)
+        self.assertNotContains(self.client.get(reverse("dashboard")), "EventSource")
+
+    def create_committed_reading(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return MeterReading.objects.create(meter=self.bath, reading_date=date(2024, 2, 1), value=5, user=self.user)
+
+    async def test_new_readings_are_published_after_commit(self):
+        with live.get_broker().subscribe([f"unit:{self.bath.unit_id}"]) as subscription:
+            reading = await sync_to_async(self.create_committed_reading)()
+            event = await asyncio.wait_for(subscription.get(), 1)
+        self.assertEqual(json.loads(event["data"]), {
+            "id": reading.pk, "meter": self.bath.pk, "unit": self.bath.unit_id,
+            "reading_date": "2024-02-01", "value": 5, "is_estimated": False,
+        })
+
+    def test_unreachable_relay_costs_one_connection_attempt_per_batch(self):
+        broker = live.TCPBroker("127.0.0.1:1")
+        with mock.patch("meters.live.get_broker", return_value=broker), \
+                mock.patch("socket.create_connection", side_effect=OSError) as connect, \
+                self.assertLogs("meters.live", "WARNING"):
+            live.publish_created([self.reading, self.other] * 1500)
+        self.assertEqual(connect.call_count, 1)
+
+    def test_publish_failures_do_not_reach_the_request(self):
+        with mock.patch("meters.live.get_broker", side_effect=RuntimeError("closed")), \
+                self.assertLogs("meters.live", "ERROR"):
+            live.publish_created([self.reading])
+
+    async def test_tcp_broker_shares_events_through_the_relay(self):
+        relay = await live.serve_relay("127.0.0.1", 0)
+        broker = live.TCPBroker(f"127.0.0.1:{relay.sockets[0].getsockname()[1]}")
+        try:
+            with broker.subscribe(["meter:1"]) as subscription:
+                await asyncio.sleep(0.1)  # Let the listener connect to the relay
+                event = {"id": "x", "event": "reading", "data": "{}"}
+                await asyncio.to_thread(broker.publish, ["all", "meter:1"], event)
+                self.assertEqual(await asyncio.wait_for(subscription.get(), 1), event)
+        finally:
+            broker.listener.cancel()
+            broker.connection.close()
+            await asyncio.sleep(0.05)  # Let the relay see both connections close
+            relay.close()
+            await relay.wait_closed()
@@ -0,0 +1,191 @@
+"""
+Materialized paths and in-memory trees for the Meter and Unit hierarchies.
+
+Every node stores `tree_path`, the ids from its root down to itself (`/1/5/12/`), kept up to
+date on save. A subtree is then a single `tree_path__startswith` query, and the whole
+hierarchy loads with one query into a `Tree` that aggregates values bottom-up in one pass.
+
+`bulk_create()` and `QuerySet.update()` bypass `save()` and leave paths empty or stale; run
+`rebuild_paths()` after them. A node found without a path (as a parent on save, or as the
+root of a roll-up) triggers that rebuild, since `tree_path__startswith=""` matches every row.
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
+from django.utils.translation import gettext_lazy as _
+
+
+def build_path(parent_path, pk):
+    return f"{parent_path or '/'}{pk}/"
+
+
+class MaterializedPathMixin(models.Model):
+    """Abstract base for self-referencing models; subclasses set `tree_parent_field`."""
+    tree_parent_field = None
+
+    tree_path = models.CharField(
+        max_length=255, blank=True, default="", editable=False, db_index=True, verbose_name=_("Tree Path")
+    )
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_parent_id = instance.__dict__.get(f"{cls.tree_parent_field}_id")
+        return instance
+
+    @property
+    def tree_parent_id(self):
+        return getattr(self, f"{self.tree_parent_field}_id")
+
+    def _parent_path(self, parent_id=None):
+        parent_id = self.tree_parent_id if parent_id is None else parent_id
+        if parent_id is None:
+            return ""
+        parent = type(self)._default_manager.filter(pk=parent_id)
+        path = parent.values_list("tree_path", flat=True).first()
+        if path == "":  # The parent was created or moved without save()
+            rebuild_paths(type(self))
+            path = parent.values_list("tree_path", flat=True).first()
+        return path
+
+    def is_below_itself(self, parent_id):
+        """Whether `parent_id` is this node or one of its descendants."""
+        if not self.pk or parent_id is None:
+            return False
+        return f"/{self.pk}/" in (self._parent_path(parent_id) or build_path("", parent_id))
+
+    def clean(self):
+        super().clean()
+        if self.is_below_itself(self.tree_parent_id):
+            raise ValidationError({self.tree_parent_field: _("A node cannot be placed below itself.")})
+
+    def save(self, *args, **kwargs):
+        parent_changed = getattr(self, "_loaded_parent_id", object()) != self.tree_parent_id
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+            if parent_changed or not self.tree_path:
+                self.move_subtree(build_path(self._parent_path(), self.pk))
+        self._loaded_parent_id = self.tree_parent_id
+
+    def move_subtree(self, new_path):
+        """Store `new_path` for this node and rewrite the paths of all of its descendants."""
+        old_path = self.tree_path
+        if old_path and new_path.startswith(old_path) and new_path != old_path:
+            raise ValueError("A node cannot be placed below itself.")
+        manager = type(self)._default_manager
+        manager.filter(pk=self.pk).update(tree_path=new_path)
+        if old_path and old_path != new_path:
+            manager.filter(tree_path__startswith=old_path).exclude(pk=self.pk).update(
+                tree_path=Concat(Value(new_path), Substr("tree_path", len(old_path) + 1))
+            )
+        self.tree_path = new_path
+
+
+def detach_subtree(instance):
+    """Children of a deleted node become roots (their parent FK is SET_NULL), so re-root their paths."""
+    if not instance.tree_path:
+        return
+    old_path = instance.tree_path
+    type(instance)._default_manager.filter(tree_path__startswith=old_path).update(
+        tree_path=Concat(Value("/"), Substr("tree_path", len(old_path) + 1))
+    )
+
+
+def compute_paths(parents):
+    """Compute `{id: tree_path}` from `{id: parent_id}` in memory (used for backfills)."""
+    paths = {}
+
+    def path_of(node_id, seen=()):
+        if node_id not in paths:
+            parent_id = parents.get(node_id)
+            if parent_id is None or parent_id not in parents or parent_id in seen:
+                paths[node_id] = build_path("", node_id)
+            else:
+                paths[node_id] = build_path(path_of(parent_id, seen + (node_id,)), node_id)
+        return paths[node_id]
+
+    for node_id in parents:
+        path_of(node_id)
+    return paths
+
+
+def rebuild_paths(model):
+    """Recompute every `tree_path` of `model` from the parent foreign keys; returns the number fixed."""
+    manager = model._default_manager
+    rows = list(manager.values_list("id", f"{model.tree_parent_field}_id", "tree_path"))
+    paths = compute_paths({node_id: parent_id for node_id, parent_id, _path in rows})
+    changed = [
+        model(pk=node_id, tree_path=paths[node_id]) for node_id, _parent_id, path in rows if path != paths[node_id]
+    ]
+    manager.bulk_update(changed, ["tree_path"], batch_size=1000)
+    return len(changed)
+
+
+def subtree_path(node):
+    """The path of `node`, rebuilding the paths of its model first if it has none."""
+    if not node.tree_path:
+        rebuild_paths(type(node))
+        node.tree_path = type(node)._default_manager.filter(pk=node.pk).values_list("tree_path", flat=True).get()
+    return node.tree_path
+
+
+@dataclass
+class Tree:
+    """A hierarchy loaded into memory as parent/children maps."""
+    parents: dict
+    children: dict = field(default_factory=lambda: defaultdict(list))
+    depth: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from `(id, tree_path)` rows; parents and depths are read off the path."""
+        tree = cls(parents={})
+        for node_id, path in rows:
+            ancestors = [int(part) for part in path.strip("/").split("/") if part] or [node_id]
+            parent_id = ancestors[-2] if len(ancestors) > 1 else None
+            tree.parents[node_id] = parent_id
+            tree.depth[node_id] = len(ancestors) - 1
+            if parent_id is not None:
+                tree.children[parent_id].append(node_id)
+        return tree
+
+    @property
+    def roots(self):
+        return [node_id for node_id, parent_id in self.parents.items() if parent_id not in self.parents]
+
+    def leaves(self, node_id):
+        """The nodes without children in `node_id`'s subtree (the node itself if it has none)."""
+        leaves, stack = [], [node_id]
+        while stack:
+            current = stack.pop()
+            children = self.children.get(current)
+            if children:
+                stack.extend(children)
+            else:
+                leaves.append(current)
+        return leaves
+
+    def bottom_up(self):
+        """Nodes ordered so that every node comes after all of its descendants."""
+        return sorted(self.parents, key=lambda node_id: -self.depth[node_id])
+
+    def subtree_totals(self, values):
+        """Sum `values` (`{id: number}`) over every node's subtree in a single bottom-up pass."""
+        totals = {node_id: values.get(node_id, 0) for node_id in self.parents}
+        for node_id in self.bottom_up():
+            parent_id = self.parents[node_id]
+            if parent_id in totals:
+                totals[parent_id] += totals[node_id]
+        return totals
+
+
+def load_tree(queryset):
+    """Load a hierarchy (or, for a `tree_path__startswith` queryset, a subtree) with one query."""
+    return Tree.from_rows(queryset.values_list("id", "tree_path"))
@@ -5,4 +5,5 @@ urlpatterns = [
     # Example route (add actual views later)
     path("", views.home, name="home"),
     path("api/", include("meters.api_urls")),
+    path("thumbnails/<slug:photo_hash>/<int:size>/", views.reading_thumbnail, name="reading-thumbnail"),
 ]
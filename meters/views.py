@@ -1,5 +1,37 @@
 from django.shortcuts import render
-from django.http import HttpResponse
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.views.decorators.http import require_GET
+
+from .models import MeterReading
+from .thumbnails import THUMBNAIL_CONTENT_TYPE, THUMBNAIL_SIZES, ensure_thumbnail
+
 
 def home(request):
     return HttpResponse("Hello! This is the meters app.")
+
+
+@login_required
+@require_GET
+def reading_thumbnail(request, photo_hash, size):
+    """
+    Serve a thumbnail of a meter reading photo, generating it on first request.
+    The URL contains the photo's content hash, so responses are cacheable indefinitely.
+    """
+    if size not in THUMBNAIL_SIZES:
+        raise Http404("Unsupported thumbnail size.")
+    reading = (
+        MeterReading.objects.filter(photo_hash=photo_hash).exclude(photo="").only("id", "photo", "photo_hash").first()
+    )
+    if reading is None:
+        raise Http404("No photo with this hash.")
+
+    etag = f'"{photo_hash}-{size}"'
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponseNotModified()
+    else:
+        name = ensure_thumbnail(reading, size)
+        response = FileResponse(reading.photo.storage.open(name, "rb"), content_type=THUMBNAIL_CONTENT_TYPE)
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, max-age=31536000, immutable"
+    return response
@@ -2,6 +2,8 @@
 ASGI config for uhrenhaus project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server, e.g. ``uvicorn uhrenhaus.asgi:application --workers 4``,
+so that the async endpoints under ``/api/async/`` run on the event loop.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
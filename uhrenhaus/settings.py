@@ -105,12 +105,46 @@ WSGI_APPLICATION = 'uhrenhaus.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+DB_ENGINE = os.getenv("DB_ENGINE", "sqlite3")
+
+if DB_ENGINE == "postgresql":
+    # Either keep connections open per thread (DB_CONN_MAX_AGE) or share a psycopg pool (DB_POOL);
+    # Django does not allow both at once.
+    DB_POOL = os.getenv("DB_POOL") == "True"
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv("DB_NAME", "uhrenhaus"),
+            'USER': os.getenv("DB_USER", ""),
+            'PASSWORD': os.getenv("DB_PASSWORD", ""),
+            'HOST': os.getenv("DB_HOST", ""),
+            'PORT': os.getenv("DB_PORT", ""),
+            'CONN_MAX_AGE': 0 if DB_POOL else int(os.getenv("DB_CONN_MAX_AGE", "60")),
+            'CONN_HEALTH_CHECKS': os.getenv("DB_CONN_HEALTH_CHECKS", "True") == "True",
+            'OPTIONS': {},
+        }
+    }
+    if DB_POOL:
+        DATABASES['default']['OPTIONS']['pool'] = {
+            "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+            "timeout": int(os.getenv("DB_POOL_TIMEOUT", "10")),
+        }
+else:
+    # WAL lets readers continue while one connection writes; IMMEDIATE transactions take the write
+    # lock up front, so concurrent writers wait for it (up to `timeout` seconds) instead of failing
+    # with "database is locked" when a read transaction tries to upgrade.
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv("DB_NAME", BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                'init_command': "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;",
+                'timeout': int(os.getenv("DB_TIMEOUT", "20")),
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
     }
-}
 
 
 # Password validation
@@ -177,6 +211,22 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Seconds to keep rendered meters API responses in the cache, keyed by their ETag (0 disables)
+METERS_API_CACHE_TIMEOUT = int(os.getenv("METERS_API_CACHE_TIMEOUT", "0"))
+
+# Fan-out of live reading/expense events: in-process, or shared by all workers through `run_live_broker`
+METERS_LIVE_BACKEND = os.getenv("METERS_LIVE_BACKEND", "meters.live.LocalBroker")
+METERS_LIVE_BROKER = os.getenv("METERS_LIVE_BROKER", "127.0.0.1:8766")
+
+# The company's side of SEPA payment files (`export_sepa`): name, account and direct debit creditor identifier
+METERS_SEPA_NAME = os.getenv("METERS_SEPA_NAME", "Uhrenhaus")
+METERS_SEPA_IBAN = os.getenv("METERS_SEPA_IBAN", "")
+METERS_SEPA_BIC = os.getenv("METERS_SEPA_BIC", "")
+METERS_SEPA_CREDITOR_ID = os.getenv("METERS_SEPA_CREDITOR_ID", "")
+
+# Bank codes and BICs (CSV: country,bank_code,bic,name) used to fill in the BIC of bank accounts
+CONTACTS_BANK_DIRECTORY = os.getenv("CONTACTS_BANK_DIRECTORY", BASE_DIR / "contacts" / "data" / "bank_directory.csv")
+
 # Django Email Settings
 EMAIL_BACKEND = os.getenv("EMAIL_BACKEND")
 EMAIL_HOST = os.getenv("EMAIL_HOST")